@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+'''Compares the in-process computation of structural information about parity
+games (cases/pgstats.py) with pginfo, on games that were generated by an
+earlier run of run.py.'''
+import optparse
+import logging
+import glob
+import time
+import yaml
+import os
+from cases import tools, pgbinary, pgstats, LARGE_GRAPH, PGINFO_TIMEOUT, PGINFO_MEMLIMIT
+
+def family(pgfile):
+  '''The family of cases that generated pgfile, from its location in
+     cases/<family>/temp.'''
+  parts = os.path.abspath(pgfile).split(os.sep)
+  if 'cases' in parts and parts.index('cases') + 1 < len(parts) - 1:
+    return parts[parts.index('cases') + 1]
+  return 'other'
+
+def inprocess(pgfile, options):
+  '''Returns the results and times of computing options in-process. The time
+     of loading the game is included in that of the first option.'''
+  results, times = {}, {}
+  start = time.time()
+  game = pgbinary.load(pgfile)
+  try:
+    for (option, name, metric) in pgstats.METRICS:
+      if option in options:
+        results[option] = metric(game)
+        times[option] = time.time() - start
+        start = time.time()
+  finally:
+    game.close()
+  return results, times
+
+def external(pgfile, option, log):
+  '''Returns the result and time of computing option with pginfo, or None
+     and the time until pginfo failed.'''
+  name = dict((o, n) for (o, n, _) in pgstats.METRICS)[option]
+  yamlfile = pgbinary.sibling(pgfile)[:-len(pgbinary.EXTENSION)] + option + '.yaml'
+  start = time.time()
+  try:
+    tools.pginfo('-v', pgfile, yamlfile, '--{0}'.format(option), '--max-for-expensive={0}'.format(LARGE_GRAPH),
+                 outputs=[yamlfile], timeout=PGINFO_TIMEOUT, memlimit=PGINFO_MEMLIMIT)
+    return yaml.load(open(yamlfile).read()).get(name), time.time() - start
+  except (tools.ToolException, IOError, OSError, AttributeError) as e:
+    log.warning('pginfo --{0} failed on {1}: {2}'.format(option, pgfile, e))
+    return None, time.time() - start
+  finally:
+    if os.path.exists(yamlfile):
+      os.unlink(yamlfile)
+
+def agree(ours, theirs):
+  '''Whether the values that both computed are the same. pginfo may not report
+     everything, e.g. queue sizes of large games.'''
+  if isinstance(ours, dict) and isinstance(theirs, dict):
+    return all(agree(ours[k], theirs[k]) for k in ours if k in theirs)
+  if isinstance(ours, float) or isinstance(theirs, float):
+    return abs(float(ours) - float(theirs)) < 1e-6 * max(1.0, abs(float(ours)))
+  return ours == theirs
+
+def run(pgfiles, options, usepginfo, outfile, log):
+  rows = []
+  for pgfile in pgfiles:
+    log.info('Benchmarking {0}'.format(pgfile))
+    results, times = inprocess(pgfile, options)
+    for option in options:
+      row = {'file': pgfile, 'family': family(pgfile), 'option': option,
+             'python': times.get(option), 'result': results.get(option)}
+      if usepginfo:
+        (theirs, row['pginfo']) = external(pgfile, option, log)
+        row['agree'] = agree(results.get(option), theirs) if theirs is not None else None
+      rows.append(row)
+
+  # Totals per family and option.
+  totals = {}
+  for row in rows:
+    total = totals.setdefault((row['family'], row['option']), [0, 0.0, 0.0, 0])
+    total[0] += 1
+    total[1] += row['python'] or 0.0
+    total[2] += row.get('pginfo') or 0.0
+    total[3] += 1 if row.get('agree') is False else 0
+  print '{0:<16} {1:<8} {2:>6} {3:>12} {4:>12} {5:>9}'.format('family', 'option', 'games', 'python (s)', 'pginfo (s)', 'mismatch')
+  for ((fam, option), (count, python, pginfo, mismatch)) in sorted(totals.items()):
+    print '{0:<16} {1:<8} {2:>6} {3:>12.2f} {4:>12} {5:>9}'.format(fam, option, count, python,
+      '{0:.2f}'.format(pginfo) if usepginfo else '-', mismatch if usepginfo else '-')
+  if outfile is not None:
+    open(outfile, 'w').write(yaml.dump(rows, default_flow_style=False))
+
+def runCmdLine():
+  parser = optparse.OptionParser(usage='usage: %prog [options] [pgfile...]')
+  parser.add_option('-v', action='count', dest='verbosity',
+                    help='Be more verbose. Use more than once to increase verbosity even more.')
+  parser.add_option('--option', action='append', dest='options', choices=[o for (o, _, _) in pgstats.METRICS],
+                    help='Benchmark OPTION (one of {0}); may be given more than once. Default: sccs, ad and ad-cks.'.format(
+                      ', '.join(o for (o, _, _) in pgstats.METRICS)), metavar='OPTION')
+  parser.add_option('--no-pginfo', action='store_false', dest='pginfo', default=True,
+                    help='Only time the in-process computation.')
+  parser.add_option('-o', action='store', type='string', dest='outfile',
+                    help='Write the result and times for every game to FILE in YAML format.', metavar='FILE')
+  options, args = parser.parse_args()
+  if not args:
+    # All games of the last run.
+    args = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cases', '*', 'temp', '*.gm*')))
+  if not args:
+    parser.error('no parity games given, and none found in cases/*/temp')
+
+  logging.basicConfig()
+  if options.verbosity > 0:
+    logging.getLogger('benchmark').setLevel(logging.INFO)
+  if options.verbosity > 1:
+    logging.getLogger('tools').setLevel(logging.INFO)
+
+  run(args, options.options or ['sccs', 'ad', 'ad-cks'], options.pginfo, options.outfile, logging.getLogger('benchmark'))
+
+if __name__ == '__main__':
+  runCmdLine()
@@ -2,21 +2,48 @@ import multiprocessing
 import logging
 import traceback
 import tempfile
+import hashlib
+import resource
+import time
 import os
-import re
 import tools
 import pool
+import compression
+import planner
+import pghash
 import sys
+import re
 import yaml
-from tools import OutOfMemory, Timeout
+from tools import OutOfMemory, Timeout, ToolException
+from artifacts import Artifact
 
 LARGE_GRAPH=100000
 COMPUTE_WIDTH_MEASURES = False
+# Compute the cheap structural information (see pgstats.py) in-process instead
+# of using pginfo, if numpy is available.
+PGSTATS_INPROCESS = True
+# The in-process SCC metrics (see pgscc.py) take about 2.5 us per edge, and
+# ad-cks takes about 1 us per edge for every distinct priority (measured on
+# random games with up to 3M edges). Games on which they would take more than
+# a few minutes are left to pginfo.
+PGSCC_MAX_EDGES = 10000000
+PGSCC_MAX_CKS_WORK = 100000000
+# Estimate the information that pginfo cannot compute for games with more than
+# LARGE_GRAPH vertices in reasonable time by sampling (see pgstats.py).
+SAMPLE_LARGE_GAMES = True
+# Collect information about and solve games that are the same (see pghash.py)
+# only once, and share the results between them.
+SHARE_GAMES = True
 
 BISIM_REDUCE = True
 FMIB_REDUCE = True
 STUT_REDUCE = True
 GSTUT_REDUCE = True
+# Compute the quotient modulo an equivalence from the quotient modulo the
+# finer equivalence in FINER, if that is enabled, instead of from the
+# original game (see ReductionTask).
+CHAIN_REDUCTIONS = False
+FINER = {'bisim': None, 'fmib': 'bisim', 'stut': 'bisim', 'gstut': 'stut'}
 
 TIMEOUT = 1*60*60 # An hour for getting info
 LPSTOOLS_TIMEOUT = TIMEOUT
@@ -36,8 +63,23 @@ PGCONVERT_MEMLIMIT = MEMLIMIT
 PGSOLVER_MEMLIMIT = MEMLIMIT
 SOLVE_MEMLIMIT = MEMLIMIT
 
+# Rough estimate of the peak memory use of pginfo and the solvers, in bytes per
+# byte of the parity game file, used until actual peaks have been observed.
+GAME_MEMORY_FACTOR = 10
+
 RETURN_EXISTING = True
 
+def parameterCost(*values):
+  '''Expected cost of a case with the given parameters, used to order cases of
+     the same family: the product of all integer parameters.'''
+  cost = 1.0
+  for v in values:
+    try:
+      cost *= int(v)
+    except (TypeError, ValueError):
+      pass
+  return cost
+
 def cleanResult(result):
   '''Clean result for saving the output, i.e. remove stdout and stderr output
      from the dictionary if desired'''
@@ -45,6 +87,45 @@ def cleanResult(result):
   del result['err']
   return result
 
+def chained(equiv, enabled):
+  '''The equivalences in enabled whose quotients are computed from the
+     quotient modulo equiv (or from the original game if equiv is None) when
+     reductions are chained: those for which equiv is the closest enabled
+     finer equivalence.'''
+  def source(e):
+    e = FINER[e]
+    while e is not None and e not in enabled:
+      e = FINER[e]
+    return e
+  return [e for e in enabled if source(e) == equiv]
+
+def addTimes(times, step):
+  '''The sum of two dictionaries of timings, key by key.'''
+  total = dict(times or {})
+  if isinstance(step, dict):
+    for (k, v) in step.items():
+      if isinstance(v, (int, long, float)):
+        total[k] = total.get(k, 0) + v
+  return total
+
+def gameSize(pgfile):
+  '''Counts the vertices and edges of the game in pgfile, without parsing it
+     completely.'''
+  vertices, edges = 0, 0
+  try:
+    infile = compression.openPlain(pgfile)
+    try:
+      for line in infile:
+        if line.startswith('parity') or line.startswith('start') or not line.strip():
+          continue
+        vertices += 1
+        edges += line.split('"', 1)[0].count(',') + 1
+    finally:
+      infile.close()
+  except (IOError, OSError, TypeError):
+    return {'vertices': 0, 'edges': 0}
+  return {'vertices': vertices, 'edges': edges}
+
 class TempObj(pool.Task):
   def __init__(self):
     super(TempObj, self).__init__()
@@ -61,10 +142,11 @@ class TempObj(pool.Task):
     return self._existingTempFileDir(self._temppath, ext, extraprefix)
   
   def _existingTempFileDir(self, temppath, ext, extraprefix=""):
-    if os.path.exists(self._name(temppath, ext, extraprefix)) and os.path.getsize(self._name(temppath, ext, extraprefix)) > 0:
-      return self._name(temppath, ext, extraprefix)
-    else:
-      return None
+    # The file may have been stored compressed.
+    for e in [ext] + [ext + suffix for (_, _, suffix) in compression.METHODS.values()]:
+      if os.path.exists(self._name(temppath, e, extraprefix)) and os.path.getsize(self._name(temppath, e, extraprefix)) > 0:
+        return self._name(temppath, e, extraprefix)
+    return None
     
   def _newTempFileDir(self, temppath, ext, extraprefix=""):
     if not os.path.exists(temppath):
@@ -87,11 +169,60 @@ class TempObj(pool.Task):
   def _newTempFilename(self, ext, extraprefix=""):
     return self._newTempFilenameDir(self._temppath, ext, extraprefix)
 
+  def _stableTempFilename(self, ext):
+    '''Like _newTempFilename, but returns the same name in every run, also if
+       the file exists already, so that a run that is resumed overwrites the
+       file that the interrupted run wrote.'''
+    if not os.path.exists(self._temppath):
+      os.makedirs(self._temppath)
+    return self._name(self._temppath, ext)
+
+  def _partialFilename(self, filename):
+    '''The name next to filename under which filename is written, and which is
+       renamed to filename once it is complete, so that a run that is killed
+       halfway never leaves an incomplete filename for _existingTempFile to
+       return. It ends in the name of filename, so that it is compressed in the
+       same way (see compression.py).'''
+    (directory, name) = os.path.split(filename)
+    return os.path.join(directory, '.partial-{0}-{1}'.format(os.getpid(), name))
+
+  def _discardPartial(self, partial, filename):
+    '''Removes partial, after writing filename into it failed, and filename,
+       which an earlier run may have left and which is not what this run
+       made.'''
+    for path in (partial, filename):
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
+
+  def _binaryGame(self, pgfile):
+    '''Returns pgfile as a memory-mapped pgbinary.BinaryGame. The binary file
+       is stored next to pgfile, with extension pgb instead of gm, and is only
+       created if it does not exist yet. Requires numpy.'''
+    import pgbinary
+    return pgbinary.load(pgfile)
+
+  def _removeBinary(self, pgfile):
+    '''Removes the binary file that _binaryGame may have stored next to
+       pgfile. Only the subtasks of the task that made the game use it, so it
+       can be removed when that task has finished.'''
+    try:
+      import pgbinary
+    except ImportError:
+      # Then no binary file was made either.
+      return
+    if pgfile is not None and os.path.exists(pgbinary.sibling(pgfile)):
+      os.unlink(pgbinary.sibling(pgfile))
+
 class PGInfoTask(TempObj):
-  def __init__(self, pgfile, option, prefix, temppath, outpath):
+  def __init__(self, pgfile, option, prefix, temppath, outpath, timeout=PGINFO_TIMEOUT, size=None):
     super(PGInfoTask, self).__init__()
     self.__pgfile = pgfile
     self.__option = option
+    self.__timeout = timeout
+    self.__size = size
+    self.__censored = False
     self._prefix = prefix
     self._temppath = temppath
     self._outpath = outpath
@@ -102,18 +233,41 @@ class PGInfoTask(TempObj):
 
   def pgfile(self):
     return self.__pgfile
+  
+  def family(self):
+    # Per option, so that the planner can learn how long each takes.
+    return 'pginfo:{0}'.format(self.__option)
+  
+  def key(self):
+    return 'pginfo:{0}:{1}'.format(self._prefix, self.__option)
+
+  def __str__(self):
+    return self.key()
+  
+  def cost(self):
+    # The planner models time as a function of vertices plus edges.
+    if self.__size is not None:
+      return self.__size
+    return os.path.getsize(self.__pgfile) if os.path.exists(self.__pgfile) else 1.0
+  
+  def memory(self):
+    return GAME_MEMORY_FACTOR * os.path.getsize(self.__pgfile) // 1024 if os.path.exists(self.__pgfile) else None
+
+  def censored(self):
+    return self.__censored
     
   def phase0(self, log):
     yamlfile = self._newTempFilename("yaml")
     try:
       if self.__option in ['bfs', 'dfs']:
         log.warning("Not recording Queue/Stack sizes if number of vertices exceeds {0}".format(LARGE_GRAPH))
-      result = tools.pginfo('-v', self.__pgfile, yamlfile, '--{0}'.format(self.__option), '--max-for-expensive={0}'.format(LARGE_GRAPH), memlimit=PGINFO_MEMLIMIT, timeout=PGINFO_TIMEOUT, timed=True)
+      result = tools.pginfo('-v', self.__pgfile, yamlfile, '--{0}'.format(self.__option), '--max-for-expensive={0}'.format(LARGE_GRAPH), outputs=[yamlfile], memlimit=PGINFO_MEMLIMIT, timeout=self.__timeout, timed=True)
 
     except (Timeout, OutOfMemory) as e:
       # Handle gracefully, recording the output using the normal ways
       log.info('Timeout while collecting {0} from {1}'.format(self.__option, self._prefix))
       result = e.result
+      self.__censored = True
       
     self.result['pginfo'] = cleanResult(result)
     try:
@@ -125,16 +279,116 @@ class PGInfoTask(TempObj):
     
 
 
+class PGStatsTask(TempObj):
+  '''Collects the information about a parity game that pginfo collects with
+     the given options, in-process and from a single copy of the game. See
+     pgstats.py for the supported options. The size of the game is recorded
+     in result['size'], and options that were not computed, because the game
+     is too large or memory ran out, in result['skipped'] with the reason.'''
+  def __init__(self, pgfile, options, prefix, temppath, outpath):
+    super(PGStatsTask, self).__init__()
+    self.__pgfile = pgfile
+    self.__options = options
+    self._prefix = prefix
+    self._temppath = temppath
+    self._outpath = outpath
+    self.result = {}
+    self.result['options'] = options
+    self.result['output'] = {}
+    self.result['times'] = {}
+    self.result['usage'] = {}
+    self.result['skipped'] = {}
+    self.result['size'] = None
+
+  def pgfile(self):
+    return self.__pgfile
+
+  def family(self):
+    return 'pgstats'
+
+  def key(self):
+    return 'pgstats:{0}:{1}'.format(self._prefix, ','.join(self.__options))
+
+  def __str__(self):
+    return self.key()
+
+  def cost(self):
+    return os.path.getsize(self.__pgfile) if os.path.exists(self.__pgfile) else 1.0
+
+  def memory(self):
+    return GAME_MEMORY_FACTOR * self.cost() // 1024
+
+  def __tooLarge(self, option, game):
+    '''Why option should not be computed in-process for game, or None.'''
+    import pgstats
+    if option in ('sccs', 'ad', 'ad-cks') and game.m > PGSCC_MAX_EDGES:
+      return 'number of edges exceeds {0}'.format(PGSCC_MAX_EDGES)
+    if option == 'ad-cks' and game.m * pgstats.priorities(game) > PGSCC_MAX_CKS_WORK:
+      return 'number of edges times number of priorities exceeds {0}'.format(PGSCC_MAX_CKS_WORK)
+    return None
+
+  def phase0(self, log):
+    import pgstats
+    try:
+      game = self._binaryGame(self.__pgfile)
+    except (IOError, OSError, ValueError) as e:
+      log.error('Cannot load {0} for collecting information, exception was {1}'.format(self.__pgfile, e))
+      return
+    self.result['size'] = {'vertices': len(game), 'edges': game.m}
+    try:
+      for (option, name, metric) in pgstats.METRICS + pgstats.SAMPLED:
+        if option not in self.__options:
+          continue
+        if option == 'dfs' and len(game) > LARGE_GRAPH:
+          # Like pginfo, do not do an expensive sequential search of a large
+          # game.
+          log.info('Not computing DFS of {0}, number of vertices exceeds {1}'.format(self._prefix, LARGE_GRAPH))
+          continue
+        reason = self.__tooLarge(option, game)
+        if reason is not None:
+          log.info('Not computing {0} of {1} in-process, {2}'.format(option, self._prefix, reason))
+          self.result['skipped'][option] = reason
+          continue
+        start = time.time()
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        try:
+          self.result['output'][name] = metric(game)
+        except MemoryError:
+          log.warning('Ran out of memory computing {0} of {1}'.format(option, self._prefix))
+          self.result['skipped'][option] = 'outofmemory'
+          continue
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        # No maxrss: that of the process is the largest peak of everything it
+        # ran so far, not that of the metric.
+        usage = {'user': after.ru_utime - before.ru_utime, 'sys': after.ru_stime - before.ru_stime,
+                 'wall': time.time() - start}
+        self.result['times'][option] = {'total': usage['user'] + usage['sys']}
+        self.result['usage'][option] = usage
+    finally:
+      game.close()
+
 class PGInfoTaskGroup(TempObj):
-  def __init__(self, pgfile, prefix, temppath, outpath):
+  '''Collects information about a parity game. The cheap information is
+     computed first; then, based on the size of the game, the planner (see
+     planner.py) decides which of the other information pginfo computes, and
+     with which timeout, which is estimated by sampling, and which is
+     skipped. The plan is recorded under 'Plan'. If the size of the game is
+     known beforehand, e.g. from pgconvert, it can be passed in sizes. Groups
+     for games with the same gamehash (see pghash.py) are only run once.'''
+  def __init__(self, pgfile, prefix, temppath, outpath, sizes=None, gamehash=None):
     super(PGInfoTaskGroup, self).__init__()
     self._prefix = prefix
     self._temppath = temppath
     self._outpath = outpath
     
     self.__pgfile = pgfile
+    self.__sizes = sizes
+    self.__gamehash = gamehash
+    self.__earlier = []
+    self.__plan = None
     
     self.result = {}
+    self.result['file'] = None
     
     # Map all options to the string with which they are indexed in the
     # resulting YAML output of pginfo.
@@ -153,16 +407,97 @@ class PGInfoTaskGroup(TempObj):
     self.__optmap["ad-cks"] = "Alternation depth [CKS93]"
     self.__optmap["ad"] = "Alternation depth (priority ordering)"
     self.__optmap["neighbourhoods=3"] = "Neighbourhood"
+  
+  def key(self):
+    return 'pginfogroup:{0}'.format(self._prefix)
+
+  def flightkey(self):
+    if self.__gamehash is None:
+      return None
+    return 'pginfogroup:{0}'.format(self.__gamehash)
+
+  def __str__(self):
+    return self.key()
+
+  def __pgstats(self, log=None):
+    '''The options that are computed exactly in-process, and those that can
+       be estimated in-process.'''
+    if not PGSTATS_INPROCESS:
+      return [], []
+    try:
+      import pgstats
+    except ImportError:
+      if log is not None:
+        log.warning('numpy is not available, collecting all information using pginfo')
+      return [], []
+    exact = [opt for (opt, _, _) in pgstats.METRICS if opt in self.__optmap]
+    sampled = [opt for (opt, _, _) in pgstats.SAMPLED if opt in self.__optmap] if SAMPLE_LARGE_GAMES else []
+    return exact, sampled
+
+  def __size(self):
+    '''The number of vertices and edges of the game, and where they come
+       from.'''
+    for r in self.__earlier:
+      if isinstance(r, PGStatsTask) and r.result['size'] is not None:
+        return r.result['size'], 'pgstats'
+    if self.__sizes is not None:
+      # The output of pgconvert consists of strings.
+      return {'vertices': int(self.__sizes['vertices']), 'edges': int(self.__sizes['edges'])}, 'given'
+    return gameSize(self.__pgfile), 'file'
 
   def phase0(self, log):
-    for opt in self.__optmap:
-      self.subtasks.append(PGInfoTask(self.__pgfile, opt, self._prefix, self._temppath, self._outpath))
-    
+    (exact, _) = self.__pgstats(log)
+    if exact:
+      self.subtasks.append(PGStatsTask(self.__pgfile, exact, self._prefix, self._temppath, self._outpath))
+
   def phase1(self, log):
+    self.__earlier = self.results
+    self.results = []
+    (exact, sampled) = self.__pgstats()
+    (sizes, source) = self.__size()
+    size = sizes['vertices'] + sizes['edges']
+    # Metrics that were too expensive to compute in-process are left to
+    # pginfo.
+    skipped = set()
+    for r in self.__earlier:
+      if isinstance(r, PGStatsTask):
+        skipped.update(r.result['skipped'])
+    options = [opt for opt in self.__optmap if opt not in exact or opt in skipped]
+    approximable = {}
+    if sampled:
+      import pgstats
+      approximable = dict((opt, pgstats.cost(opt, sizes['vertices'], sizes['edges'])) for opt in sampled)
+    plan = planner.active().plan(options, size, PGINFO_TIMEOUT, approximable)
+    self.__plan = {'vertices': sizes['vertices'], 'edges': sizes['edges'], 'source': source, 'metrics': plan}
+    approximate = []
+    for opt in options:
+      if plan[opt]['decision'] == 'exact':
+        self.subtasks.append(PGInfoTask(self.__pgfile, opt, self._prefix, self._temppath, self._outpath,
+                                        timeout=plan[opt]['timeout'], size=size))
+      elif plan[opt]['decision'] == 'approximate':
+        approximate.append(opt)
+      else:
+        log.info('Skipping {0} for {1}, expected to take {2:.0f} s'.format(opt, self._prefix, plan[opt]['estimate']))
+    if approximate:
+      self.subtasks.append(PGStatsTask(self.__pgfile, approximate, self._prefix, self._temppath, self._outpath))
+    
+  def phase2(self, log):
     log.debug('Collecting results from {0}'.format(self))
     data = {}
-    for r in self.results:
-      if 'output' in r.result.keys() and r.result['output']:
+    for r in self.__earlier + self.results:
+      if isinstance(r, PGStatsTask):
+        for opt in r.result['options']:
+          k = self.__optmap[opt]
+          if opt in r.result['skipped']:
+            data.setdefault(k, {'skipped': r.result['skipped'][opt]})
+            continue
+          v = r.result['output'].get(k, {})
+          data[k] = v if isinstance(v, dict) else {'value': v}
+          if opt in r.result['usage']:
+            data[k]['times'] = r.result['times'][opt]
+            data[k]['memory'] = 'unknown'
+            data[k]['usage'] = r.result['usage'][opt]
+      elif 'output' in r.result.keys() and r.result['output']:
         assert(len(r.result['output']) == 1)
         assert(r.result['output'].keys()[0] == self.__optmap[r.result['option']])
         (k,v) = r.result['output'].items()[0]
@@ -176,12 +511,16 @@ class PGInfoTaskGroup(TempObj):
           
         data[k]['times'] = r.result['pginfo']['times']
         data[k]['memory'] = r.result['pginfo']['memory']
+        data[k]['usage'] = r.result['pginfo']['usage']
       else: # No output recorded
         k = self.__optmap[r.result['option']]
         data[k] = {}
         data[k]['times'] = r.result['pginfo']['times']
         data[k]['memory'] = r.result['pginfo']['memory']
+        data[k]['usage'] = r.result['pginfo']['usage']
     
+    data['Plan'] = self.__plan
+
     name = self._newTempFilenameDir(self._outpath, 'yaml')
     log.debug('Writing data from {0} to {1}'.format(self, name))
     yamlfile = open(name, 'w')
@@ -190,19 +529,53 @@ class PGInfoTaskGroup(TempObj):
     self.result['file'] = name
 
 class SolveTask(pool.Task):
-  def __init__(self, name, filename, *args):
+  '''Solves a parity game with the solver in name. Tasks for games with the
+     same gamehash keyword argument (see pghash.py) are only run once. The
+     prefix keyword argument names the game across runs, e.g. after the case
+     and the equivalence it was reduced modulo; without it, the task is not
+     stored.'''
+  def __init__(self, name, filename, *args, **kwargs):
     super(SolveTask, self).__init__()
     self.__pgfile = filename
     self.__opts = list(args)
+    self.__gamehash = kwargs.pop('gamehash', None)
+    self.__prefix = kwargs.pop('prefix', None)
+    if kwargs:
+      raise TypeError('Unknown parameter(s) for SolveTask: ' + 
+                      ', '.join(['{0}={1}'.format(k, v) 
+                                 for k, v in kwargs.items()]))
     self.result = {}
     self.result['times'] = 'unknown'
     self.result['sizes'] = 'unknown'
     self.result['solution'] = 'unknown'
+    self.result['usage'] = 'unknown'
     self.name = name
 
   def pgfile(self):
     return self.__pgfile
   
+  def family(self):
+    return self.name
+  
+  def key(self):
+    if self.__prefix is None:
+      return None
+    return 'solve:{0}:{1}'.format(self.__prefix, self.name)
+
+  def flightkey(self):
+    if self.__gamehash is None:
+      return None
+    return 'solve:{0}:{1}:{2}'.format(self.name, ' '.join(self.__opts), self.__gamehash)
+
+  def __str__(self):
+    return 'solve:{0}:{1}'.format(self.name, self.__pgfile)
+  
+  def cost(self):
+    return os.path.getsize(self.__pgfile) if os.path.exists(self.__pgfile) else 1.0
+  
+  def memory(self):
+    return GAME_MEMORY_FACTOR * self.cost() // 1024
+  
   def run(self, log):
     if self.name.startswith('pbespgsolve'):
       self.run_pbespgsolve(log)
@@ -213,76 +586,160 @@ class SolveTask(pool.Task):
     try:      
       result = tools.pbespgsolve(self.__pgfile, *self.__opts, timed=True, timeout=SOLVE_TIMEOUT, memlimit=SOLVE_MEMLIMIT)
       self.result['times'] = result['times']
+      self.result['usage'] = result['usage']
       self.result['solution'] = result['out'].strip()
-    except tools.Timeout:
+    except tools.Timeout as e:
       log.info('Timeout')
       self.result['times'] = 'timeout'
-    except tools.OutOfMemory:
+      self.result['usage'] = e.result['usage']
+    except tools.OutOfMemory as e:
       log.info('Out of memory')
       self.result['memory'] = 'outofmemory'
+      self.result['usage'] = e.result['usage']
   
   def run_pgsolver(self, log):
     try:
       opts = self.__opts + ['-v', '2', self.__pgfile]
       result = tools.pgsolver(*opts, timeout=SOLVE_TIMEOUT, memlimit=SOLVE_MEMLIMIT)
-      self.result['times'] = re.search('Overall\s*\|.*?\s+([0-9.]+) sec', result['out'], re.DOTALL).group(1)
-      self.result['solution'] = re.search('Player (0|1) wins from nodes:[^}]*?[{,]0[,}]', result['out'], re.DOTALL).group(1)
-      self.result['solution'] = 'true' if self.result['solution'] == '0' else 'false'
-    except tools.Timeout:
+      self.result['times'] = result['filter']['time']
+      self.result['usage'] = result['usage']
+      if result['filter']['winner'] is not None:
+        self.result['solution'] = 'true' if result['filter']['winner'] == '0' else 'false'
+    except tools.Timeout as e:
       log.info('Timeout')
       self.result['times'] = 'timeout'
-    except tools.OutOfMemory:
+      self.result['usage'] = e.result['usage']
+    except tools.OutOfMemory as e:
       log.info('Out of memory')
       self.result['memory'] = 'outofmemory'
+      self.result['usage'] = e.result['usage']
+
+class LinearisationTask(TempObj):
+  '''Linearises an mCRL2 specification and transforms the LPS using a pipeline
+     of LPS tools. stages is a list of pairs of the name of a tool in the tools
+     module and its arguments. Cases that need the same LPS create tasks with
+     the same flight key, so only one of them does the work, and the LPS is
+     named after that key.'''
+  def __init__(self, mcrl2, stages, temppath):
+    super(LinearisationTask, self).__init__()
+    self.__mcrl2 = mcrl2
+    self.__stages = [(name, [str(arg) for arg in args]) for (name, args) in stages]
+    h = hashlib.sha1(mcrl2)
+    for (name, args) in self.__stages:
+      h.update('\0'.join(['', name] + args))
+    self.__hash = h.hexdigest()
+    self._prefix = 'lps-' + self.__hash
+    self._temppath = temppath
+    self.result = {}
+    self.result['file'] = None
+  
+  def __str__(self):
+    return ' | '.join(name for (name, _) in self.__stages)
+  
+  def family(self):
+    return 'linearisation'
+  
+  def key(self):
+    return 'linearisation:{0}'.format(self.__hash)
+  
+  def flightkey(self):
+    return self.key()
+  
+  def phase0(self, log):
+    lpsfile = self._stableTempFilename(compression.ext('lps'))
+    partial = self._partialFilename(lpsfile)
+    try:
+      result = tools.pipeline(*[getattr(tools, name).stage(*args, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)
+                                for (name, args) in self.__stages],
+                              stdin=self.__mcrl2, output=partial)
+    except:
+      self._discardPartial(partial, lpsfile)
+      raise
+    os.rename(partial, lpsfile)
+    self.result['file'] = lpsfile
+    self.result['stages'] = result['stages']
 
-class PGCase(TempObj):
+class GameTask(TempObj):
+  '''Base class for tasks that collect information about parity games and
+     solve them in subtasks.'''
   def __init__(self):
-    super(PGCase, self).__init__()
+    super(GameTask, self).__init__()
     self.result = {}
     self.result['files'] = {}
     self.result['solutions'] = {}
     self.result['sizes'] = {}
     self.result['times'] = {}
-    self._outpath = os.path.join(os.path.split(__file__)[0], 'data')
-    self.__solvepg = None
-    self.__solvebes = None
-    self.__error = False
-
-  def _makePGfile(self, log, overwriteExisting):
-    raise NotImplementedError()
+    self.result['usage'] = {}
+    self.result['disk'] = {}
+    self.result['hashes'] = {}
+    self.result['shared'] = {}
+    self.result['chain'] = {}
+    self.result['skipped'] = {}
   
-  def __collectResults(self, name):
-    for task in self.results:
+  def _collectResults(self, name, tasks):
+    for task in tasks:
+      if task.skipped is not None:
+        # Recorded by _skip.
+        continue
       if task.result.has_key('solution'):
         self.result['times'].setdefault(name, {})[task.name] = task.result['times']
+        self.result['usage'].setdefault(name, {})[task.name] = task.result['usage']
         self.result['solutions'].setdefault(name, {})[task.name] = task.result['solution']
+        if task.result.has_key('memory'):
+          self.result['memory'] = task.result['memory']
+        if task.result.has_key('shared'):
+          self.result['shared'].setdefault(name, {})[task.name] = task.result['shared']
       else:
         self.result['files'][name] = task.result['file']
+        if task.result.has_key('shared'):
+          self.result['shared'].setdefault(name, {})['info'] = task.result['shared']
   
-  def __info(self, pgfile):
-    self.subtasks.append(PGInfoTaskGroup(pgfile, self._prefix, self._temppath, self._outpath))
+  def _merge(self, reductions):
+    '''Merges the results of the ReductionTasks in reductions.'''
+    for r in reductions:
+      for key in ['files', 'solutions', 'sizes', 'times', 'usage', 'disk', 'hashes', 'shared', 'chain', 'skipped']:
+        self.result[key].update(r.result[key])
+      if r.result.has_key('memory'):
+        self.result['memory'] = r.result['memory']
+      if r.skipped is not None:
+        self.result['skipped'][r.equiv] = r.skipped
+
+  def _skip(self, name, reason):
+    '''Records that the work on the game name is skipped for reason, e.g.
+       because the game could not be made, and skips the subtasks that were
+       created for it, so that they never run.'''
+    self.result['skipped'][name] = reason
+    for task in self.subtasks:
+      task.skip(reason)
 
-  def __reduce(self, pgfile, equiv):
-    '''Reduce the PG modulo equiv using pgconvert.'''
-    reduced = self._newTempFilename('gm')
+  def _disk(self, name, pgfile):
+    '''Records the space that pgfile takes on disk, which depends on whether
+       games are stored compressed.'''
+    if pgfile is not None and os.path.exists(pgfile):
+      self.result['disk'][name] = os.path.getsize(pgfile)
+  
+  def _hash(self, name, pgfile, log):
+    '''Records and returns the hash of pgfile (see pghash.py), with which the
+       information about it and its solution are shared with games that are
+       the same. Returns None if results are not shared, or if pgfile cannot
+       be read.'''
+    if not SHARE_GAMES or pgfile is None or not os.path.exists(pgfile):
+      return None
     try:
-      result = tools.pgconvert('-ve{0}'.format(equiv), pgfile, reduced, timed=True, timeout=PGCONVERT_TIMEOUT, memlimit=PGCONVERT_MEMLIMIT)
-      self.result['sizes']['orig'] = {'vertices': result['filter']['vorig'], 'edges': result['filter']['eorig']}
-      self.result['sizes'][equiv] = {'vertices': result['filter']['vred'], 'edges': result['filter']['ered']}
-      self.result['times'].setdefault(equiv, {})['reduction'] = result['times']#['reduction']
-    except tools.Timeout:
-      log.info('Timeout')
-      self.result['times'] = 'timeout'
-    except tools.OutOfMemory:
-      log.info('Out of memory')
-      self.result['memory'] = 'outofmemory'
-    return reduced
+      self.result['hashes'][name] = pghash.gamehash(pgfile)
+    except (IOError, OSError, ValueError) as e:
+      log.warning('Cannot compute the hash of {0}, exception was {1}'.format(pgfile, e))
+      return None
+    return self.result['hashes'][name]
+
+  def _info(self, pgfile, sizes=None, gamehash=None):
+    self.subtasks.append(PGInfoTaskGroup(pgfile, self._prefix, self._temppath, self._outpath, sizes, gamehash))
 
-  def __solve(self, pgfile):
+  def _solve(self, pgfile, gamehash=None):
     '''Solve besfile using pbsespgsolve and pgsolver.'''
-    if os.path.exists(pgfile):
+    if pgfile is not None and os.path.exists(pgfile):
       self.subtasks += [
-        SolveTask('pbespgsolve', pgfile, '-srecursive')
+        SolveTask('pbespgsolve', pgfile, '-srecursive', gamehash=gamehash, prefix=self._prefix)
 #      SolveTask('pbespgsolve (spm)', pgfile),
 #      SolveTask('pbespgsolve (recursive)', pgfile, '-srecursive'),
 #      SolveTask('pgsolver (optimized spm)', pgfile, '-sp'),
@@ -295,72 +752,165 @@ class PGCase(TempObj):
 #      SolveTask('pgsolver (unoptimized strategy improvement)', pgfile, '-si', '-dgo', '-dsg', '-dlo')
       ]
 
+class ReductionTask(GameTask):
+  '''Reduces a parity game modulo an equivalence using pgconvert, and collects
+     information about the reduced game and solves it. The result has the
+     same layout as that of a PGCase, so it can be merged into it.
+     
+     If chain is a list of equivalences, reductions are chained: pgfile is
+     the quotient modulo source, and the quotients modulo the equivalences
+     in chain that are coarser than equiv (see chained) are computed from the
+     quotient modulo equiv, in subtasks. The sizes are those of the quotient
+     and, for a reduction of the original game, of the original game. The
+     timings of every step are recorded under 'reduction', and the sum of the
+     timings of the steps from the original game under 'cumulative', which
+     are accumulated in cumulative. The source of every quotient is recorded
+     under 'chain'.'''
+  def __init__(self, pgfile, equiv, prefix, temppath, outpath, source='orig', chain=None, cumulative=None):
+    super(ReductionTask, self).__init__()
+    self.__pgfile = pgfile
+    self.equiv = equiv
+    self.__caseprefix = prefix
+    self.__source = source
+    self.__chain = chain
+    self.__cumulative = cumulative
+    self._prefix = prefix + '_' + equiv
+    self._temppath = temppath
+    self._outpath = outpath
+  
+  def family(self):
+    return 'pgconvert'
+  
+  def key(self):
+    return 'reduction:{0}'.format(self._prefix)
+
+  def __str__(self):
+    return self.key()
+  
+  def cost(self):
+    return os.path.getsize(self.__pgfile) if os.path.exists(self.__pgfile) else 1.0
+  
+  def memory(self):
+    return GAME_MEMORY_FACTOR * self.cost() // 1024
+
+  def __reduce(self, log):
+    '''Reduce the PG modulo equiv using pgconvert. Returns the reduced game,
+       and why pgconvert failed, or None if it succeeded.'''
+    reduced = self._stableTempFilename(compression.ext('gm'))
+    partial = self._partialFilename(reduced)
+    try:
+      result = tools.pgconvert('-ve{0}'.format(self.equiv), self.__pgfile, partial, outputs=[partial], timed=True, timeout=PGCONVERT_TIMEOUT, memlimit=PGCONVERT_MEMLIMIT)
+      os.rename(partial, reduced)
+      if self.__source == 'orig':
+        self.result['sizes']['orig'] = {'vertices': result['filter']['vorig'], 'edges': result['filter']['eorig']}
+      self.result['sizes'][self.equiv] = {'vertices': result['filter']['vred'], 'edges': result['filter']['ered']}
+      self.result['times'].setdefault(self.equiv, {})['reduction'] = result['times']#['reduction']
+      self.result['usage'].setdefault(self.equiv, {})['reduction'] = result['usage']
+      if self.__chain is not None:
+        self.__cumulative = addTimes(self.__cumulative, result['times'])
+        self.result['times'][self.equiv]['cumulative'] = self.__cumulative
+        self.result['chain'][self.equiv] = self.__source
+      return reduced, None
+    except tools.Timeout as e:
+      log.info('Timeout')
+      self._discardPartial(partial, reduced)
+      self.result['times'][self.equiv] = 'timeout'
+      self.result['usage'].setdefault(self.equiv, {})['reduction'] = e.result['usage']
+      return reduced, 'timeout'
+    except tools.OutOfMemory as e:
+      log.info('Out of memory')
+      self._discardPartial(partial, reduced)
+      self.result['memory'] = 'outofmemory'
+      self.result['usage'].setdefault(self.equiv, {})['reduction'] = e.result['usage']
+      return reduced, 'out of memory'
+    except:
+      self._discardPartial(partial, reduced)
+      raise
+  
   def phase0(self, log):
+    log.debug('Reducing {0} modulo {1}'.format(self.__pgfile, self.equiv))
+    (reduced, failure) = self.__reduce(log)
+    self.__reduced = reduced
+    self._disk(self.equiv, reduced)
+    gamehash = self._hash(self.equiv, reduced, log) if failure is None else None
+    log.debug('Collecting information from {0}'.format(self))
+    self._info(reduced, self.result['sizes'].get(self.equiv), gamehash)
+    log.debug('Solving {0}'.format(self))
+    self._solve(reduced, gamehash)
+    if failure is not None:
+      self._skip(self.equiv, 'skipped (upstream {0})'.format(failure))
+    if self.__chain is not None:
+      for equiv in chained(self.equiv, self.__chain):
+        if failure is None:
+          log.debug('Reducing {0} quotient modulo {1} ({2})'.format(self.equiv, equiv, self))
+          self.subtasks.append(ReductionTask(reduced, equiv, self.__caseprefix, self._temppath, self._outpath,
+                                             self.equiv, self.__chain, self.__cumulative))
+        else:
+          # Skip the failed step.
+          self.subtasks.append(ReductionTask(self.__pgfile, equiv, self.__caseprefix, self._temppath, self._outpath,
+                                             self.__source, self.__chain, self.__cumulative))
+  
+  def phase1(self, log):
+    self._collectResults(self.equiv, [r for r in self.results if not isinstance(r, ReductionTask)])
+    self._merge([r for r in self.results if isinstance(r, ReductionTask)])
+    self._removeBinary(self.__reduced)
+
+class PGCase(GameTask):
+  '''A parity game that is generated, after which it is reduced modulo all
+     enabled equivalences at the same time. Information about every game is
+     collected, and every game is solved, in subtasks.'''
+  def __init__(self):
+    super(PGCase, self).__init__()
+    self._outpath = os.path.join(os.path.split(__file__)[0], 'data')
+    self.__error = False
+
+  def _makePGfile(self, log, overwriteExisting):
+    raise NotImplementedError()
+  
+  def key(self):
+    return 'game:{0}'.format(self._prefix)
+  
+  def __reductions(self):
+    return [equiv for (equiv, enabled) in [('bisim', BISIM_REDUCE), ('fmib', FMIB_REDUCE),
+                                           ('stut', STUT_REDUCE), ('gstut', GSTUT_REDUCE)] if enabled]
+
+  def phase0(self, log):
+    failure = None
     try:
       self.__pgfile = self._makePGfile(log, RETURN_EXISTING)
-    except (Timeout, OutOfMemory):
+    except (Timeout, OutOfMemory) as e:
       # If parity game generation fails due to timeout or out of memory,
       # we still record it in the output.
       # Therefore we need to make sure that the exception does not get through
       # to the calling layers.
       self.__error = True
-      pass
+      self.__pgfile = None
+      failure = 'timeout' if isinstance(e, Timeout) else 'out of memory'
     
+    self._disk('original', self.__pgfile)
+    gamehash = self._hash('original', self.__pgfile, log)
     log.debug('Collecting information from original {0}'.format(self))
-    self.__info(self.__pgfile)
+    self._info(self.__pgfile, gamehash=gamehash)
     log.debug('Solving original {0}'.format(self))
-    self.__solve(self.__pgfile)
+    self._solve(self.__pgfile, gamehash)
+    reductions = self.__reductions()
+    chain = None
+    if CHAIN_REDUCTIONS:
+      # The other reductions are started by the ones they depend on.
+      (chain, reductions) = (reductions, chained(None, reductions))
+    for equiv in reductions:
+      log.debug('Reducing original modulo {0} ({1})'.format(equiv, self))
+      self.subtasks.append(ReductionTask(self.__pgfile, equiv, self._prefix, self._temppath, self._outpath, chain=chain))
+    if failure is not None:
+      # Nothing can be done with a game that was not generated.
+      self._skip('original', 'skipped (upstream {0})'.format(failure))
+      for equiv in self.__reductions():
+        self.result['skipped'][equiv] = 'skipped (upstream {0})'.format(failure)
   
   def phase1(self, log):
-    self.__collectResults('original')
-    if BISIM_REDUCE:
-      log.debug('Reducing original modulo bisim ({0})'.format(self))
-      self._prefix = self._prefix + '_bisim'
-      bisimpg = self.__reduce(self.__pgfile, 'bisim')
-      log.debug('Collecting information from bisim {0}'.format(self))
-      self.__info(bisimpg)
-      log.debug('Solving stut {0}'.format(self))
-      self.__solve(bisimpg)
-  
-  def phase2(self, log):
-    if BISIM_REDUCE:
-      self.__collectResults('bisim')
-    if FMIB_REDUCE:
-      log.debug('Reducing original modulo  ({0})'.format(self))
-      self._prefix = self._prefix.replace('_bisim', '_fmib')
-      fmibpg = self.__reduce(self.__pgfile, 'fmib')
-      log.debug('Collecting information from fmib {0}'.format(self))
-      self.__info(fmibpg)
-      log.debug('Solving fmib {0}'.format(self))
-      self.__solve(fmibpg)
-      
-  def phase3(self, log):
-    if FMIB_REDUCE:
-      self.__collectResults('fmib')
-    if STUT_REDUCE:
-      log.debug('Reducing original modulo  ({0})'.format(self))
-      self._prefix = self._prefix.replace('_fmib', '_stut')
-      stutpg = self.__reduce(self.__pgfile, 'stut')
-      log.debug('Collecting information from stut {0}'.format(self))
-      self.__info(stutpg)
-      log.debug('Solving stut {0}'.format(self))
-      self.__solve(stutpg)
-      
-  def phase4(self, log):
-    if STUT_REDUCE:
-      self.__collectResults('stut')
-    if GSTUT_REDUCE:
-      log.debug('Reducing original modulo  ({0})'.format(self))
-      self._prefix = self._prefix.replace('_stut', '_gstut')
-      gstutpg = self.__reduce(self.__pgfile, 'gstut')
-      log.debug('Collecting information from gstut {0}'.format(self))
-      self.__info(gstutpg)
-      log.debug('Solving gstut {0}'.format(self))
-      self.__solve(gstutpg)  
-    
-  def phase5(self, log):
-    if GSTUT_REDUCE:
-      self.__collectResults('gstut')
+    self._collectResults('original', [r for r in self.results if not isinstance(r, ReductionTask)])
+    self._merge([r for r in self.results if isinstance(r, ReductionTask)])
+    self._removeBinary(self.__pgfile)
     log.debug('Done {0}'.format(self))
     
 class PBESCase(PGCase):
@@ -369,8 +919,25 @@ class PBESCase(PGCase):
     self.result['generation'] = {}
     self.result['generation']['tool'] = "pbes2bes"
   
-  def _makePBES(self):
+  def _pbesPipeline(self):
+    '''Returns the stages of a pipeline (see tools.pipeline) that writes the
+       PBES from which the game is generated to its standard output, and the
+       standard input of the pipeline.'''
     raise NotImplementedError() 
+  
+  def _makePBES(self):
+    '''Returns an Artifact with the PBES from which the game is generated. The
+       results of the stages of the pipeline that made it are recorded under
+       generation/pbes.'''
+    (stages, stdin) = self._pbesPipeline()
+    pbesfile = self._newTempFilename(compression.ext('pbes'))
+    try:
+      result = tools.pipeline(*stages, stdin=stdin, output=pbesfile)
+    except (OutOfMemory, Timeout, ToolException) as e:
+      self.result['generation']['pbes'] = e.result['stages']
+      raise
+    self.result['generation']['pbes'] = result['stages']
+    return Artifact(pbesfile)
     
   def _makePGfile(self, _, returnExisting):
     # Optimisation: if file exists, return the existing file instead of the 
@@ -378,18 +945,212 @@ class PBESCase(PGCase):
     if pgfile and returnExisting:
       return pgfile
     
-    pbes = self._newTempFile('pbes')
-    pbes.write(self._makePBES())
-    pbes.close()
-    pgfile = self._newTempFilename('gm')
+    pbes = self._makePBES()
+    pgfile = self._stableTempFilename(compression.ext('gm'))
+    partial = self._partialFilename(pgfile)
     try:
-      result = tools.pbes2bes('-s0', '-rjittyc', '-opgsolver', pbes.name, pgfile, memlimit=PBES2BES_MEMLIMIT, timeout=PBES2BES_TIMEOUT, timed=True)
-      os.unlink(pbes.name)
+      result = tools.pbes2bes('-s0', '-rjittyc', '-opgsolver', pbes.path, partial, outputs=[partial], memlimit=PBES2BES_MEMLIMIT, timeout=PBES2BES_TIMEOUT, timed=True)
+      os.rename(partial, pgfile)
     except (OutOfMemory, Timeout) as e:
-      result = e.result
+      self._discardPartial(partial, pgfile)
+      self.result['generation']['times'] = e.result['times']
+      self.result['generation']['memory'] = e.result['memory']
+      self.result['generation']['usage'] = e.result['usage']
+      # The game is incomplete, see PGCase.
+      raise
+    except:
+      self._discardPartial(partial, pgfile)
+      raise
+    finally:
+      # Only the game is kept.
+      os.unlink(pbes.path)
       
     self.result['generation']['times'] = result['times']
     self.result['generation']['memory'] = result['memory']
+    self.result['generation']['usage'] = result['usage']
     
     return pgfile
 
+def doubling(value):
+  return 2 * value
+
+def increment(value):
+  return value + 1
+
+def exceeded(result):
+  '''Whether a tool exceeded its time or memory limit while making or solving
+     a game in result, the result of a case, which may contain the results of
+     several games (properties or instances).'''
+  if isinstance(result, list):
+    return any(exceeded(r) for r in result)
+  if not isinstance(result, dict):
+    return False
+  if result.get('skipped') or result.get('memory') == 'outofmemory':
+    return True
+  times = result.get('times')
+  if times == 'timeout':
+    return True
+  if isinstance(times, dict):
+    for t in times.values():
+      if t == 'timeout' or (isinstance(t, dict) and 'timeout' in t.values()):
+        return True
+  return exceeded(result.get('properties')) or exceeded(result.get('instances'))
+
+class Series(object):
+  '''The cases of a family in which one parameter grows, for the values of
+     that parameter in values. The case for a value is cls(*args, **kwargs),
+     with the value as keyword argument param, or inserted into args at
+     position param if it is a number, or appended to args if param is None;
+     a value of None is not passed at all. If replicas is given, there is a
+     case for every id in replicas, passed as keyword argument id. If step is
+     given, the series can be extended beyond its last value v with step(v).
+     Series are pickled with the Sweep that runs them, so cls and step must
+     be defined at the top level of a module.'''
+  def __init__(self, name, values, cls, args=(), kwargs=None, param=None, replicas=None, step=None):
+    self.name = name
+    self.values = list(values)
+    self.step = step
+    self.__cls = cls
+    self.__args = tuple(args)
+    self.__kwargs = kwargs or {}
+    self.__param = param
+    self.__replicas = replicas
+
+  def __str__(self):
+    return self.name
+
+  def make(self, value):
+    '''The cases for value.'''
+    args = list(self.__args)
+    kwargs = dict(self.__kwargs)
+    if value is not None:
+      if isinstance(self.__param, basestring):
+        kwargs[self.__param] = value
+      elif self.__param is not None:
+        args.insert(self.__param, value)
+      else:
+        args.append(value)
+    if self.__replicas is None:
+      return [self.__cls(*args, **kwargs)]
+    return [self.__cls(*args, **dict(kwargs, id=i)) for i in self.__replicas]
+
+  def cases(self):
+    '''Generates the cases for all values, in order.'''
+    for value in self.values:
+      for case in self.make(value):
+        yield case
+
+class CaseFilter(object):
+  '''Selects the cases whose name matches one of the regular expressions in
+     include (or any name if there are none) and none of those in exclude,
+     and whose family is in families (or any family if there are none).'''
+  def __init__(self, include=(), exclude=(), families=()):
+    self.__include = [re.compile(pattern) for pattern in include]
+    self.__exclude = [re.compile(pattern) for pattern in exclude]
+    self.__families = set(families)
+
+  def __call__(self, case):
+    name = str(case)
+    if self.__include and not any(pattern.search(name) for pattern in self.__include):
+      return False
+    if any(pattern.search(name) for pattern in self.__exclude):
+      return False
+    return not self.__families or case.family() in self.__families
+
+class Sweep(pool.Task):
+  '''Runs the cases of a Series from the smallest value upwards: the cases
+     for a value are started when those for the previous value have finished,
+     unless one of those failed or exceeded a time or memory limit (see
+     exceeded), in which case larger values are not tried. When all values of
+     the series have been tried, the series is extended using its step for as
+     long as its cases took less than budget seconds in total; without a
+     budget, it is not extended. Cases whose key (see Task.key) is in done,
+     which maps keys to results, e.g. from the results file of an earlier
+     run, are not run again, but their results count for stopping and for
+     the budget. If select is given, only the cases for which it returns True
+     are considered (see CaseFilter), and the series is not extended beyond a
+     value without such cases. The cases are reported by the pool as soon as
+     they finish (see Task.report); only their names are kept, in cases. The
+     values that were tried and the reason for stopping are in result.'''
+  def __init__(self, series, budget=None, done=None, select=None):
+    super(Sweep, self).__init__()
+    self.series = series
+    self.cases = []
+    self.__budget = budget
+    # Only what is needed to decide whether to go on, so that the results
+    # are not passed to the workers with the sweep.
+    self.__done = dict((key, exceeded(result)) for (key, result) in (done or {}).items())
+    self.__spent = sum(result.get('elapsed', 0) for result in (done or {}).values() if isinstance(result, dict))
+    self.__stops = []
+    self.__select = select
+    self.__index = 0
+    self.__last = None
+    self.__finished = False
+    self.result = {'series': series.name, 'values': [], 'stopped': None}
+
+  @property
+  def done(self):
+    return self.__finished
+
+  def restore(self, result):
+    super(Sweep, self).restore(result)
+    self.__finished = True
+
+  def __str__(self):
+    return 'sweep:{0}'.format(self.series.name)
+
+  def _collect(self, result):
+    super(Sweep, self)._collect(result)
+    self.results = []
+    self.cases.append(str(result))
+    if result.failed is not None:
+      self.__stops.append('{0} failed'.format(result))
+    elif exceeded(result.result):
+      self.__stops.append('limit exceeded by {0}'.format(result))
+    if isinstance(result.result, dict):
+      self.__spent += result.result.get('elapsed', 0)
+
+  def _subtaskFailed(self, task):
+    '''A case that failed stops the sweep (see _collect), but does not make
+       it fail: the other cases were run.'''
+    pass
+
+  def __next(self):
+    '''The next value to try, or None and the reason for stopping.'''
+    if self.__index < len(self.series.values):
+      self.__index += 1
+      return self.series.values[self.__index - 1], None
+    if self.series.step is None or self.__last is None:
+      return None, 'all values tried'
+    if self.__budget is None or self.__spent >= self.__budget:
+      return None, 'budget reached'
+    return self.series.step(self.__last), None
+
+  def run(self, log):
+    while not self.__stops:
+      (value, stopped) = self.__next()
+      if stopped is not None:
+        self.result['stopped'] = stopped
+        self.__finished = True
+        return
+      self.__last = value
+      cases = [case for case in self.series.make(value) if self.__select is None or self.__select(case)]
+      if not cases:
+        if self.__index < len(self.series.values):
+          continue
+        self.result['stopped'] = 'no cases selected for {0}'.format(value)
+        self.__finished = True
+        return
+      self.result['values'].append(value)
+      self.subtasks = [case for case in cases if case.key() not in self.__done]
+      for case in self.subtasks:
+        case.report = True
+      self.__stops = ['limit exceeded by {0}'.format(case) for case in cases
+                      if self.__done.get(case.key())]
+      if self.subtasks and not self.__stops:
+        return
+    # Cases for the current value that are still to be run are not needed.
+    self.subtasks = []
+    self.result['stopped'] = self.__stops[0]
+    log.info('Not scaling up {0} any further: {1}'.format(self.series, self.result['stopped']))
+    self.__finished = True
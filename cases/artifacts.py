@@ -0,0 +1,33 @@
+import hashlib
+import os
+from compression import openPlain
+
+def digest(filename):
+  '''Returns the SHA-1 hash of the contents of filename.'''
+  h = hashlib.sha1()
+  f = open(filename, 'rb')
+  block = f.read(1 << 20)
+  while block:
+    h.update(block)
+    block = f.read(1 << 20)
+  f.close()
+  return h.hexdigest()
+
+class Artifact(object):
+  '''Handle to the output of a tool that is stored in a file. Tasks pass these
+     handles to each other instead of the output itself, so that the contents
+     stay on disk.'''
+  def __init__(self, path):
+    self.path = path
+    self.size = os.path.getsize(path)
+    self.digest = digest(path)
+  
+  def open(self):
+    '''Opens the artifact for reading its uncompressed contents.'''
+    return openPlain(self.path)
+  
+  def __str__(self):
+    return self.path
+  
+  def __repr__(self):
+    return 'Artifact({0!r}, size={1}, sha1={2})'.format(self.path, self.size, self.digest)
@@ -0,0 +1,191 @@
+import cPickle as pickle
+import distutils.spawn
+import hashlib
+import tempfile
+import shutil
+import errno
+import fcntl
+import os
+from artifacts import Artifact, digest
+
+# The cache used by all tools, see configure().
+_ACTIVE = None
+
+# When a cache has grown beyond its maximum size, the least recently used
+# entries are removed until it is at most LOW_WATER times that size, so that it
+# is not scanned again for every entry that is stored after that.
+LOW_WATER = 0.9
+
+def configure(directory, maxsize=None):
+  '''Makes all tools use a cache in directory, of at most maxsize bytes. If
+     directory is None, the cache is disabled. This must be done before the
+     TaskPool is created, so that the worker processes use the same cache.'''
+  global _ACTIVE
+  _ACTIVE = Cache(directory, maxsize) if directory is not None else None
+  return _ACTIVE
+
+def active():
+  '''Returns the cache used by the tools, or None.'''
+  return _ACTIVE
+
+__fingerprints = {}
+__digests = {}
+
+def fingerprint(name):
+  '''Identifies the version of the tool name in the PATH by the location,
+     modification time and size of its binary. Returns None if the tool
+     cannot be found.'''
+  if name not in __fingerprints:
+    path = distutils.spawn.find_executable(name)
+    if path is None:
+      return None
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    __fingerprints[name] = '{0}:{1}:{2}'.format(path, st.st_mtime, st.st_size)
+  return __fingerprints[name]
+
+def fileDigest(filename):
+  '''Like artifacts.digest, but does not read a file again as long as its
+     modification time and size stay the same.'''
+  st = os.stat(filename)
+  stamp = (st.st_mtime, st.st_size)
+  if __digests.get(filename, (None, None))[0] != stamp:
+    __digests[filename] = (stamp, digest(filename))
+  return __digests[filename][1]
+
+class Cache(object):
+  '''A persistent cache of the results of tool invocations that write their
+     output to files. An entry is identified by a key that is computed from
+     the command lines that are run, with arguments that name input files
+     replaced by the hash of their contents, the hash of the standard input
+     and the fingerprints of the tools. It stores the output files and the
+     result of the invocation. Entries are directories that are created under
+     a temporary name and then renamed, so several processes can share a
+     cache. If the cache grows beyond maxsize bytes, the entries that were
+     used least recently are removed. The size of the cache is kept in the
+     file .size in directory, which all processes update when they store an
+     entry, so that the entries only need to be listed when some have to be
+     removed.'''
+  def __init__(self, directory, maxsize=None):
+    self.directory = directory
+    self.maxsize = maxsize
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+
+  def key(self, cmdlines, stdin, outputs, *extra):
+    '''Returns the key of running the pipeline of cmdlines on stdin, which
+       writes to the files outputs, or None if one of the tools cannot be
+       found. Anything else that determines the result is passed in extra.'''
+    h = hashlib.sha1()
+    for cmdline in cmdlines:
+      tool = fingerprint(cmdline[0])
+      if tool is None:
+        return None
+      h.update('tool:{0}\0'.format(tool))
+      for arg in [str(x) for x in cmdline[1:]]:
+        if arg in outputs:
+          h.update('output:{0}\0'.format(outputs.index(arg)))
+        elif os.path.isfile(arg):
+          h.update('file:{0}\0'.format(fileDigest(arg)))
+        else:
+          h.update('arg:{0}\0'.format(arg))
+    if isinstance(stdin, Artifact):
+      h.update('stdin:{0}\0'.format(stdin.digest))
+    elif stdin is not None:
+      h.update('stdin:{0}\0'.format(hashlib.sha1(stdin).hexdigest()))
+    for x in extra:
+      h.update('extra:{0}\0'.format(x))
+    return h.hexdigest()
+
+  def __entry(self, key):
+    return os.path.join(self.directory, key[:2], key)
+
+  def lookup(self, key, outputs):
+    '''If there is an entry for key, copies its files to outputs and returns
+       its result. Returns None otherwise.'''
+    entry = self.__entry(key)
+    try:
+      result = pickle.load(open(os.path.join(entry, 'result'), 'rb'))
+      for (i, output) in enumerate(outputs):
+        shutil.copyfile(os.path.join(entry, str(i)), output)
+      os.utime(entry, None)
+      return result
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+      # Not cached, or evicted while we were reading it.
+      return None
+
+  def store(self, key, result, outputs):
+    '''Stores result and a copy of the files outputs under key.'''
+    entry = self.__entry(key)
+    try:
+      os.makedirs(os.path.dirname(entry))
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+    temp = tempfile.mkdtemp(dir=self.directory, prefix='.new-')
+    try:
+      for (i, output) in enumerate(outputs):
+        shutil.copyfile(output, os.path.join(temp, str(i)))
+      pickle.dump(result, open(os.path.join(temp, 'result'), 'wb'), pickle.HIGHEST_PROTOCOL)
+      size = sum(os.path.getsize(os.path.join(temp, f)) for f in os.listdir(temp))
+      os.rename(temp, entry)
+    except (IOError, OSError):
+      # E.g. another process stored the same entry in the meantime.
+      shutil.rmtree(temp, ignore_errors=True)
+      return
+    if self.maxsize is not None:
+      total = self.__size(lambda total: total + size if total is not None else None)
+      if total is None or total > self.maxsize:
+        self.evict()
+
+  def __size(self, update):
+    '''Replaces the size of the cache that is recorded in .size, or None if
+       there is none, by update(size), and returns the new size. The file is
+       locked, so that processes that store entries at the same time do not
+       lose each other's updates.'''
+    fd = os.open(os.path.join(self.directory, '.size'), os.O_RDWR | os.O_CREAT)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      recorded = os.read(fd, 64).strip()
+      total = update(int(recorded) if recorded else None)
+      os.lseek(fd, 0, os.SEEK_SET)
+      os.ftruncate(fd, 0)
+      if total is not None:
+        os.write(fd, str(total))
+      return total
+    finally:
+      os.close(fd)
+
+  def evict(self):
+    '''Removes the least recently used entries until the cache fits in
+       LOW_WATER * maxsize, and records the size of what is left.'''
+    if self.maxsize is None:
+      return
+    entries = []
+    total = 0
+    for shard in os.listdir(self.directory):
+      if shard.startswith('.'):
+        continue
+      for key in os.listdir(os.path.join(self.directory, shard)):
+        entry = os.path.join(self.directory, shard, key)
+        try:
+          size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+          entries.append((os.path.getmtime(entry), size, entry))
+          total += size
+        except OSError:
+          pass
+    entries.sort()
+    for (_, size, entry) in entries:
+      if total <= LOW_WATER * self.maxsize:
+        break
+      # Rename first, so that no process sees a partially removed entry.
+      temp = tempfile.mktemp(dir=self.directory, prefix='.old-')
+      try:
+        os.rename(entry, temp)
+        shutil.rmtree(temp, ignore_errors=True)
+      except OSError:
+        pass
+      total -= size
+    # Entries that other processes stored while we were listing them may not
+    # be counted; the next time the entries are listed, they are.
+    self.__size(lambda _: total)
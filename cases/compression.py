@@ -0,0 +1,187 @@
+import distutils.spawn
+import subprocess
+import tempfile
+import shutil
+import signal
+import errno
+import fcntl
+import os
+from limits import LimitedProcess
+
+# Commands that compress standard input to standard output and back, and the
+# extension of the compressed files. gzip is run with -n, so that the same
+# contents always give the same file (see cache.py).
+METHODS = {
+    'gzip': (['gzip', '-n', '-c'], ['gzip', '-d', '-c'], '.gz'),
+    'zstd': (['zstd', '-q', '-c'], ['zstd', '-q', '-d', '-c'], '.zst')
+  }
+
+# The method with which new games, PBESs and LPSs are compressed, see
+# configure().
+_METHOD = None
+
+def configure(method):
+  '''Makes new games, PBESs and LPSs be stored compressed using method, one of
+     the keys of METHODS, or 'auto' for zstd if it is installed and gzip
+     otherwise. If method is None, files are stored uncompressed. Like the
+     cache, this must be done before the TaskPool is created.'''
+  global _METHOD
+  if method == 'auto':
+    method = 'zstd' if distutils.spawn.find_executable('zstd') else 'gzip'
+  if method is not None and method not in METHODS:
+    raise ValueError('Unknown compression method {0}'.format(method))
+  _METHOD = method
+  return _METHOD
+
+def ext(extension):
+  '''The extension of new files of type extension (e.g. 'gm').'''
+  if _METHOD is None:
+    return extension
+  return extension + METHODS[_METHOD][2]
+
+def method(path):
+  '''The method with which path is compressed, or None.'''
+  for (name, (_, _, suffix)) in METHODS.items():
+    if path.endswith(suffix):
+      return name
+  return None
+
+def plain(path):
+  '''The name of path without the extension of the compression method.'''
+  if method(path) is None:
+    return path
+  return path[:-len(METHODS[method(path)][2])]
+
+class _Plain(object):
+  '''The uncompressed contents of a compressed file, read from the standard
+     output of a decompressor. Like a file, it can be read, iterated over and
+     passed as the standard input of a process. close() waits for the
+     decompressor, and raises an IOError if it failed. Closing it before all
+     contents are read is not an error: the decompressor is then killed by
+     SIGPIPE, which limitexec.py restores.'''
+  def __init__(self, path):
+    self.__path = path
+    self.__process = LimitedProcess(METHODS[method(path)][1] + [path], stdout=subprocess.PIPE)
+    self.__file = self.__process.stdout
+
+  def __getattr__(self, name):
+    return getattr(self.__file, name)
+
+  def __iter__(self):
+    return iter(self.__file)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    self.close()
+
+  def close(self):
+    if self.__process.returncode is not None:
+      return
+    self.__file.close()
+    if self.__process.wait() not in [0, -signal.SIGPIPE]:
+      raise IOError('Decompressing {0} failed with exit code {1}'.format(self.__path, self.__process.returncode))
+
+def openPlain(path):
+  '''Opens path for reading its uncompressed contents. The result must be
+     closed, which raises an IOError if path could not be decompressed.'''
+  if method(path) is None:
+    return open(path, 'rb')
+  return _Plain(path)
+
+class Streams(object):
+  '''Lets a tool read and write compressed files as if they were plain text.
+     Every compressed file is replaced by a named FIFO with the same name,
+     minus the compression extension, from which a decompressor streams its
+     contents or into which the tool writes for a compressor. A decompressor
+     is started by a shell that blocks on opening the FIFO until the tool
+     opens it. A compressor reads from the FIFO right away; we keep the FIFO
+     open for writing until close(), so that it only sees the end of its
+     input after the tool has finished. Call close() when the tool has
+     finished.'''
+  def __init__(self):
+    self.__dir = None
+    self.__readers = []
+    self.__writers = []
+
+  def __fifo(self, path):
+    if self.__dir is None:
+      self.__dir = tempfile.mkdtemp(prefix='streams-')
+    fifo = os.path.join(self.__dir, '{0}-{1}'.format(len(self.__readers) + len(self.__writers),
+                                                     os.path.basename(plain(path))))
+    os.mkfifo(fifo)
+    return fifo
+
+  def __helper(self, command, source, target):
+    return subprocess.Popen(['sh', '-c', 'source=$0; target=$1; shift; exec "$@" < "$source" > "$target"',
+                             source, target] + command, close_fds=True)
+
+  def reader(self, path):
+    '''Returns a name from which the uncompressed contents of path can be
+       read.'''
+    if method(path) is None or not os.path.isfile(path):
+      return path
+    fifo = self.__fifo(path)
+    self.__readers.append((fifo, self.__helper(METHODS[method(path)][1], path, fifo)))
+    return fifo
+
+  def writer(self, path):
+    '''Returns a name to which the uncompressed contents of path can be
+       written.'''
+    if method(path) is None:
+      return path
+    fifo = self.__fifo(path)
+    # Opening a FIFO blocks until its other end is open too, except for
+    # reading with O_NONBLOCK. So open it for reading first, then hold it open
+    # for writing, and let the compressor read from the first descriptor.
+    source = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+      held = os.open(fifo, os.O_WRONLY)
+      try:
+        fcntl.fcntl(held, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+        fcntl.fcntl(source, fcntl.F_SETFL, fcntl.fcntl(source, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+        with open(path, 'wb') as target:
+          p = subprocess.Popen(METHODS[method(path)][0], stdin=source, stdout=target, close_fds=True)
+      except:
+        os.close(held)
+        raise
+    finally:
+      os.close(source)
+    self.__writers.append((held, p, path))
+    return fifo
+
+  def __unblock(self, fifo, flags):
+    '''Opens fifo for a moment, for the helper that may still be waiting for
+       the tool to open it.'''
+    try:
+      os.close(os.open(fifo, flags | os.O_NONBLOCK))
+    except OSError as e:
+      if e.errno != errno.ENXIO:
+        raise
+
+  def close(self):
+    '''Waits for the helpers. Raises an IOError if a file could not be
+       compressed.'''
+    try:
+      for (fifo, p) in self.__readers:
+        # The tool need not read all of its input.
+        self.__unblock(fifo, os.O_RDONLY)
+        if p.poll() is None:
+          p.kill()
+        p.wait()
+    finally:
+      # The compressors see the end of their input once we stop holding
+      # their FIFOs open, since the tool has finished.
+      failed = []
+      for (held, p, path) in self.__writers:
+        os.close(held)
+        if p.wait() != 0:
+          failed.append(path)
+      if self.__dir is not None:
+        shutil.rmtree(self.__dir, ignore_errors=True)
+      self.__readers = []
+      self.__writers = []
+      self.__dir = None
+    if failed:
+      raise IOError('Compressing {0} failed'.format(', '.join(failed)))
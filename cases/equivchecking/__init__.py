@@ -3,7 +3,8 @@ import logging
 import traceback
 import multiprocessing
 import os
-from cases import tools, PBESCase, TempObj, LPSTOOLS_MEMLIMIT, LPSTOOLS_TIMEOUT
+from cases import tools, PBESCase, TempObj, LinearisationTask, parameterCost, LPSTOOLS_MEMLIMIT, LPSTOOLS_TIMEOUT
+from cases.artifacts import Artifact
 import specs
 
 class EquivCase(PBESCase):
@@ -21,13 +22,15 @@ class EquivCase(PBESCase):
   def __str__(self):
     return self.equiv
   
-  def _makePBES(self):
-    result = tools.lpsbisim2pbes('-b' + self.equiv, self.lpsfile1, self.lpsfile2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    result = tools.pbesconstelm(stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    return result
+  def _pbesPipeline(self):
+    '''Encodes whether the two LPSs are equivalent in a PBES, and applies
+       pbesconstelm to it.'''
+    return ([tools.lpsbisim2pbes.stage('-b' + self.equiv, self.lpsfile1.path, self.lpsfile2.path, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT),
+             tools.pbesconstelm.stage(memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)],
+            None)
   
 class Case(TempObj):
-  def __init__(self, description, spec1, spec2):
+  def __init__(self, description, spec1=None, spec2=None):
     super(Case, self).__init__()
     self.__desc = description
     self.__files = []
@@ -43,30 +46,33 @@ class Case(TempObj):
   def __str__(self):
     return self.__desc
 
-  def __linearise(self, log):
+  def key(self):
+    return 'equivchecking:{0}'.format(self._prefix)
+
+  def _specs(self):
+    '''The mCRL2 specifications that are compared.'''
+    return [self.spec1, self.spec2]
+
+  def phase0(self, log):
     '''Linearises self.spec1 and self.spec2 and applies lpssuminst to the 
-       resulting LPSs.'''
-    log.info('Linearising LPSs for {0}'.format(self))
-    result1 = tools.mcrl22lps('-fnD', stdin=self.spec1, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    result2 = tools.mcrl22lps('-fnD', stdin=self.spec2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.info('Applying lpssuminst to LPSs for {0}'.format(self))
-    result1 = tools.lpssuminst('-f', stdin=result1, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    result2 = tools.lpssuminst('-f', stdin=result2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    lpsfile1 = self._newTempFile('lps', ".spec1")
-    lpsfile1.write(result1)
-    lpsfile1.close()
-    lpsfile2 = self._newTempFile('lps', ".spec2")
-    lpsfile2.write(result2)
-    lpsfile2.close()
-    return lpsfile1.name, lpsfile2.name
+       resulting LPSs in subtasks. Specifications that occur in several cases
+       are linearised only once.'''
+    log.info('Linearising LPSs for {0} and applying lpssuminst to them'.format(self))
+    tasks = [LinearisationTask(spec, [('mcrl22lps', ['-fnD']), ('lpssuminst', ['-f'])], self._temppath)
+             for spec in self._specs()]
+    self.__lpskeys = [task.flightkey() for task in tasks]
+    self.subtasks += tasks
   
-  def phase0(self, log):
-    lpsfile1, lpsfile2 = self.__linearise(log)
+  def phase1(self, log):
+    files = dict((r.flightkey(), r.result['file']) for r in self.results)
+    stages = dict((r.flightkey(), r.result.get('stages')) for r in self.results)
+    self.result['linearisation'] = [stages[key] for key in self.__lpskeys]
+    lpsfile1, lpsfile2 = [Artifact(files[key]) for key in self.__lpskeys]
     for equiv in ['strong-bisim', 'weak-bisim', 'branching-bisim', 'branching-sim']:
       self.subtasks.append(EquivCase(self.__desc, lpsfile1, lpsfile2, equiv, self._temppath, self._outpath))
-    self.__files = [lpsfile1, lpsfile2]
+    self.__files = [lpsfile1.path, lpsfile2.path]
   
-  def phase1(self, log):
+  def phase2(self, log):
     log.info('Finalising {0}'.format(self))
 #    for filename in self.__files:
 #      os.unlink(filename)
@@ -76,9 +82,21 @@ class Case(TempObj):
 class SameParamCase(Case):
   def __init__(self, name1, name2, **kwargs):
     super(SameParamCase, self).__init__(
-      '{0}/{1} ({2})'.format(name1, name2, ' '.join('{0}={1}'.format(k,v) for k,v in kwargs.items())),
-      specs.get(name1).mcrl2(**kwargs),
-      specs.get(name2).mcrl2(**kwargs))
+      '{0}/{1} ({2})'.format(name1, name2, ' '.join('{0}={1}'.format(k,v) for k,v in kwargs.items())))
+    self.__names = (name1, name2)
+    self.__family = '{0}/{1}'.format(name1, name2)
+    self.__kwargs = kwargs
+  
+  def _specs(self):
+    '''Renders the specifications only when the case is run, so that listing
+       and filtering cases is cheap.'''
+    return [specs.get(name).mcrl2(**self.__kwargs) for name in self.__names]
+  
+  def family(self):
+    return self.__family
+  
+  def cost(self):
+    return parameterCost(*self.__kwargs.values())
   
   
 def getcases(debugOnly = False):
@@ -0,0 +1,90 @@
+'''Runs a command with the limits of a LimitedProcess (see limits.py):
+
+    python limitexec.py TIMEOUT MEMLIMIT CGROUP USAGEFILE command [argument...]
+
+TIMEOUT is in seconds of CPU time and MEMLIMIT in kbytes, and either may be
+'-' for no limit. If CGROUP is not '-', the command runs in that cgroup;
+otherwise memory is limited using RLIMIT_AS.
+
+LimitedProcess runs this as a separate program instead of setting up the
+limits in a preexec_fn: a forked copy of a Python process with several
+threads must not run arbitrary Python code before it executes the command.
+This program only uses the standard library, so that it starts quickly.
+
+The command runs in a child of this program, which then exits in the same
+way as the command. The peak resident memory of a process includes that of
+the process it was forked from, so the peak that the kernel reports for
+this program includes the memory of the driver or worker that started it.
+That of the child only includes this program, which is small; it is
+written to USAGEFILE in kbytes, unless USAGEFILE is '-'.'''
+import ctypes
+import resource
+import errno
+import signal
+import sys
+import os
+
+_PR_SET_PDEATHSIG = 1
+
+def limit(timeout, memlimit, cgroup):
+  os.setpgrp()
+  try:
+    # Do not outlive the process that started us.
+    ctypes.CDLL(None).prctl(_PR_SET_PDEATHSIG, signal.SIGKILL)
+  except (OSError, TypeError, AttributeError):
+    pass
+  # Python ignores SIGPIPE, and ignored signals stay ignored across exec, but
+  # a tool writing to a closed pipe should die.
+  signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+  resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+  if timeout is not None:
+    # SIGXCPU at the soft limit, SIGKILL at the hard limit.
+    resource.setrlimit(resource.RLIMIT_CPU, (timeout, timeout + 1))
+  if cgroup is not None:
+    try:
+      open(os.path.join(cgroup, 'cgroup.procs'), 'w').write('0')
+      return
+    except (IOError, OSError):
+      pass
+  if memlimit is not None:
+    resource.setrlimit(resource.RLIMIT_AS, (memlimit * 1024, memlimit * 1024))
+
+def execute(cmdline):
+  try:
+    ctypes.CDLL(None).prctl(_PR_SET_PDEATHSIG, signal.SIGKILL)
+  except (OSError, TypeError, AttributeError):
+    pass
+  try:
+    os.execvp(cmdline[0], cmdline)
+  except OSError as e:
+    sys.stderr.write('{0}: {1}\n'.format(cmdline[0], e.strerror))
+    os._exit(127)
+
+def main(args):
+  (timeout, memlimit, cgroup, usagefile) = [None if arg == '-' else arg for arg in args[:4]]
+  limit(int(timeout) if timeout is not None else None,
+        int(memlimit) if memlimit is not None else None, cgroup)
+  pid = os.fork()
+  if pid == 0:
+    execute(args[4:])
+  # Only the command reads its input and writes its output, so that it gets
+  # end of file and SIGPIPE as if it ran on its own.
+  null = os.open(os.devnull, os.O_RDWR)
+  os.dup2(null, 0)
+  os.dup2(null, 1)
+  while True:
+    try:
+      (_, status, rusage) = os.wait4(pid, 0)
+      break
+    except OSError as e:
+      if e.errno != errno.EINTR:
+        raise
+  if usagefile is not None:
+    open(usagefile, 'w').write(str(rusage.ru_maxrss))
+  if os.WIFSIGNALED(status):
+    signal.signal(os.WTERMSIG(status), signal.SIG_DFL)
+    os.kill(os.getpid(), os.WTERMSIG(status))
+  os._exit(os.WEXITSTATUS(status))
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,393 @@
+import threading
+import tempfile
+import logging
+import signal
+import errno
+import time
+import sys
+import os
+import re
+try:
+  # Does not run any Python code between fork and exec.
+  import subprocess32 as subprocess
+except ImportError:
+  import subprocess
+
+# A process that is limited to T seconds of CPU time is killed if it has not
+# finished after WALL_FACTOR * T seconds of wall clock time, e.g. because it
+# hangs waiting for I/O.
+WALL_FACTOR = 2
+
+# Directory of a cgroup (v2) with the memory controller enabled for its
+# children, in which a cgroup is created for every limited process (see
+# configure). If None, the cgroup of the current process is used if possible;
+# since cgroup v2 does not allow enabling controllers for the children of a
+# cgroup that has processes itself, that normally only works if we run in the
+# root cgroup. If no cgroup can be used, memory is limited using RLIMIT_AS,
+# which limits virtual rather than resident memory, running out of memory is
+# only recognised from the error messages of tools, and the CPU time limit
+# applies to every process of a tool separately.
+CGROUP_PARENT = None
+
+# With a cgroup, the CPU time of all processes of a tool together is checked
+# every CPU_POLL seconds.
+CPU_POLL = 1.0
+
+_CGROUP_ROOT = '/sys/fs/cgroup'
+_LIMITEXEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'limitexec.py')
+_OUTOFMEMORY_RE = re.compile('bad_alloc|[Oo]ut of memory|Cannot allocate memory|MemoryError')
+
+# The meters of the threads that run tasks, see Meter.
+_METERS = threading.local()
+
+# Whether the fallback to RLIMIT_AS was reported.
+_WARNED = False
+
+def _usable(path):
+  try:
+    return 'memory' in open(os.path.join(path, 'cgroup.subtree_control')).read().split() \
+      and os.access(path, os.W_OK)
+  except (IOError, OSError):
+    return False
+
+def configure(path):
+  '''Creates the cgroups of limited processes in path from now on. Raises
+     ValueError if path is not a writable cgroup (v2) with the memory
+     controller enabled for its children. Like the cache, this must be done
+     before the TaskPool is created.'''
+  global CGROUP_PARENT
+  if not _usable(path):
+    raise ValueError('{0} is not a writable cgroup with the memory controller in its cgroup.subtree_control'.format(path))
+  CGROUP_PARENT = path
+
+def _cgroupParent():
+  global _WARNED
+  if CGROUP_PARENT is not None:
+    return CGROUP_PARENT
+  try:
+    for line in open('/proc/self/cgroup'):
+      if line.startswith('0::'):
+        path = os.path.join(_CGROUP_ROOT, line[3:].strip().lstrip('/'))
+        if _usable(path):
+          return path
+  except (IOError, OSError):
+    pass
+  if not _WARNED:
+    _WARNED = True
+    logging.getLogger('tools').warning(
+      'No cgroup (v2) with the memory controller is available, see CGROUP_PARENT in limits.py. Memory is '
+      'limited using RLIMIT_AS (virtual memory), running out of memory is recognised from error messages only, '
+      'and the CPU time limit applies to every process of a tool separately.')
+  return None
+
+class _Cgroup(object):
+  '''A cgroup in which the memory use of a process and its children is
+     limited, and in which the peak memory use and OOM kills are recorded.'''
+  __count = 0
+
+  def __init__(self, path):
+    self.path = path
+
+  @staticmethod
+  def create(memlimit):
+    '''Returns a new cgroup limited to memlimit kbytes, or None if cgroups
+       cannot be used.'''
+    parent = _cgroupParent()
+    if parent is None:
+      return None
+    _Cgroup.__count += 1
+    path = os.path.join(parent, 'paritygame-{0}-{1}'.format(os.getpid(), _Cgroup.__count))
+    try:
+      os.mkdir(path)
+      open(os.path.join(path, 'memory.max'), 'w').write(str(memlimit * 1024))
+      if os.path.exists(os.path.join(path, 'memory.swap.max')):
+        open(os.path.join(path, 'memory.swap.max'), 'w').write('0')
+      return _Cgroup(path)
+    except (IOError, OSError):
+      if os.path.exists(path):
+        os.rmdir(path)
+      return None
+
+  def join(self):
+    '''Moves the calling process into this cgroup.'''
+    open(os.path.join(self.path, 'cgroup.procs'), 'w').write('0')
+
+  def outofmemory(self):
+    try:
+      for line in open(os.path.join(self.path, 'memory.events')):
+        (event, count) = line.split()
+        if event == 'oom_kill' and int(count) > 0:
+          return True
+    except (IOError, OSError):
+      pass
+    return False
+
+  def cpu(self):
+    '''CPU time in seconds used by all processes in the cgroup so far, or None
+       if the kernel does not record it.'''
+    try:
+      for line in open(os.path.join(self.path, 'cpu.stat')):
+        (name, value) = line.split()
+        if name == 'usage_usec':
+          return int(value) / 1e6
+    except (IOError, OSError, ValueError):
+      pass
+    return None
+
+  def kill(self):
+    '''Kills all processes in the cgroup, including those that left the
+       process group of the tool.'''
+    try:
+      open(os.path.join(self.path, 'cgroup.kill'), 'w').write('1')
+    except (IOError, OSError):
+      pass
+
+  def peak(self):
+    '''Peak memory use in kbytes, or None if the kernel does not record it.'''
+    try:
+      return int(open(os.path.join(self.path, 'memory.peak')).read()) // 1024
+    except (IOError, OSError, ValueError):
+      return None
+
+  def remove(self):
+    try:
+      os.rmdir(self.path)
+    except OSError:
+      pass
+
+def _which(program):
+  '''The path of program, looked up in PATH if it has no directory, or None
+     if it cannot be executed.'''
+  if os.path.dirname(program):
+    return program if os.access(program, os.X_OK) else None
+  for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+    path = os.path.join(directory, program)
+    if os.path.isfile(path) and os.access(path, os.X_OK):
+      return path
+  return None
+
+class Meter(object):
+  '''Measures the peak memory use of the LimitedProcesses that the current
+     thread starts while the meter is active, e.g. during one phase of a
+     task. A process is counted by the meter that was active when it was
+     started, also if another thread waits for it, as for the stages of a
+     pipeline. Processes that overlap in time count together: their peaks
+     are added up. This overestimates the peak of the group if the processes
+     do not all peak at the same time.'''
+  def __init__(self):
+    self.peak = 0
+    self.__running = 0
+    self.__group = 0
+    self.__lock = threading.Lock()
+
+  def __enter__(self):
+    _METERS.meter = self
+    return self
+
+  def __exit__(self, *_):
+    _METERS.meter = None
+
+  @staticmethod
+  def current():
+    '''The meter of the current thread, or None.'''
+    return getattr(_METERS, 'meter', None)
+
+  def _started(self):
+    with self.__lock:
+      if self.__running == 0:
+        self.__group = 0
+      self.__running += 1
+
+  def _finished(self, maxrss):
+    with self.__lock:
+      self.__running = max(self.__running - 1, 0)
+      self.__group += maxrss
+      self.peak = max(self.peak, self.__group)
+
+class LimitedProcess(object):
+  '''Runs cmdline in a process group of its own, limited to timeout seconds of
+     CPU time and memlimit kbytes of memory. The limits are set up by
+     limitexec.py, which then executes the command: the CPU time is limited
+     using setrlimit, and memory using a cgroup if possible, and setrlimit
+     otherwise (see CGROUP_PARENT). With a cgroup, the CPU time of all
+     processes of the command together is limited as well. When the process
+     has finished, its resource usage is available as a dictionary in usage,
+     and timedout and outofmemory tell whether it exceeded its limits. The
+     peak memory use under 'maxrss' is that of the command as reported by
+     limitexec.py, or that of the cgroup; it is None if neither is known,
+     e.g. because the process was killed before limitexec.py could report.
+     The wall clock time of the process is limited to walltime seconds, which
+     defaults to WALL_FACTOR times its CPU time limit.'''
+  def __init__(self, cmdline, stdin=None, stdout=None, stderr=None, timeout=None, memlimit=None, walltime=None):
+    self.__timeout = timeout
+    self.__killed = False
+    self.__meter = Meter.current()
+    self.__cgroup = _Cgroup.create(memlimit) if memlimit is not None else None
+    self.returncode = None
+    self.usage = None
+    self.timedout = False
+    self.outofmemory = False
+    self.__start = time.time()
+    self.__finished = threading.Event()
+    if _which(cmdline[0]) is None:
+      if self.__cgroup is not None:
+        self.__cgroup.remove()
+      raise OSError(errno.ENOENT, 'No such file or directory: {0}'.format(cmdline[0]))
+    (fd, self.__usagefile) = tempfile.mkstemp(prefix='limitexec-')
+    os.close(fd)
+    limited = [sys.executable, '-S', _LIMITEXEC,
+               str(int(timeout)) if timeout is not None else '-',
+               str(memlimit) if memlimit is not None else '-',
+               self.__cgroup.path if self.__cgroup is not None else '-',
+               self.__usagefile] + list(cmdline)
+    # Close inherited descriptors: a process that holds on to the write end
+    # of another process' input pipe would keep that process from finishing.
+    try:
+      self.process = subprocess.Popen(limited, stdin=stdin, stdout=stdout, stderr=stderr, close_fds=True)
+    except OSError:
+      os.unlink(self.__usagefile)
+      if self.__cgroup is not None:
+        self.__cgroup.remove()
+      raise
+    self.pid = self.process.pid
+    if self.__meter is not None:
+      self.__meter._started()
+    self.stdin, self.stdout, self.stderr = self.process.stdin, self.process.stdout, self.process.stderr
+    if walltime is None and timeout is not None:
+      walltime = WALL_FACTOR * timeout
+    if walltime is not None or (timeout is not None and self.__cgroup is not None):
+      watcher = threading.Thread(target=self.__watch, args=(walltime,))
+      watcher.daemon = True
+      watcher.start()
+
+  def __watch(self, walltime):
+    '''Kills the process when it has run for walltime seconds, or, with a
+       cgroup, when its processes together used more CPU time than allowed.'''
+    poll = CPU_POLL if self.__timeout is not None and self.__cgroup is not None else None
+    deadline = self.__start + walltime if walltime is not None else None
+    while True:
+      delay = poll
+      if deadline is not None:
+        remaining = max(0, deadline - time.time())
+        delay = remaining if delay is None else min(delay, remaining)
+      if self.__finished.wait(delay):
+        return
+      if deadline is not None and time.time() >= deadline:
+        break
+      if poll is not None and (self.__cgroup.cpu() or 0) > self.__timeout:
+        break
+    self.__kill()
+
+  def __kill(self):
+    self.__killed = True
+    self.kill()
+
+  def kill(self):
+    '''Kills the process, and the other processes in its process group and
+       cgroup. The process itself is also killed directly, since it may not
+       have made its process group yet.'''
+    for kill in [os.killpg, os.kill]:
+      try:
+        kill(self.pid, signal.SIGKILL)
+      except OSError:
+        pass
+    if self.__cgroup is not None:
+      self.__cgroup.kill()
+
+  def __maxrss(self):
+    '''The peak memory use of the command that limitexec.py reported, or
+       None.'''
+    try:
+      return int(open(self.__usagefile).read())
+    except (IOError, ValueError):
+      return None
+    finally:
+      try:
+        os.unlink(self.__usagefile)
+      except OSError:
+        pass
+
+  def wait(self):
+    '''Waits for the process to finish and records its resource usage.'''
+    if self.returncode is not None:
+      return self.returncode
+    while True:
+      try:
+        (_, status, rusage) = os.wait4(self.pid, 0)
+        break
+      except OSError as e:
+        if e.errno != errno.EINTR:
+          raise
+    wall = time.time() - self.__start
+    self.__finished.set()
+    # Clean up whatever the process left behind in its process group.
+    try:
+      os.killpg(self.pid, signal.SIGKILL)
+    except OSError:
+      pass
+
+    if os.WIFSIGNALED(status):
+      self.returncode = -os.WTERMSIG(status)
+    else:
+      self.returncode = os.WEXITSTATUS(status)
+    self.process.returncode = self.returncode
+
+    self.usage = {'user': rusage.ru_utime, 'sys': rusage.ru_stime, 'wall': wall,
+                  'maxrss': self.__maxrss(),
+                  'nvcsw': rusage.ru_nvcsw, 'nivcsw': rusage.ru_nivcsw,
+                  'inblock': rusage.ru_inblock, 'oublock': rusage.ru_oublock}
+    cpu = rusage.ru_utime + rusage.ru_stime
+    self.timedout = self.__killed or (self.__timeout is not None and
+                                      (self.returncode == -signal.SIGXCPU or
+                                       (self.returncode == -signal.SIGKILL and cpu >= self.__timeout)))
+    if self.__cgroup is not None:
+      self.outofmemory = self.__cgroup.outofmemory()
+      if self.__cgroup.peak() is not None:
+        self.usage['maxrss'] = max(self.usage['maxrss'] or 0, self.__cgroup.peak())
+      self.__cgroup.remove()
+    if self.__meter is not None:
+      self.__meter._finished(self.usage['maxrss'] or 0)
+    return self.returncode
+
+  def communicate(self, input=None, sinks=None):
+    '''Like subprocess.Popen.communicate, but waits for the process using
+       wait(). If sinks maps 'out' or 'err' to an object with write() and
+       getvalue() methods, e.g. a tools.Parser, that output is passed to it
+       while the process runs instead of being kept in memory, and the result
+       of getvalue() is returned for it.'''
+    output = {}
+    def read(name, stream):
+      sink = (sinks or {}).get(name)
+      if sink is None:
+        output[name] = stream.read()
+      else:
+        block = os.read(stream.fileno(), 1 << 16)
+        while block:
+          sink.write(block)
+          block = os.read(stream.fileno(), 1 << 16)
+        output[name] = sink.getvalue()
+      stream.close()
+    readers = []
+    for (name, stream) in [('out', self.stdout), ('err', self.stderr)]:
+      if stream is not None:
+        readers.append(threading.Thread(target=read, args=(name, stream)))
+        readers[-1].daemon = True
+        readers[-1].start()
+    if self.stdin is not None:
+      try:
+        if input:
+          self.stdin.write(input)
+        self.stdin.close()
+      except IOError as e:
+        if e.errno not in [errno.EPIPE, errno.EINVAL]:
+          raise
+    for reader in readers:
+      reader.join()
+    self.wait()
+
+    # Without a cgroup, running out of memory can only be recognised from the
+    # way in which the tool reports failing allocations.
+    if self.returncode != 0 and not self.timedout and not self.outofmemory and \
+      output.get('err') and _OUTOFMEMORY_RE.search(output['err']):
+      self.outofmemory = True
+    return output.get('out'), output.get('err')
@@ -1,4 +1,4 @@
-from cases import tools, TempObj, PGCase, MLSOLVER_TIMEOUT, MLSOLVER_MEMLIMIT, cleanResult, Timeout, OutOfMemory
+from cases import tools, compression, TempObj, PGCase, Series, parameterCost, increment, MLSOLVER_TIMEOUT, MLSOLVER_MEMLIMIT, cleanResult, Timeout, OutOfMemory
 import formulas
 import os
 
@@ -25,23 +25,26 @@ class MLSolverCase(PGCase):
     if pgfile and returnExisting:
       return pgfile
     
+    pgfilename = self._stableTempFilename(compression.ext('gm'))
+    partial = self._partialFilename(pgfilename)
     try:
-      pgfilename = self._newTempFilename('gm')
       if self.__compact:
-        result = tools.mlsolver('-ve', '--option', 'comp', '--{0}'.format(self.formula.mode()), self.formula.type(), '-pg', self.formula.form(**self.__kwargs), timeout=MLSOLVER_TIMEOUT, memlimit=MLSOLVER_MEMLIMIT, timed=True)
+        result = tools.mlsolver('-ve', '--option', 'comp', '--{0}'.format(self.formula.mode()), self.formula.type(), '-pg', self.formula.form(**self.__kwargs), output=partial, timeout=MLSOLVER_TIMEOUT, memlimit=MLSOLVER_MEMLIMIT, timed=True)
       else:
-        result = tools.mlsolver('-ve', '--{0}'.format(self.formula.mode()), self.formula.type(), '-pg', self.formula.form(**self.__kwargs), timeout=MLSOLVER_TIMEOUT, memlimit=MLSOLVER_MEMLIMIT, timed=True)
-      pg = result['out']
+        result = tools.mlsolver('-ve', '--{0}'.format(self.formula.mode()), self.formula.type(), '-pg', self.formula.form(**self.__kwargs), output=partial, timeout=MLSOLVER_TIMEOUT, memlimit=MLSOLVER_MEMLIMIT, timed=True)
+      os.rename(partial, pgfilename)
       self.result['generation']['times'] = result['times']
       self.result['generation']['memory'] = result['memory']
+      self.result['generation']['usage'] = result['usage']
     except (Timeout, OutOfMemory) as e:
+      self._discardPartial(partial, pgfilename)
       self.result['generation']['times'] = e.result['times']
       self.result['generation']['memory'] = e.result['memory']
+      self.result['generation']['usage'] = e.result['usage']
       raise e
-  
-    pgfile = open(pgfilename, 'w')
-    pgfile.write(pg)
-    pgfile.close()
+    except:
+      self._discardPartial(partial, pgfilename)
+      raise
     return pgfilename
 
 class Case(TempObj):
@@ -60,6 +63,15 @@ class Case(TempObj):
     argstr = ', '.join(['{0}={1}'.format(k, v) for k, v in self.__kwargs.items()])
     return '{0}{1}'.format(self.__name, ' [{0}]'.format(argstr) if argstr else '')
   
+  def family(self):
+    return self.__name
+  
+  def key(self):
+    return 'mlsolver:{0}'.format(self._prefix)
+  
+  def cost(self):
+    return parameterCost(*self.__kwargs.values())
+  
   def phase0(self, log):
     '''Generates an LPS and creates subtasks for every property that should be
     verified.'''
@@ -71,23 +83,30 @@ class Case(TempObj):
     for r in self.results:
       self.result['instances'].append(r.result) 
 
-def getcases(debugOnly = False):
+def getseries(debugOnly = False):
+  '''The cases as series in which the parameter n of the formula grows, see
+     Series.'''
   if debugOnly:
-    return [Case('Include', n=n) for n in range(2,3)]
+    return [Series('Include', range(2,3), Case, ('Include',), param='n', step=increment)]
   return \
-    [Case('Include', n=n) for n in range(1,9)] + \
-    [Case('Nester', n=n) for n in range(1,9)] + \
-    [Case('StarNester', k=k,n=n) for k in range(1,4) for n in range(1,9)] + \
-    [Case('Petri', n=n) for n in range(1,9)] + \
-    [Case('ParityAndBuechi', n=n) for n in range(1,9)] + \
-    [Case('MuCalcLimitClosure', n=0,phi="p")] + \
-    [Case('FLCTLLimitClosure', n=n) for n in range(1,9)] + \
-    [Case('FLCTLStarLimitClosure', n=n) for n in range(1,5)] + \
-    [Case('FLCTLStarSimpleLimitClosure', n=n) for n in range(1,9)] + \
-    [Case('DemriKillerFormula', n=n) for n in range(1,4)] + \
-    [Case('FairScheduler', n=n) for n in range(1,9)] + \
-    [Case('LTMucalcBinaryCounter', n=n) for n in range(1,9)] + \
-    [Case('CTLStarBinaryCounter', n=n) for n in range(1,9)] + \
-    [Case('PDLBinaryCounter', n=n) for n in range(1,9)] + \
-    [Case('HugeModels', n=n) for n in range(1,5)]
+    [Series('Include', range(1,9), Case, ('Include',), param='n', step=increment)] + \
+    [Series('Nester', range(1,9), Case, ('Nester',), param='n', step=increment)] + \
+    [Series('StarNester k={0}'.format(k), range(1,9), Case, ('StarNester',), dict(k=k), param='n', step=increment) for k in range(1,4)] + \
+    [Series('Petri', range(1,9), Case, ('Petri',), param='n', step=increment)] + \
+    [Series('ParityAndBuechi', range(1,9), Case, ('ParityAndBuechi',), param='n', step=increment)] + \
+    [Series('MuCalcLimitClosure', [None], Case, ('MuCalcLimitClosure',), dict(n=0,phi="p"))] + \
+    [Series('FLCTLLimitClosure', range(1,9), Case, ('FLCTLLimitClosure',), param='n', step=increment)] + \
+    [Series('FLCTLStarLimitClosure', range(1,5), Case, ('FLCTLStarLimitClosure',), param='n', step=increment)] + \
+    [Series('FLCTLStarSimpleLimitClosure', range(1,9), Case, ('FLCTLStarSimpleLimitClosure',), param='n', step=increment)] + \
+    [Series('DemriKillerFormula', range(1,4), Case, ('DemriKillerFormula',), param='n', step=increment)] + \
+    [Series('FairScheduler', range(1,9), Case, ('FairScheduler',), param='n', step=increment)] + \
+    [Series('LTMucalcBinaryCounter', range(1,9), Case, ('LTMucalcBinaryCounter',), param='n', step=increment)] + \
+    [Series('CTLStarBinaryCounter', range(1,9), Case, ('CTLStarBinaryCounter',), param='n', step=increment)] + \
+    [Series('PDLBinaryCounter', range(1,9), Case, ('PDLBinaryCounter',), param='n', step=increment)] + \
+    [Series('HugeModels', range(1,5), Case, ('HugeModels',), param='n', step=increment)]
+
+def getcases(debugOnly = False):
+  for series in getseries(debugOnly):
+    for case in series.cases():
+      yield case
 
@@ -1,4 +1,5 @@
-from cases import tools, TempObj, PBESCase, LPSTOOLS_MEMLIMIT, LPSTOOLS_TIMEOUT
+from cases import tools, TempObj, PBESCase, LinearisationTask, Series, parameterCost, doubling, increment, LPSTOOLS_MEMLIMIT, LPSTOOLS_TIMEOUT
+from cases.artifacts import Artifact
 import specs
 import os.path
 import logging
@@ -23,20 +24,18 @@ class Property(PBESCase):
   def __str__(self):
     return os.path.splitext(os.path.split(self.mcffile)[1])[0]
   
-  def __rename(self):
-    '''If a lpsactionrename specification exists for this property, transform
-       the LPS.'''
+  def _pbesPipeline(self):
+    '''Generates a PBES out of self.lps and self.mcffile, and applies
+       pbesconstelm to it. If a lpsactionrename specification exists for this
+       property, the LPS is transformed first.'''
+    stages = []
     if os.path.exists(self.renfile):
-      result = tools.lpsactionrename('-f', self.renfile, '-v', stdin=self.lps, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-      self.lps = result
-  
-  def _makePBES(self):
-    '''Generate a PBES out of self.lps and self.mcffile, and apply pbesconstelm
-       to it.'''
-    self.__rename()
-    result = tools.lps2pbes('-f', self.mcffile, '-v', stdin=self.lps, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    result = tools.pbesconstelm('-v', stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    return result
+      stages.append(tools.lpsactionrename.stage('-f', self.renfile, '-v', memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT))
+    stages += [
+      tools.lps2pbes.stage('-f', self.mcffile, '-v', memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT),
+      tools.pbesconstelm.stage('-v', memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)
+    ]
+    return (stages, self.lps)
 
 class Case(TempObj):
   def __init__(self, name, **kwargs):
@@ -44,7 +43,6 @@ class Case(TempObj):
     spec = specs.get(name)
     self.__name = name
     self.__kwargs = kwargs
-    self._mcrl2 = spec.mcrl2(**kwargs)
     self._outpath = os.path.join(os.path.split(__file__)[0], 'data')
     self._temppath = os.path.join(os.path.split(__file__)[0], 'temp')
     self._prefix = '{0}{1}'.format(self.__name, ('_'.join('{0}={1}'.format(k,v) for k,v in self.__kwargs.items())))
@@ -56,41 +54,53 @@ class Case(TempObj):
   def __str__(self):
     argstr = ', '.join(['{0}={1}'.format(k, v) for k, v in self.__kwargs.items()])
     return '{0}{1}'.format(self.__name, ' [{0}]'.format(argstr) if argstr else '')
+  
+  def family(self):
+    return self.__name
+  
+  def key(self):
+    return 'modelchecking:{0}'.format(self._prefix)
+  
+  def cost(self):
+    return parameterCost(*self.__kwargs.values())
 
-  def _makeLPS(self, log):
-    '''Linearises the specification in self._mcrl2.'''
-    log.debug('Linearising {0}'.format(self))
-    result = tools.mcrl22lps('-vnf', stdin=self._mcrl2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    return result
+  @property
+  def _mcrl2(self):
+    '''The mCRL2 specification of this case. It is only rendered when the
+       case is run, so that listing and filtering cases is cheap.'''
+    return specs.get(self.__name).mcrl2(**self.__kwargs)
+
+  def _linearisation(self):
+    '''The tools that turn the specification in self._mcrl2 into an LPS, see
+       LinearisationTask.'''
+    return [('mcrl22lps', ['-vnf'])]
   
   def phase0(self, log):
-    '''Generates an LPS and creates subtasks for every property that should be
-    verified.'''
-    try:
-      lps = self._makeLPS(log)    
-      for prop in os.listdir(self.proppath):
-        if not prop.endswith('.mcf'):
-          continue
-        self.subtasks.append(Property(self._prefix, lps, os.path.join(self.proppath, prop), 
-                                      self._temppath, self._outpath))
-    except tools.ToolException as e:
-      log.error('Exception while creating LPS for {0}, exception was {1}'.format(self, e))
-      raise e
-      
-      
+    '''Generates an LPS in a subtask, which is shared with other cases that
+    use the same specification.'''
+    log.debug('Linearising {0}'.format(self))
+    self.subtasks.append(LinearisationTask(self._mcrl2, self._linearisation(), self._temppath))
+  
   def phase1(self, log):
+    '''Creates subtasks for every property that should be verified. The
+    properties get a handle to the LPS file.'''
+    lps = Artifact(self.results[0].result['file'])
+    self.result['linearisation'] = self.results[0].result.get('stages')
+    for prop in os.listdir(self.proppath):
+      if not prop.endswith('.mcf'):
+        continue
+      self.subtasks.append(Property(self._prefix, lps, os.path.join(self.proppath, prop), 
+                                    self._temppath, self._outpath))
+      
+  def phase2(self, log):
     for r in self.results:
       self.result['properties'].append(r.result)
     
 class IEEECase(Case):
-  def _makeLPS(self, log):
+  def _linearisation(self):
     '''Linearises the specification in self._mcrl2 and applies lpssuminst to the
     result.'''
-    log.debug('Linearising {0}'.format(self))
-    result = tools.mcrl22lps('-vnf', stdin=self._mcrl2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.debug('Applying suminst on LPS of {0}'.format(self))
-    result = tools.lpssuminst(stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    return result
+    return [('mcrl22lps', ['-vnf']), ('lpssuminst', [])]
 
 class GameCase(Case):
   def __init__(self, name, use_compiled_constelm=False, **kwargs):
@@ -99,53 +109,49 @@ class GameCase(Case):
     self.__boardheight = kwargs.get('height')
     self.__use_compiled_constelm = use_compiled_constelm
     
-  def _makeLPS(self, log):
+  def _linearisation(self):
     '''Linearises the specification in self._mcrl2 and applies lpssuminst,
-    lpsparunfold and lpsconstelm to the result.'''
-    log.debug('Linearising {0}'.format(self))
-    result = tools.mcrl22lps('-vnf', stdin=self._mcrl2, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.debug('Applying suminst on LPS of {0}'.format(self))
-    result = tools.lpssuminst(stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.debug('Applying parunfold (for Board) on LPS of {0}'.format(self))
-    result = tools.lpsparunfold('-lv', '-n{0}'.format(self.__boardheight), '-sBoard', stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.debug('Applying parunfold (for Row) on LPS of {0}'.format(self))
-    result = tools.lpsparunfold('-lv', '-n{0}'.format(self.__boardwidth), '-sRow', stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    log.debug('Applying constelm on LPS of {0}'.format(self))
-    result = tools.lpsconstelm('-ctvrjittyc' if self.__use_compiled_constelm else '-ctv', stdin=result, memlimit=LPSTOOLS_MEMLIMIT, timeout=LPSTOOLS_TIMEOUT)['out']
-    return result
+    lpsparunfold (for Board and Row) and lpsconstelm to the result.'''
+    return [('mcrl22lps', ['-vnf']),
+            ('lpssuminst', []),
+            ('lpsparunfold', ['-lv', '-n{0}'.format(self.__boardheight), '-sBoard']),
+            ('lpsparunfold', ['-lv', '-n{0}'.format(self.__boardwidth), '-sRow']),
+            ('lpsconstelm', ['-ctvrjittyc' if self.__use_compiled_constelm else '-ctv'])]
 
-def getcases(debugOnly = False):
+def getseries(debugOnly = False):
+  '''The cases as series in which the parameter that determines the size of
+     the state space grows, see Series.'''
   if(debugOnly):
     return \
-      [Case('Debug spec')] + \
-      [Case('ABP', datasize=2)] + \
-      [Case('ABP(BW)', datasize=2)] + \
-      [Case('CABP', datasize=2)] + \
-      [Case('Par', datasize=2)]
+      [Series('Debug spec', [None], Case, ('Debug spec',))] + \
+      [Series('ABP', [2], Case, ('ABP',), param='datasize', step=doubling)] + \
+      [Series('ABP(BW)', [2], Case, ('ABP(BW)',), param='datasize', step=doubling)] + \
+      [Series('CABP', [2], Case, ('CABP',), param='datasize', step=doubling)] + \
+      [Series('Par', [2], Case, ('Par',), param='datasize', step=doubling)]
   
   return \
-    [Case('Debug spec')] + \
-    [Case('Lift (Correct)', nlifts=n) for n in range(2, 5)] + \
-    [Case('Lift (Incorrect)', nlifts=n) for n in range(2, 5)] + \
-    [Case('ABP', datasize=i) for i in [2,4,8]] + \
-    [Case('ABP(BW)', datasize=i) for i in [2,4,8]] + \
-    [Case('CABP', datasize=i) for i in [2,4,8]] + \
-    [Case('Par', datasize=i) for i in [2,4,8]] + \
-    [IEEECase('IEEE1394', nparties=2, datasize=2, headersize=2, acksize=2)] + \
-    [Case('SWP', windowsize=1, datasize=i) for i in [2,4,8] ] + \
-    [Case('SWP', windowsize=2, datasize=i) for i in [2,4] ] + \
-    [Case('Leader', nparticipants=n) for n in range(3, 7)] + \
-    [GameCase('Othello', width=4, height=4)] + \
-    [GameCase('Clobber', width=w, height=h) for (w,h) in [(4,4)] ] + \
-    [GameCase('Snake', width=w, height=h) for (w,h) in [(4,4)] ] + \
-    [GameCase('Hex', width=w, height=h) for (w,h) in [(4,4)] ] + \
-    [GameCase('Domineering', width=w, height=h) for (w,h) in [(4,4) ] ] + \
-    [Case('Hanoi', ndisks=n) for n in range(8,14)] + \
-    [Case('Elevator', policy=p, storeys=n) for p in ['FIFO', 'LIFO'] for n in range(2,9)] + \
-    [Case('CCP')] + \
-    [Case('Hesselink', datasize=i) for i in range(2,5) ] + \
-    [Case('Onebit', datasize=i) for i in [2,3]] + \
-    [Case('BRP', datasize=i) for i in [2,4]] + \
-    [Case('SWP', windowsize=3, datasize=i) for i in [2,4] ] + \
-    [Case('SWP', windowsize=4, datasize=i) for i in [2] ]
-    
\ No newline at end of file
+    [Series('Debug spec', [None], Case, ('Debug spec',))] + \
+    [Series('Lift (Correct)', range(2, 5), Case, ('Lift (Correct)',), param='nlifts', step=increment)] + \
+    [Series('Lift (Incorrect)', range(2, 5), Case, ('Lift (Incorrect)',), param='nlifts', step=increment)] + \
+    [Series('ABP', [2,4,8], Case, ('ABP',), param='datasize', step=doubling)] + \
+    [Series('ABP(BW)', [2,4,8], Case, ('ABP(BW)',), param='datasize', step=doubling)] + \
+    [Series('CABP', [2,4,8], Case, ('CABP',), param='datasize', step=doubling)] + \
+    [Series('Par', [2,4,8], Case, ('Par',), param='datasize', step=doubling)] + \
+    [Series('IEEE1394', [None], IEEECase, ('IEEE1394',), dict(nparties=2, datasize=2, headersize=2, acksize=2))] + \
+    [Series('SWP windowsize=1', [2,4,8], Case, ('SWP',), dict(windowsize=1), param='datasize', step=doubling)] + \
+    [Series('SWP windowsize=2', [2,4], Case, ('SWP',), dict(windowsize=2), param='datasize', step=doubling)] + \
+    [Series('Leader', range(3, 7), Case, ('Leader',), param='nparticipants', step=increment)] + \
+    [Series(name, [None], GameCase, (name,), dict(width=w, height=h)) for name in ['Othello', 'Clobber', 'Snake', 'Hex', 'Domineering'] for (w,h) in [(4,4)] ] + \
+    [Series('Hanoi', range(8,14), Case, ('Hanoi',), param='ndisks', step=increment)] + \
+    [Series('Elevator {0}'.format(p), range(2,9), Case, ('Elevator',), dict(policy=p), param='storeys', step=increment) for p in ['FIFO', 'LIFO']] + \
+    [Series('CCP', [None], Case, ('CCP',))] + \
+    [Series('Hesselink', range(2,5), Case, ('Hesselink',), param='datasize', step=increment)] + \
+    [Series('Onebit', [2,3], Case, ('Onebit',), param='datasize', step=increment)] + \
+    [Series('BRP', [2,4], Case, ('BRP',), param='datasize', step=doubling)] + \
+    [Series('SWP windowsize=3', [2,4], Case, ('SWP',), dict(windowsize=3), param='datasize', step=doubling)] + \
+    [Series('SWP windowsize=4', [2], Case, ('SWP',), dict(windowsize=4), param='datasize', step=doubling)]
+
+def getcases(debugOnly = False):
+  for series in getseries(debugOnly):
+    for case in series.cases():
+      yield case
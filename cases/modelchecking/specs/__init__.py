@@ -6,9 +6,13 @@ class Spec(object):
     self.TEMPLATE = template
     if self.TEMPLATE is None:
       self.TEMPLATE = self.__class__.TEMPLATE
+    self.__template = None
   @property
   def _template(self):
-    return string.Template(open(os.path.join(os.path.split(__file__)[0], 'mcrl2', self.TEMPLATE + '.mcrl2')).read())
+    '''The template, which is read from disk the first time it is used.'''
+    if self.__template is None:
+      self.__template = string.Template(open(os.path.join(os.path.split(__file__)[0], 'mcrl2', self.TEMPLATE + '.mcrl2')).read())
+    return self.__template
   def mcrl2(self):
     return self._template.substitute()
 
@@ -0,0 +1,262 @@
+'''Compact binary representation of parity games.
+
+A game in PGSolver format (a .gm file) is stored next to it in a .pgb file
+that contains a small header followed by four arrays:
+
+  offsets   int64[n+1]  successors of v are targets[offsets[v]:offsets[v+1]]
+  targets   uint32[m]   successor lists of all vertices, in the order of v
+  priority  uint32[n]
+  owner     int8[n]     0 (even) or 1 (odd), -1 if there is no vertex v
+
+Vertices are identified by their number in the .gm file, so n is one more
+than the greatest vertex number. The names of vertices are not stored. The
+file is read through mmap, so only the parts that are used are paged in and
+every vertex can be accessed in constant time.'''
+import tempfile
+import struct
+import mmap
+import os
+import numpy
+import compression
+
+MAGIC = 'PGBINARY'
+VERSION = 1
+EXTENSION = 'pgb'
+
+# Magic, version, whether there is a start vertex, n, m, start vertex.
+_HEADER = struct.Struct('<8sIIqqq')
+_HEADER_SIZE = 64
+
+_OFFSET = numpy.dtype('<i8')
+_VERTEX = numpy.dtype('<u4')
+_PRIORITY = numpy.dtype('<u4')
+_OWNER = numpy.dtype('i1')
+
+# Number of lines of a .gm file that are parsed at the same time.
+_CHUNK = 1 << 16
+
+def sibling(pgfile):
+  '''The name of the .pgb file that belongs to pgfile, e.g. game.pgb for
+     game.gm and game.gm.gz.'''
+  return os.path.splitext(compression.plain(pgfile))[0] + '.' + EXTENSION
+
+def _layout(n, m):
+  '''Returns the byte offsets in the file of the four arrays.'''
+  offsets = _HEADER_SIZE
+  targets = offsets + (n + 1) * _OFFSET.itemsize
+  priority = targets + m * _VERTEX.itemsize
+  owner = priority + n * _PRIORITY.itemsize
+  return offsets, targets, priority, owner
+
+class _Parser(object):
+  '''Collects the vertices of a .gm file. The successors are written to a
+     temporary file as soon as a chunk of lines has been parsed, the
+     information per vertex is kept in memory.'''
+  def __init__(self, targets):
+    self.__targets = targets
+    self.__lines = []
+    self.ids = []
+    self.priorities = []
+    self.owners = []
+    self.degrees = []
+    self.maxid = -1
+    self.start = None
+    self.m = 0
+
+  def line(self, line):
+    self.__lines.append(line)
+    if len(self.__lines) >= _CHUNK:
+      self.flush()
+
+  def flush(self):
+    ids, priorities, owners, degrees, successors = [], [], [], [], []
+    for line in self.__lines:
+      # Strip the name of the vertex, and the final semicolon.
+      line = line.split('"', 1)[0].strip().rstrip(';').strip()
+      if not line:
+        continue
+      words = line.split(None, 3)
+      if words[0] == 'parity':
+        self.maxid = max(self.maxid, int(words[1]))
+        continue
+      if words[0] == 'start':
+        self.start = int(words[1])
+        continue
+      succ = words[3].replace(' ', '') if len(words) > 3 else ''
+      ids.append(int(words[0]))
+      priorities.append(int(words[1]))
+      owners.append(int(words[2]))
+      degrees.append(succ.count(',') + 1 if succ else 0)
+      if succ:
+        successors.append(succ)
+    self.__lines = []
+    if not ids:
+      return
+    # Parsing all successors of a chunk at once is much faster than parsing
+    # them line by line.
+    targets = numpy.fromstring(','.join(successors), dtype=numpy.int64, sep=',') \
+      if successors else numpy.zeros(0, numpy.int64)
+    if len(targets) != sum(degrees):
+      raise ValueError('Malformed successor list in parity game')
+    self.__targets.write(targets.astype(_VERTEX).tostring())
+    self.m += len(targets)
+    self.ids.append(numpy.array(ids, numpy.int64))
+    self.priorities.append(numpy.array(priorities, numpy.int64))
+    self.owners.append(numpy.array(owners, numpy.int64))
+    self.degrees.append(numpy.array(degrees, numpy.int64))
+    self.maxid = max(self.maxid, self.ids[-1].max())
+    if len(targets):
+      self.maxid = max(self.maxid, targets.max())
+
+def _concatenate(chunks):
+  return numpy.concatenate(chunks) if chunks else numpy.zeros(0, numpy.int64)
+
+def fromGM(pgfile, binfile=None):
+  '''Converts the parity game in pgfile, which may be compressed, to the
+     binary format, and returns the name of the binary file. The binary file
+     is sibling(pgfile) unless binfile is given. It is written under a
+     temporary name and then renamed, so readers never see a partial file.'''
+  if binfile is None:
+    binfile = sibling(pgfile)
+  directory = os.path.dirname(os.path.abspath(binfile))
+  temptargets = tempfile.TemporaryFile(dir=directory)
+  parser = _Parser(temptargets)
+  infile = compression.openPlain(pgfile)
+  try:
+    for line in infile:
+      parser.line(line)
+    parser.flush()
+  finally:
+    infile.close()
+
+  ids = _concatenate(parser.ids)
+  degrees = _concatenate(parser.degrees)
+  n = int(parser.maxid) + 1
+  m = parser.m
+  if len(numpy.unique(ids)) != len(ids):
+    raise ValueError('Vertex defined more than once in {0}'.format(pgfile))
+  priority = numpy.zeros(n, _PRIORITY)
+  owner = numpy.empty(n, _OWNER)
+  owner.fill(-1)
+  priority[ids] = _concatenate(parser.priorities)
+  owner[ids] = _concatenate(parser.owners)
+  degree = numpy.zeros(n, numpy.int64)
+  degree[ids] = degrees
+  offsets = numpy.zeros(n + 1, _OFFSET)
+  numpy.cumsum(degree, out=offsets[1:])
+
+  temp = tempfile.NamedTemporaryFile(dir=directory, prefix='.' + os.path.basename(binfile), delete=False)
+  try:
+    temp.write(_HEADER.pack(MAGIC, VERSION, parser.start is not None, n, m,
+                            parser.start if parser.start is not None else -1).ljust(_HEADER_SIZE, '\0'))
+    temp.write(offsets.tostring())
+    temptargets.seek(0)
+    if numpy.all(ids[1:] > ids[:-1]):
+      # The usual case: vertices are listed in increasing order, so the
+      # successor lists are already in the right order.
+      block = temptargets.read(1 << 20)
+      while block:
+        temp.write(block)
+        block = temptargets.read(1 << 20)
+    elif m > 0:
+      # Move the successor list of every vertex to its place.
+      targets = numpy.memmap(temptargets, dtype=_VERTEX, mode='r', shape=(m,))
+      order = numpy.argsort(ids)
+      start = numpy.zeros(len(ids), numpy.int64)
+      numpy.cumsum(degrees[:-1], out=start[1:])
+      counts = degrees[order]
+      index = numpy.repeat(start[order] - numpy.cumsum(counts) + counts, counts) + numpy.arange(m)
+      temp.write(numpy.asarray(targets[index]).tostring())
+      del targets
+    temp.write(priority.tostring())
+    temp.write(owner.tostring())
+    temp.close()
+    os.rename(temp.name, binfile)
+  except:
+    temp.close()
+    os.unlink(temp.name)
+    raise
+  finally:
+    temptargets.close()
+  return binfile
+
+def _array(buf, dtype, count, offset):
+  if count == 0:
+    return numpy.zeros(0, dtype)
+  return numpy.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+
+class BinaryGame(object):
+  '''A parity game in binary format, read through mmap. The arrays offsets,
+     targets, priority and owner are read-only views of the file.'''
+  def __init__(self, path):
+    self.path = path
+    self.__file = open(path, 'rb')
+    self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, version, hasstart, self.n, self.m, start) = _HEADER.unpack_from(self.__map)
+    if magic != MAGIC or version != VERSION:
+      self.close()
+      raise ValueError('{0} is not a binary parity game of version {1}'.format(path, VERSION))
+    self.start = start if hasstart else None
+    (offsets, targets, priority, owner) = _layout(self.n, self.m)
+    self.offsets = _array(self.__map, _OFFSET, self.n + 1, offsets)
+    self.targets = _array(self.__map, _VERTEX, self.m, targets)
+    self.priority = _array(self.__map, _PRIORITY, self.n, priority)
+    self.owner = _array(self.__map, _OWNER, self.n, owner)
+
+  def __len__(self):
+    '''The number of vertices.'''
+    return int(numpy.count_nonzero(self.owner >= 0))
+
+  def __contains__(self, v):
+    return 0 <= v < self.n and self.owner[v] >= 0
+
+  def vertices(self):
+    '''The numbers of all vertices, in increasing order.'''
+    return numpy.flatnonzero(self.owner >= 0)
+
+  def successors(self, v):
+    return self.targets[self.offsets[v]:self.offsets[v + 1]]
+
+  def degrees(self):
+    '''The number of successors of every vertex.'''
+    return numpy.diff(self.offsets)
+
+  def close(self):
+    # The map is not closed explicitly: Python 2 would unmap it even if views
+    # of it are still in use. Every view refers to the map, so it is unmapped
+    # when the last of them is gone.
+    self.offsets = self.targets = self.priority = self.owner = None
+    self.__map = None
+    self.__file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+def toGM(binfile, outfile):
+  '''Writes the game in binfile to the file object outfile in PGSolver
+     format.'''
+  game = BinaryGame(binfile)
+  try:
+    outfile.write('parity {0};\n'.format(game.n - 1))
+    if game.start is not None:
+      outfile.write('start {0};\n'.format(game.start))
+    vertices = game.vertices()
+    for first in xrange(0, len(vertices), _CHUNK):
+      lines = []
+      for v in vertices[first:first + _CHUNK]:
+        lines.append('{0} {1} {2} {3};\n'.format(v, game.priority[v], game.owner[v],
+                                                 ','.join(map(str, game.successors(v)))))
+      outfile.write(''.join(lines))
+  finally:
+    game.close()
+
+def load(pgfile):
+  '''Returns the BinaryGame of pgfile, converting pgfile first if its binary
+     file does not exist or is older than pgfile.'''
+  binfile = sibling(pgfile)
+  if not os.path.exists(binfile) or os.path.getmtime(binfile) < os.path.getmtime(pgfile):
+    fromGM(pgfile, binfile)
+  return BinaryGame(binfile)
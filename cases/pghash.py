@@ -0,0 +1,126 @@
+'''Hashes that identify parity games, so that information about a game and its
+solution can be reused for games that are the same.
+
+If numpy is available, the hash does not depend on the numbering of the
+vertices when that is cheap to achieve: the vertices are coloured by their
+priority, owner and whether they are the initial vertex, and the colours
+are refined by the colours of their successors for at most ROUNDS rounds.
+If that gives every vertex a different colour, the game is renumbered in the
+order of the colours and the renumbered game is hashed; isomorphic games get
+the same colours and hence the same hash. Otherwise the game is hashed as it
+is numbered, which does not depend on the names of vertices, the layout of
+the file or its compression. Without numpy, the contents of the file are
+hashed.
+
+The initial vertex is the start vertex if the game has one, and vertex 0
+otherwise, as for the solvers (see SolveTask).'''
+import hashlib
+import compression
+
+# The maximum number of rounds of colour refinement.
+ROUNDS = 32
+
+def _mix(values):
+  '''A fixed pseudo-random function of 64-bit integers (splitmix64).'''
+  import numpy
+  z = values.astype(numpy.uint64) + numpy.uint64(0x9E3779B97F4A7C15)
+  z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+  z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+  return z ^ (z >> numpy.uint64(31))
+
+def _ranks(*keys):
+  '''The rank of every element among the distinct tuples of keys, and the
+     number of distinct tuples. The last key is the most significant.'''
+  import numpy
+  order = numpy.lexsort(keys)
+  new = numpy.zeros(len(order), bool)
+  for key in keys:
+    new[1:] |= key[order][1:] != key[order][:-1]
+  ranks = numpy.empty(len(order), numpy.int64)
+  ranks[order] = numpy.cumsum(new)
+  return ranks, (int(ranks.max()) + 1 if len(order) else 0)
+
+def _colours(game, vertices, sources, targets):
+  '''Refines the colours of vertices (numbered 0..len(vertices) - 1, with
+     edges from sources to targets), and returns them if they are all
+     different, and None otherwise.'''
+  import numpy
+  k = len(vertices)
+  initial = numpy.zeros(k, numpy.int64)
+  start = game.start if game.start is not None else 0
+  first = numpy.searchsorted(vertices, start)
+  if first < k and vertices[first] == start:
+    initial[first] = 1
+  colours, count = _ranks(initial, game.owner[vertices].astype(numpy.int64),
+                          game.priority[vertices].astype(numpy.int64))
+  degrees = numpy.bincount(sources, minlength=k)
+  bounds = numpy.concatenate(([0], numpy.cumsum(degrees)[:-1]))
+  for _ in xrange(ROUNDS):
+    if count == k:
+      return colours
+    # The multiset of colours of the successors of every vertex, as a sum
+    # of pseudo-random values.
+    successors = numpy.zeros(k, numpy.uint64)
+    if len(targets):
+      nonempty = degrees > 0
+      successors[nonempty] = numpy.add.reduceat(_mix(colours[targets]), bounds[nonempty])
+    (colours, previous) = _ranks(successors, colours)[0], count
+    count = int(colours.max()) + 1 if k else 0
+    if count == previous:
+      break
+  return colours if count == k else None
+
+def _gamehash(game):
+  import numpy
+  present = game.owner >= 0
+  vertices = numpy.flatnonzero(present)
+  degrees = numpy.diff(game.offsets)
+  # Successor lists in the order of vertices; absent vertices have none.
+  sources = numpy.repeat(numpy.arange(game.n), degrees)
+  targets = numpy.asarray(game.targets, numpy.int64)
+  index = numpy.cumsum(present) - 1
+  colours = _colours(game, vertices, index[sources], index[targets])
+  h = hashlib.sha1()
+  if colours is None:
+    kind = 'numbered'
+    number = numpy.arange(game.n)
+    h.update(str(game.start))
+  else:
+    kind = 'canonical'
+    number = numpy.zeros(game.n, numpy.int64)
+    number[vertices] = colours
+    start = game.start if game.start is not None else 0
+    h.update(str(number[start] if start < game.n and present[start] else None))
+  order = vertices[numpy.argsort(number[vertices])]
+  h.update(game.priority[order].astype('<u4').tostring())
+  h.update(game.owner[order].astype('i1').tostring())
+  h.update(degrees[order].astype('<i8').tostring())
+  edges = numpy.lexsort((number[targets], number[sources]))
+  h.update(number[targets][edges].astype('<i8').tostring())
+  return '{0}:{1}'.format(kind, h.hexdigest())
+
+def _filehash(pgfile):
+  h = hashlib.sha1()
+  infile = compression.openPlain(pgfile)
+  try:
+    block = infile.read(1 << 20)
+    while block:
+      h.update(block)
+      block = infile.read(1 << 20)
+  finally:
+    infile.close()
+  return 'bytes:{0}'.format(h.hexdigest())
+
+def gamehash(pgfile):
+  '''The hash of the game in pgfile, prefixed by how it was computed:
+     canonical (independent of the numbering of vertices), numbered or
+     bytes (of the file).'''
+  try:
+    import pgbinary
+  except ImportError:
+    return _filehash(pgfile)
+  game = pgbinary.load(pgfile)
+  try:
+    return _gamehash(game)
+  finally:
+    game.close()
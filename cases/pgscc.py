@@ -0,0 +1,203 @@
+'''Decomposition of parity games into strongly connected components, and the
+measures that are derived from it: the number of (terminal, trivial) SCCs,
+the height of the SCC quotient graph and two variants of alternation depth.
+
+The search is an iterative version of Tarjan's algorithm, so the depth of
+the game is not limited by the Python stack. The graph is copied from a
+pgbinary.BinaryGame into flat arrays of machine integers, which are much
+faster to index from Python than numpy arrays, and use a fixed number of
+bytes per vertex and per edge (about 50 and 4).
+
+The searches are not vectorised, so they take time in the order of
+microseconds per edge: on random games with 1-3M edges, a decomposition took
+about 2.5 us per edge, and cksAlternationDepth about 1 us per edge for every
+distinct priority, because it searches nested subgraphs once for every
+priority that is removed. PGStatsTask leaves larger games to pginfo (see
+PGSCC_MAX_EDGES and PGSCC_MAX_CKS_WORK in __init__.py).'''
+import array
+
+def _array(typecode, values):
+  a = array.array(typecode)
+  a.fromstring(values.tostring())
+  return a
+
+class _Graph(object):
+  '''The arrays shared by all searches in a game. Only vertices v with
+     region[v] == label are part of a search with that label, so that
+     subgraphs can be searched without copying the graph.'''
+  def __init__(self, game):
+    self.offsets = _array('l', game.offsets.astype('int64'))
+    self.targets = _array('I', game.targets.astype('uint32'))
+    self.priority = _array('l', game.priority.astype('int64'))
+    self.present = bytearray((game.owner >= 0).astype('uint8').tostring())
+    self.region = _array('l', (game.owner >= 0).astype('int64') - 1)
+    self.index = array.array('l', [-1]) * game.n
+    self.low = array.array('l', [0]) * game.n
+    self.onstack = bytearray(game.n)
+    self.counter = 0
+    self.labels = 0
+
+  def newlabel(self):
+    self.labels += 1
+    return self.labels
+
+  def selfloop(self, v):
+    targets = self.targets
+    for i in xrange(self.offsets[v], self.offsets[v + 1]):
+      if targets[i] == v:
+        return True
+    return False
+
+  def tarjan(self, vertices, label, emit):
+    '''Calls emit with the list of vertices of every SCC of the subgraph with
+       the given label that contains one of vertices. SCCs are emitted in
+       reverse topological order: every SCC after all SCCs it can reach.'''
+    offsets, targets, region = self.offsets, self.targets, self.region
+    index, low, onstack = self.index, self.low, self.onstack
+    for v in vertices:
+      index[v] = -1
+    stack = []
+    for root in vertices:
+      if index[root] != -1 or region[root] != label:
+        continue
+      index[root] = low[root] = self.counter
+      self.counter += 1
+      stack.append(root)
+      onstack[root] = 1
+      # The call stack of the recursive algorithm: vertices, and the index of
+      # the next edge of each of them.
+      calls = [root]
+      edges = [offsets[root]]
+      while calls:
+        v = calls[-1]
+        i = edges[-1]
+        end = offsets[v + 1]
+        descended = False
+        while i < end:
+          w = targets[i]
+          i += 1
+          if region[w] != label:
+            continue
+          if index[w] == -1:
+            edges[-1] = i
+            index[w] = low[w] = self.counter
+            self.counter += 1
+            stack.append(w)
+            onstack[w] = 1
+            calls.append(w)
+            edges.append(offsets[w])
+            descended = True
+            break
+          elif onstack[w] and index[w] < low[v]:
+            low[v] = index[w]
+        if descended:
+          continue
+        calls.pop()
+        edges.pop()
+        if calls and low[v] < low[calls[-1]]:
+          low[calls[-1]] = low[v]
+        if low[v] == index[v]:
+          members = []
+          while True:
+            w = stack.pop()
+            onstack[w] = 0
+            members.append(w)
+            if w == v:
+              break
+          emit(members)
+
+def _alternations(priorities):
+  '''The number of blocks of priorities of the same parity when the distinct
+     priorities are sorted.'''
+  count = 0
+  parity = None
+  for p in sorted(set(priorities)):
+    if p % 2 != parity:
+      count += 1
+      parity = p % 2
+  return count
+
+class Decomposition(object):
+  '''The SCCs of a game, with the number of terminal SCCs (from which no
+     other SCC can be reached), the number of trivial SCCs (a single vertex
+     without a self-loop), the height of the quotient graph (the largest
+     number of SCCs on a path) and the alternation depth with respect to the
+     priority ordering: the largest number of blocks of equal parity in the
+     sorted priorities of a non-trivial SCC.'''
+  def __init__(self, game):
+    self.graph = _Graph(game)
+    self.sccs = 0
+    self.terminal = 0
+    self.trivial = 0
+    self.height = 0
+    self.alternationdepth = 0
+    n = game.n
+    self.__component = array.array('l', [-1]) * n
+    # The height of the quotient graph below every SCC.
+    self.__heights = array.array('l')
+    self.graph.tarjan(xrange(n), 0, self.__emit)
+
+  def __emit(self, members):
+    graph = self.graph
+    offsets, targets, component, heights = graph.offsets, graph.targets, self.__component, self.__heights
+    c = self.sccs
+    self.sccs += 1
+    for v in members:
+      component[v] = c
+    height = 0
+    terminal = True
+    for v in members:
+      for i in xrange(offsets[v], offsets[v + 1]):
+        d = component[targets[i]]
+        if d != c:
+          terminal = False
+          if heights[d] > height:
+            height = heights[d]
+    heights.append(height + 1)
+    self.height = max(self.height, height + 1)
+    if terminal:
+      self.terminal += 1
+    if len(members) == 1 and not graph.selfloop(members[0]):
+      self.trivial += 1
+    else:
+      self.alternationdepth = max(self.alternationdepth,
+                                  _alternations([graph.priority[v] for v in members]))
+
+def cksAlternationDepth(decomposition):
+  '''Alternation depth in the sense of [CKS93]: the largest number of
+     alternations between even and odd in a chain of nested SCCs, each of
+     which is an SCC of its predecessor without the vertices with the
+     greatest priority in that predecessor, plus one. The chains are
+     followed with an explicit work list instead of recursion.'''
+  graph = decomposition.graph
+  priority, region, present = graph.priority, graph.region, graph.present
+  depth = 0
+  # Chains of nested SCCs that still have to be followed: the vertices of
+  # the last SCC, the number of alternations so far and the parity of the
+  # greatest priority in the SCC before it.
+  work = []
+  def follow(alternations, parity):
+    def emit(scc):
+      if len(scc) > 1 or graph.selfloop(scc[0]):
+        work.append((scc, alternations, parity))
+    return emit
+  label = graph.newlabel()
+  for v in xrange(len(region)):
+    region[v] = label if present[v] else -1
+  graph.tarjan(xrange(len(region)), label, follow(0, None))
+  while work:
+    (members, alternations, parity) = work.pop()
+    top = max(priority[v] for v in members)
+    if parity is not None and top % 2 != parity:
+      alternations += 1
+    depth = max(depth, alternations + 1)
+    label = graph.newlabel()
+    rest = []
+    for v in members:
+      if priority[v] < top:
+        region[v] = label
+        rest.append(v)
+      else:
+        region[v] = -1
+    graph.tarjan(rest, label, follow(alternations, top % 2))
+  return depth
@@ -1,5 +1,5 @@
 import os
-from cases import PGCase, tools, PGSOLVER_MEMLIMIT, PGSOLVER_TIMEOUT, Timeout, OutOfMemory
+from cases import PGCase, Series, tools, compression, parameterCost, doubling, increment, PGSOLVER_MEMLIMIT, PGSOLVER_TIMEOUT, Timeout, OutOfMemory
 
 class Case(PGCase):
   def __init__(self, generator, *args, **kwargs):
@@ -17,27 +17,40 @@ class Case(PGCase):
   def __str__(self):
     return '{0}({1})'.format(self.__generator, ', '.join(self.__args))
   
+  def family(self):
+    return self.__generator
+  
+  def cost(self):
+    return parameterCost(*self.__args)
+  
   def _makePGfile(self, log, returnExisting):
     pgfile = self._existingTempFile('gm')
     if pgfile and returnExisting:
       return pgfile
     
-    pgfile = self._newTempFile('gm')
+    pgfile = self._stableTempFilename(compression.ext('gm'))
+    partial = self._partialFilename(pgfile)
     try:
-      result = tools.Tool(self.__generator, log, memlimit=PGSOLVER_MEMLIMIT, timeout=PGSOLVER_TIMEOUT, timed=True, hastimings=False)(*self.__args)
-      pgfile.write(result['out'])
-      pgfile.close()
+      result = tools.Tool(self.__generator, log, memlimit=PGSOLVER_MEMLIMIT, timeout=PGSOLVER_TIMEOUT, timed=True, hastimings=False)(*self.__args, output=partial, cachekey=self._prefix)
+      os.rename(partial, pgfile)
       self.result['generation']['times'] = result['times']
       self.result['generation']['memory'] = result['memory']
+      self.result['generation']['usage'] = result['usage']
     except (Timeout, OutOfMemory) as e:
+      self._discardPartial(partial, pgfile)
       self.result['generation']['times'] = e.result['times']
       self.result['generation']['memory'] = e.result['memory']
+      self.result['generation']['usage'] = e.result['usage']
       raise e
-    return pgfile.name
+    except:
+      self._discardPartial(partial, pgfile)
+      raise
+    return pgfile
 
-def getcases(debugOnly = False):
+def getseries(debugOnly = False):
+  '''The cases as series in which the size of the game grows, see Series.'''
   if debugOnly:
-    return [Case('elevatorverification', n) for n in range(3, 4)]
+    return [Series('elevatorverification', range(3, 4), Case, ('elevatorverification',), step=increment)]
   
   # ctlstarsudokugenerator
      # elevatortsgenerator
@@ -52,16 +65,19 @@ def getcases(debugOnly = False):
   # steadygame
   nRandom = 25
   return \
-    [Case('elevatorverification', n) for n in range(3, 8)] + \
-    [Case('elevatorverification', '-u', n) for n in range(3, 8)] + \
-    [Case('towersofhanoi', n) for n in range(5, 12)] + \
-    [Case('cliquegame', n) for n in [100, 200, 500, 1000, 2000, 5000, 10000] ] + \
-    [Case('jurdzinskigame', n, m) for n in [50, 100, 200, 500] for m in [50, 100, 200, 500] ] + \
-    [Case('laddergame', n) for n in [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000] ] + \
-    [Case('modelcheckerladder', n) for n in [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000] ] + \
-    [Case('recursiveladder', n) for n in [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000] ] + \
-    [Case('randomgame', n, 10, 1, 20, id=id) for id in range(0,nRandom) for n in [1000, 5000, 10000, 20000, 50000] ] + \
-    [Case('clusteredrandomgame', n, 10, 1, 50, 10, 0, 5, 1, 10, id=id) for id in range(0,nRandom) for n in [1000, 5000, 10000, 20000, 50000, 100000, 200000] ] + \
-    [Case('steadygame', n, 1, 20, 1, 20, id=id) for n in [1000, 5000, 10000, 20000, 50000, 10000] for id in range(0,nRandom)]
-    
-    
+    [Series('elevatorverification', range(3, 8), Case, ('elevatorverification',), step=increment)] + \
+    [Series('elevatorverification -u', range(3, 8), Case, ('elevatorverification', '-u'), step=increment)] + \
+    [Series('towersofhanoi', range(5, 12), Case, ('towersofhanoi',), step=increment)] + \
+    [Series('cliquegame', [100, 200, 500, 1000, 2000, 5000, 10000], Case, ('cliquegame',), step=doubling)] + \
+    [Series('jurdzinskigame m={0}'.format(m), [50, 100, 200, 500], Case, ('jurdzinskigame', m), param=1, step=doubling) for m in [50, 100, 200, 500] ] + \
+    [Series('laddergame', [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000], Case, ('laddergame',), step=doubling)] + \
+    [Series('modelcheckerladder', [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000], Case, ('modelcheckerladder',), step=doubling)] + \
+    [Series('recursiveladder', [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000], Case, ('recursiveladder',), step=doubling)] + \
+    [Series('randomgame', [1000, 5000, 10000, 20000, 50000], Case, ('randomgame', 10, 1, 20), param=1, replicas=range(0,nRandom), step=doubling)] + \
+    [Series('clusteredrandomgame', [1000, 5000, 10000, 20000, 50000, 100000, 200000], Case, ('clusteredrandomgame', 10, 1, 50, 10, 0, 5, 1, 10), param=1, replicas=range(0,nRandom), step=doubling)] + \
+    [Series('steadygame', [1000, 5000, 10000, 20000, 50000], Case, ('steadygame', 1, 20, 1, 20), param=1, replicas=range(0,nRandom), step=doubling)]
+
+def getcases(debugOnly = False):
+  for series in getseries(debugOnly):
+    for case in series.cases():
+      yield case
@@ -0,0 +1,438 @@
+'''Structural statistics of parity games, computed in-process on a
+pgbinary.BinaryGame using vectorised numpy operations. The results use the
+same keys as the YAML output of pginfo, so they can be stored in the same
+way.'''
+import numpy
+import math
+import time
+import pgscc
+
+def _summary(values):
+  if len(values) == 0:
+    return {'min': 0, 'avg': 0.0, 'max': 0}
+  return {'min': int(values.min()), 'avg': float(values.mean()), 'max': int(values.max())}
+
+def priorities(game):
+  '''The number of distinct priorities of the vertices of game.'''
+  return len(numpy.unique(game.priority[game.vertices()]))
+
+def graph(game):
+  '''Counts, owners, priorities and degrees; the equivalent of pginfo
+     --graph.'''
+  vertices = game.vertices()
+  outdegree = game.degrees()[vertices]
+  indegree = numpy.bincount(game.targets, minlength=game.n)[vertices]
+  owner = game.owner[vertices]
+  return {'Number of vertices': len(vertices),
+          'Number of edges': game.m,
+          'Number of even vertices': int(numpy.count_nonzero(owner == 0)),
+          'Number of odd vertices': int(numpy.count_nonzero(owner == 1)),
+          'Number of priorities': priorities(game),
+          'Degree': _summary(indegree + outdegree),
+          'In-degree': _summary(indegree),
+          'Out-degree': _summary(outdegree)}
+
+def _initial(game):
+  '''The vertex from which searches start: the start vertex if the game has
+     one, and the vertex with the smallest number otherwise.'''
+  if game.start is not None and game.start in game:
+    return game.start
+  return game.vertices()[0]
+
+def _roots(game):
+  '''The initial vertex followed by all vertices in increasing order, as roots
+     of searches that together visit all vertices. Roots that have been
+     visited by an earlier search must be skipped.'''
+  vertices = game.vertices()
+  if len(vertices) == 0:
+    return
+  yield _initial(game)
+  for v in vertices:
+    yield v
+
+def _expand(game, frontier):
+  '''Returns the sources and targets of all edges leaving frontier, in the
+     order of frontier.'''
+  starts = game.offsets[frontier]
+  counts = game.offsets[frontier + 1] - starts
+  total = int(counts.sum())
+  sources = numpy.repeat(numpy.arange(len(frontier)), counts)
+  index = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) + numpy.arange(total)
+  return sources, game.targets[index].astype(numpy.int64)
+
+def bfs(game):
+  '''Breadth-first search, one level at a time; the equivalent of pginfo
+     --bfs. Vertices that are not reachable from the initial vertex are
+     searched from new roots. The height is the largest number of levels of
+     any of these searches, the maximal queue size is that of a FIFO queue
+     from which vertices are removed before their successors are added, and
+     back level edges are edges to a vertex on a lower level.'''
+  level = numpy.empty(game.n, numpy.int64)
+  level.fill(-1)
+  height = 0
+  maxqueue = 0
+  back = 0
+  for root in _roots(game):
+    if level[root] >= 0:
+      continue
+    frontier = numpy.array([root], numpy.int64)
+    depth = 0
+    level[root] = 0
+    while len(frontier):
+      sources, targets = _expand(game, frontier)
+      back += int(numpy.count_nonzero((level[targets] >= 0) & (level[targets] < depth)))
+      new = level[targets] < 0
+      # The first occurrence of every new vertex is where it is discovered.
+      discovered, first = numpy.unique(targets[new], return_index=True)
+      found = numpy.bincount(sources[new][first], minlength=len(frontier))
+      # After the i-th vertex of the level has been processed, the queue
+      # holds the rest of the level and everything discovered so far.
+      queue = len(frontier) - 1 - numpy.arange(len(frontier)) + numpy.cumsum(found)
+      maxqueue = max(maxqueue, len(frontier), int(queue.max()))
+      depth += 1
+      level[discovered] = depth
+      frontier = discovered[numpy.argsort(first)]
+    height = max(height, depth)
+  return {'Number of levels (BFS height)': height,
+          'Max queue': maxqueue,
+          'Number of back level edges': back}
+
+def dfs(game):
+  '''Depth-first search; the equivalent of pginfo --dfs. The maximal stack
+     size is the largest number of vertices on the path from the root of the
+     search to the current vertex. Unlike the other metrics this is
+     inherently sequential, so like pginfo it should only be computed for
+     small games.'''
+  offsets = game.offsets.tolist()
+  targets = game.targets.tolist()
+  visited = [False] * game.n
+  maxstack = 0
+  for root in _roots(game):
+    if visited[root]:
+      continue
+    visited[root] = True
+    # Pairs of a vertex and the index of its next successor to be explored.
+    stack = [[root, offsets[root]]]
+    maxstack = max(maxstack, 1)
+    while stack:
+      top = stack[-1]
+      (v, i) = top
+      end = offsets[v + 1]
+      while i < end and visited[targets[i]]:
+        i += 1
+      if i == end:
+        stack.pop()
+        continue
+      top[1] = i + 1
+      w = targets[i]
+      visited[w] = True
+      stack.append([w, offsets[w]])
+      maxstack = max(maxstack, len(stack))
+  return {'Max stack': maxstack}
+
+def _decomposition(game):
+  '''The SCC decomposition of game, which is shared by the metrics below.'''
+  if getattr(game, 'decomposition', None) is None:
+    game.decomposition = pgscc.Decomposition(game)
+  return game.decomposition
+
+def sccs(game):
+  '''The equivalent of pginfo --sccs.'''
+  decomposition = _decomposition(game)
+  return {'SCCs': decomposition.sccs,
+          'Quotient height': decomposition.height,
+          'Terminal SCCs': decomposition.terminal,
+          'Trivial SCCs': decomposition.trivial}
+
+def alternationdepth(game):
+  '''The equivalent of pginfo --ad.'''
+  return _decomposition(game).alternationdepth
+
+def cksalternationdepth(game):
+  '''The equivalent of pginfo --ad-cks.'''
+  return pgscc.cksAlternationDepth(_decomposition(game))
+
+# Metrics that pginfo cannot compute for large games in reasonable time are
+# estimated from SAMPLES searches from random vertices (diameter, girth), or
+# from the neighbourhoods of LOCAL_SAMPLES random vertices (neighbourhoods,
+# diamonds). The estimates are recorded with bounds that hold with
+# probability CONFIDENCE. The random vertices are chosen using SEED, so that
+# the estimates of a game do not change between runs. The neighbourhood of a
+# single vertex is only searched as long as a step follows at most
+# LOCAL_EXPANSION edges, which bounds the memory of the search, and no new
+# samples are taken after LOCAL_TIME seconds.
+SAMPLES = 32
+LOCAL_SAMPLES = 1000
+LOCAL_EXPANSION = 1 << 20
+LOCAL_TIME = 300
+CONFIDENCE = 0.95
+SEED = 0
+
+# Rough cost of the estimates, used by the planner to decide whether they are
+# worth computing: searches take about SECONDS_PER_EDGE for every edge they
+# follow (measured on games with about 1M edges, including the overhead of
+# deep games with many levels), and the search of a neighbourhood at least
+# SECONDS_PER_SAMPLE.
+SECONDS_PER_EDGE = 2.5e-7
+SECONDS_PER_SAMPLE = 1e-4
+
+def cost(option, vertices, edges):
+  '''Expected time in seconds of estimating option for a game with the given
+     numbers of vertices and edges. The neighbourhood of a vertex is
+     expected to grow with the average out-degree in every step.'''
+  if option in ('diameter', 'girth'):
+    return (SAMPLES + 1) * (vertices + edges) * SECONDS_PER_EDGE
+  degree = float(edges) / max(vertices, 1)
+  if option == 'neighbourhoods=3':
+    (steps, players) = (3, 1)
+  elif option == 'diamonds':
+    (steps, players) = (2, 2)
+  else:
+    return None
+  local = sum(min(degree ** k, edges, LOCAL_EXPANSION) for k in xrange(1, steps + 1))
+  samples = players * min(LOCAL_SAMPLES, vertices)
+  return min(samples * (SECONDS_PER_SAMPLE + local * SECONDS_PER_EDGE), players * LOCAL_TIME)
+
+def _z(confidence):
+  '''The z such that a standard normal variable lies in [-z, z] with the given
+     probability.'''
+  low, high = 0.0, 10.0
+  for _ in xrange(100):
+    mid = (low + high) / 2
+    if math.erf(mid / math.sqrt(2)) < confidence:
+      low = mid
+    else:
+      high = mid
+  return high
+
+def _sample(vertices, count):
+  '''count vertices chosen uniformly at random, or all vertices if there
+     are not more than count.'''
+  if len(vertices) <= count:
+    return vertices
+  return numpy.sort(numpy.random.RandomState(SEED).choice(vertices, count, replace=False))
+
+def _shuffle(samples):
+  '''samples in random order, so that any prefix of them is a random
+     sample as well.'''
+  return samples[numpy.random.RandomState(SEED).permutation(len(samples))]
+
+def _estimate(samples, total, truncated=None):
+  '''The fields that are recorded with every estimate. total is the number
+     of vertices that could have been sampled, truncated the number of
+     samples that were not searched completely.'''
+  result = {'approximate': samples < total or bool(truncated), 'samples': samples, 'confidence': CONFIDENCE}
+  if truncated is not None:
+    result['truncated'] = truncated
+  return result
+
+def _quantile(samples, total):
+  '''If a property holds for all of samples random vertices, then with
+     probability CONFIDENCE it holds for at least this fraction of all total
+     vertices: (1 - e)^samples <= 1 - CONFIDENCE for the remaining fraction
+     e.'''
+  if samples >= total:
+    return 1.0
+  return (1 - CONFIDENCE) ** (1.0 / samples)
+
+def _distances(game, source):
+  '''The distance of every vertex from source (-1 if it cannot be reached),
+     and the eccentricity of source.'''
+  distance = numpy.empty(game.n, numpy.int64)
+  distance.fill(-1)
+  distance[source] = 0
+  frontier = numpy.array([source], numpy.int64)
+  depth = 0
+  while len(frontier):
+    _, targets = _expand(game, frontier)
+    frontier = numpy.unique(targets[distance[targets] < 0])
+    if len(frontier):
+      depth += 1
+      distance[frontier] = depth
+  return distance, depth
+
+def diameter(game):
+  '''Estimate of the equivalent of pginfo --diameter: the largest
+     eccentricity of SAMPLES random vertices, and of the vertex furthest
+     from them. This is a lower bound of the diameter. The upper bound is
+     statistical: with probability CONFIDENCE, the eccentricity of at least
+     a fraction quantile of the vertices is at most value.'''
+  vertices = game.vertices()
+  sources = _sample(vertices, SAMPLES)
+  best, furthest = 0, None
+  for source in sources:
+    (distance, eccentricity) = _distances(game, source)
+    if eccentricity >= best:
+      best, furthest = eccentricity, int(numpy.argmax(distance))
+  if furthest is not None:
+    best = max(best, _distances(game, furthest)[1])
+  result = _estimate(len(sources), len(vertices))
+  result.update({'value': best, 'lower': best, 'quantile': _quantile(len(sources), len(vertices))})
+  return result
+
+def girth(game):
+  '''Estimate of the equivalent of pginfo --girth, the length of a shortest
+     cycle. Cycles of length 1 and 2 are found exactly; otherwise the value
+     is the length of the shortest cycle through one of SAMPLES random
+     vertices. This is an upper bound of the girth, and with probability
+     CONFIDENCE at most a fraction 1 - quantile of the vertices lies on a
+     shorter cycle.'''
+  vertices = game.vertices()
+  result = _estimate(len(vertices), len(vertices))
+  sources = numpy.repeat(numpy.arange(game.n, dtype=numpy.int64), game.degrees())
+  targets = game.targets.astype(numpy.int64)
+  if numpy.any(sources == targets):
+    result.update({'value': 1, 'lower': 1, 'upper': 1, 'quantile': 1.0})
+    return result
+  if numpy.any(numpy.in1d(targets * game.n + sources, sources * game.n + targets)):
+    result.update({'value': 2, 'lower': 2, 'upper': 2, 'quantile': 1.0})
+    return result
+  del targets
+  best = None
+  samples = _sample(vertices, SAMPLES)
+  for source in samples:
+    distance = _distances(game, source)[0]
+    predecessors = distance[sources[game.targets == source]]
+    predecessors = predecessors[predecessors >= 0]
+    if len(predecessors) and (best is None or predecessors.min() + 1 < best):
+      best = int(predecessors.min()) + 1
+  result = _estimate(len(samples), len(vertices))
+  result.update({'value': best, 'lower': 3, 'upper': best, 'quantile': _quantile(len(samples), len(vertices))})
+  return result
+
+def _interval(values, z):
+  '''Bounds of the mean of the population from which values were sampled.'''
+  mean = float(values.mean())
+  error = z * float(values.std(ddof=1)) / math.sqrt(len(values)) if len(values) > 1 else 0.0
+  return mean - error, mean + error
+
+def neighbourhoods(game, depth=3):
+  '''Estimate of the equivalent of pginfo --neighbourhoods=3: the number of
+     vertices within 1, 2 and 3 steps of a vertex, including the vertex
+     itself, for LOCAL_SAMPLES random vertices. Besides the average, minimum
+     and maximum of the sample, bounds of the average over all vertices are
+     recorded. The neighbourhoods are searched one sample at a time, and a
+     search stops when the next step would follow more than LOCAL_EXPANSION
+     edges; the size of a neighbourhood that was not searched completely is
+     bounded by what was found and by the number of edges that were left.
+     The minimum, average and maximum are those of the lower bounds, and the
+     number of such samples is recorded as 'truncated'.'''
+  vertices = game.vertices()
+  origins = _shuffle(_sample(vertices, LOCAL_SAMPLES))
+  z = _z(CONFIDENCE)
+  lower = numpy.zeros((depth, len(origins)), numpy.int64)
+  upper = numpy.zeros((depth, len(origins)), numpy.int64)
+  marked = numpy.zeros(game.n, bool)
+  deadline = time.time() + LOCAL_TIME
+  samples = 0
+  for origin in origins:
+    if samples and time.time() > deadline:
+      break
+    frontier = numpy.array([origin], numpy.int64)
+    found = [frontier]
+    marked[origin] = True
+    size = 1
+    for k in xrange(depth):
+      edges = int((game.offsets[frontier + 1] - game.offsets[frontier]).sum())
+      if edges > LOCAL_EXPANSION:
+        lower[k:, samples] = size
+        upper[k, samples] = min(len(vertices), size + edges)
+        upper[k + 1:, samples] = len(vertices)
+        break
+      targets = _expand(game, frontier)[1]
+      frontier = numpy.unique(targets[~marked[targets]])
+      marked[frontier] = True
+      found.append(frontier)
+      size += len(frontier)
+      lower[k, samples] = upper[k, samples] = size
+    for f in found:
+      marked[f] = False
+    samples += 1
+  result = {}
+  for k in xrange(1, depth + 1):
+    (low, high) = (lower[k - 1, :samples], upper[k - 1, :samples])
+    truncated = int(numpy.count_nonzero(low != high))
+    result[k] = _summary(low)
+    result[k].update(_estimate(samples, len(vertices), truncated))
+    if not samples:
+      (result[k]['avg_lower'], result[k]['avg_upper']) = (0.0, 0.0)
+    elif result[k]['approximate']:
+      (result[k]['avg_lower'], result[k]['avg_upper']) = (_interval(low, z)[0], _interval(high, z)[1])
+    else:
+      result[k]['avg_lower'] = result[k]['avg_upper'] = result[k]['avg']
+  return result
+
+def _diamonds(game, tops, deadline):
+  '''Counts how many of the vertices tops, from the first, are the top of a
+     diamond: they have two different successors, other than themselves,
+     with a common successor. Returns the number of tops that are, the
+     number of tops for which this was not decided because the successors
+     of their successors are more than LOCAL_EXPANSION edges, and the number
+     of tops that were looked at before the deadline.'''
+  (hits, undecided, samples) = (0, 0, 0)
+  for top in tops:
+    if samples and time.time() > deadline:
+      break
+    samples += 1
+    middle = _expand(game, numpy.array([top], numpy.int64))[1]
+    middle = numpy.unique(middle[middle != top])
+    if int((game.offsets[middle + 1] - game.offsets[middle]).sum()) > LOCAL_EXPANSION:
+      undecided += 1
+      continue
+    (which, bottom) = _expand(game, middle)
+    # Every bottom vertex once for every middle vertex from which it is
+    # reached.
+    bottom = numpy.unique(which * game.n + bottom) % game.n
+    if len(numpy.unique(bottom)) < len(bottom):
+      hits += 1
+  return hits, undecided, samples
+
+def _proportion(hits, samples, z):
+  '''Wilson score interval of a proportion.'''
+  if samples == 0:
+    return 0.0, 0.0
+  p = float(hits) / samples
+  centre = (p + z * z / (2 * samples)) / (1 + z * z / samples)
+  error = z * math.sqrt(p * (1 - p) / samples + z * z / (4 * samples * samples)) / (1 + z * z / samples)
+  return max(0.0, centre - error), min(1.0, centre + error)
+
+def diamonds(game):
+  '''Estimate of the equivalent of pginfo --diamonds: the number of vertices
+     of even and odd players that are the top of a diamond, from
+     LOCAL_SAMPLES random vertices of each player. Bounds of the numbers are
+     recorded next to them; vertices for which this could not be decided
+     within LOCAL_EXPANSION edges count as tops for the upper bound only,
+     and their number is recorded as 'truncated'.'''
+  vertices = game.vertices()
+  z = _z(CONFIDENCE)
+  result = {'lower': {}, 'upper': {}}
+  (samples, truncated) = (0, 0)
+  for (player, name) in [(0, 'Even'), (1, 'Odd')]:
+    candidates = vertices[game.owner[vertices] == player]
+    tops = _shuffle(_sample(candidates, LOCAL_SAMPLES).astype(numpy.int64))
+    (hits, undecided, count) = _diamonds(game, tops, time.time() + LOCAL_TIME)
+    samples += count
+    truncated += undecided
+    (lower, upper) = (_proportion(hits, count, z)[0], _proportion(hits + undecided, count, z)[1])
+    if count == len(candidates) and count:
+      (lower, upper) = (float(hits) / count, float(hits + undecided) / count)
+    result[name] = int(round(float(hits) / count * len(candidates))) if count else 0
+    result['lower'][name] = int(math.floor(lower * len(candidates)))
+    result['upper'][name] = int(math.ceil(upper * len(candidates)))
+  result['Total'] = result['Even'] + result['Odd']
+  result['lower']['Total'] = result['lower']['Even'] + result['lower']['Odd']
+  result['upper']['Total'] = result['upper']['Even'] + result['upper']['Odd']
+  result.update(_estimate(samples, len(vertices), truncated))
+  return result
+
+# The metrics that are computed by this module, with the key of their result
+# in the output of pginfo.
+METRICS = [('graph', 'Graph', graph), ('bfs', 'BFS', bfs), ('dfs', 'DFS', dfs),
+           ('sccs', 'SCC', sccs),
+           ('ad', 'Alternation depth (priority ordering)', alternationdepth),
+           ('ad-cks', 'Alternation depth [CKS93]', cksalternationdepth)]
+
+# Estimates of metrics that pginfo only computes exactly, used for games with
+# more than LARGE_GRAPH vertices.
+SAMPLED = [('diameter', 'Diameter', diameter), ('girth', 'Girth', girth),
+           ('diamonds', 'Diamonds', diamonds), ('neighbourhoods=3', 'Neighbourhood', neighbourhoods)]
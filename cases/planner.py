@@ -0,0 +1,113 @@
+import math
+import os
+import yaml
+
+# Until a metric has been observed in earlier runs, pginfo is expected to
+# take PRIOR_FACTOR * size ** PRIOR_EXPONENTS[option] seconds to compute it
+# for a game of the given size (vertices plus edges).
+PRIOR_FACTOR = 1e-6
+PRIOR_EXPONENTS = {'graph': 1.0, 'bfs': 1.0, 'dfs': 1.0, 'sccs': 1.0, 'ad': 1.0, 'ad-cks': 1.5,
+                   'diameter': 2.0, 'girth': 2.0, 'diamonds': 1.5, 'neighbourhoods=3': 1.5,
+                   'treewidth-lb': 2.0, 'treewidth-ub': 2.0, 'kellywidth-ub': 2.0}
+
+# A metric is only computed exactly if it is expected to finish well within
+# the timeout: it gets SAFETY times the expected time, but at least
+# MIN_TIMEOUT seconds.
+SAFETY = 4
+MIN_TIMEOUT = 60
+
+# The planner used by all PGInfoTaskGroups, see configure().
+_ACTIVE = None
+
+def configure(historyfile=None):
+  '''Makes the planner learn the time that pginfo takes from the timings in
+     historyfile (see pool.CostModel). Like the cache, this must be done
+     before the TaskPool is created.'''
+  global _ACTIVE
+  _ACTIVE = Planner(historyfile)
+  return _ACTIVE
+
+def active():
+  '''Returns the configured planner, or one that only uses the prior.'''
+  global _ACTIVE
+  if _ACTIVE is None:
+    _ACTIVE = Planner()
+  return _ACTIVE
+
+class Planner(object):
+  '''Decides which information about a game pginfo collects, based on the
+     size of the game. For every metric, the time is modelled as a * size^b.
+     The model is fitted to the timings of pginfo in earlier runs, which are
+     recorded in the history file under the family pginfo:<option>; for
+     metrics without timings the prior is used. Runs that timed out are
+     censored: they are not fitted, but the time they took is a lower bound
+     of the time for games of at least their size.'''
+  def __init__(self, historyfile=None):
+    self.__models = {}
+    self.__bounds = {}
+    timings = {}
+    if historyfile is not None and os.path.exists(historyfile):
+      timings = yaml.load(open(historyfile).read()) or {}
+    for (family, tasks) in timings.items():
+      if family.startswith('pginfo:'):
+        option = family[len('pginfo:'):]
+        model = self.__fit(option, [(t['cost'], t['time']) for t in tasks.values() if not t.get('censored')])
+        if model is not None:
+          self.__models[option] = model
+        self.__bounds[option] = [(t['cost'], t['time']) for t in tasks.values() if t.get('censored')]
+
+  @staticmethod
+  def __fit(option, points):
+    '''Least squares fit of log(time) = log(a) + b log(size). If all sizes are
+       the same, only a is fitted, using the prior exponent.'''
+    points = [(math.log(s), math.log(t)) for (s, t) in points if s > 0 and t > 0]
+    if not points:
+      return None
+    prior = PRIOR_EXPONENTS.get(option, 2.0)
+    n = len(points)
+    mx = sum(x for (x, _) in points) / n
+    my = sum(y for (_, y) in points) / n
+    sxx = sum((x - mx) ** 2 for (x, _) in points)
+    if sxx > 0:
+      # Keep the exponent sensible when there are few, noisy observations.
+      b = min(3.0, max(0.5, sum((x - mx) * (y - my) for (x, y) in points) / sxx))
+    else:
+      b = prior
+    return (math.exp(my - b * mx), b)
+
+  def estimate(self, option, size):
+    '''Expected time in seconds of computing option for a game of the given
+       size, and whether the estimate was learned from earlier runs.'''
+    if option in self.__models:
+      (a, b) = self.__models[option]
+      (expected, learned) = (a * max(size, 1) ** b, True)
+    else:
+      (expected, learned) = (PRIOR_FACTOR * max(size, 1) ** PRIOR_EXPONENTS.get(option, 2.0), False)
+    bound = max([t for (s, t) in self.__bounds.get(option, []) if s <= size] or [0])
+    if bound > expected:
+      return bound, True
+    return expected, learned
+
+  def plan(self, options, size, timeout, approximable=None):
+    '''Returns for each of options whether to compute it exactly with pginfo,
+       and with which timeout, to approximate it, or to skip it, as a
+       dictionary that can be recorded in the results. approximable maps the
+       options that can be estimated to the expected time of the estimate,
+       which must be well within the timeout as well.'''
+    approximable = approximable or {}
+    plan = {}
+    for option in options:
+      (expected, learned) = self.estimate(option, size)
+      decision = {'estimate': expected, 'model': 'history' if learned else 'prior'}
+      if SAFETY * expected <= timeout:
+        decision['decision'] = 'exact'
+        decision['timeout'] = min(timeout, max(MIN_TIMEOUT, int(math.ceil(SAFETY * expected))))
+      elif option in approximable and SAFETY * approximable[option] <= timeout:
+        decision['decision'] = 'approximate'
+        decision['approximation'] = approximable[option]
+      else:
+        decision['decision'] = 'skip'
+        if option in approximable:
+          decision['approximation'] = approximable[option]
+      plan[option] = decision
+    return plan
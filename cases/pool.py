@@ -2,8 +2,24 @@ import multiprocessing.pool
 import threading
 import logging
 import pickle
+import copy
+import heapq
+import collections
+import time
+import os
+import math
+import yaml
+import limits
 from types import NoneType
 
+# The memory estimate for a kind of task is the largest of the last
+# PEAK_HISTORY peaks observed for it.
+PEAK_HISTORY = 8
+# A task that does not fit in the memory budget is passed over by at most
+# MAX_BYPASS tasks that come after it in the queue; then no other tasks are
+# started until it fits.
+MAX_BYPASS = 16
+
 def __getlogger():
   return logging.getLogger('taskpool')
   # .getChild('worker{0}'.format(multiprocessing.current_process().pid))
@@ -11,12 +27,23 @@ def __getlogger():
 def process_task(task):
   try:
     if isinstance(task, Task):
-      task.run(__getlogger())
+      start = time.time()
+      # The peak memory use of the tools that this phase runs, measured per
+      # invocation, so that it does not depend on earlier tasks of the same
+      # worker, or on other threads of a ThreadTaskPool.
+      with limits.Meter() as meter:
+        task.run(__getlogger())
+      task.elapsed += time.time() - start
+      task.peakmemory = max(task.peakmemory, meter.peak)
     return task
   except KeyboardInterrupt:
     return
-  except:
+  except Exception as e:
+    # The task goes back to the pool, which fails the tasks that depend on
+    # it, instead of waiting for it forever.
     __getlogger().exception('Exception while running task.')
+    task.failed = '{0}: {1}'.format(e.__class__.__name__, e)
+    return task
 
 class Task(object):
   def __init__(self):
@@ -28,6 +55,44 @@ class Task(object):
       self.__maxphase += 1
     self.__phase = 0
     self.__waiting = False
+    self.elapsed = 0.0
+    self.peakmemory = 0
+    self.skipped = None
+    self.failed = None
+    # If set, TaskPool.run yields this task as soon as it has finished, also
+    # if it is a subtask, with the time it took recorded in its result.
+    self.report = False
+  
+  def family(self):
+    '''The family this task belongs to. Scheduling policies use this to
+       balance work, and observed timings are grouped by it.'''
+    return self.__class__.__name__
+  
+  def cost(self):
+    '''Expected cost of running this task, derived from its parameters. The
+       unit is arbitrary, but costs must be comparable within a family.'''
+    return 1.0
+  
+  def key(self):
+    '''A key that identifies this task across runs, or None if the result of
+       this task should not be stored.'''
+    return None
+  
+  def memory(self):
+    '''Expected peak memory use of this task in kbytes, or None if there is
+       no reasonable estimate.'''
+    return None
+  
+  def censored(self):
+    '''Whether this task was cut short, e.g. by a timeout, so that the time
+       it took is only a lower bound of the time it needs.'''
+    return False
+  
+  def flightkey(self):
+    '''A key that identifies the work done by this task, or None. Of the
+       tasks in a run that have the same flight key, only one is run; the
+       others get a copy of its result.'''
+    return None
   
   @property
   def waiting(self):
@@ -45,68 +110,397 @@ class Task(object):
   def _collect(self, result):
     if self.__waiting:
       self.results.append(result)
+      self.elapsed += result.elapsed
       self.__waiting -= 1
   
+  def restore(self, result):
+    '''Marks this task as done with the given result, e.g. one that was stored
+       by an earlier run.'''
+    self.result = result
+    self.__phase = self.__maxphase + 1
+  
+  def skip(self, reason):
+    '''Marks this task as done without running it, with its initial result,
+       e.g. because the work it depends on failed. A TaskPool finishes
+       skipped tasks as soon as they are added, without running them or
+       storing their results.'''
+    self.skipped = reason
+    self.restore(getattr(self, 'result', None))
+  
+  def _subtaskFailed(self, task):
+    '''Called by the pool when the subtask task failed, i.e. raised an
+       exception or depended on a task that did. By default this task fails
+       as well once all its subtasks are finished, so that the failure
+       reaches the top-level task.'''
+    if self.failed is None:
+      self.failed = 'subtask {0} failed ({1})'.format(task, task.failed)
+  
+  def share(self, result, source):
+    '''Marks this task as done with a copy of the result of the task source
+       (a string), which had the same flight key. Dictionaries record source
+       under 'shared'.'''
+    if isinstance(result, dict):
+      result['shared'] = source
+    self.restore(result)
+  
   def run(self, log):
     if self.__phase <= self.__maxphase:
       getattr(self, 'phase{0}'.format(self.__phase))(log)
       self.__phase += 1
 
+class CostModel(object):
+  '''Estimates the cost of tasks. If a task was timed in an earlier run, the
+     observed time (in seconds) is used. Otherwise the parameter-based cost of
+     the task is scaled by the average time per unit of cost observed for its
+     family, or used as is if nothing is known about the family. In the last
+     case the estimate is not in seconds, and only comparable to those of
+     the same family (see timed).'''
+  def __init__(self, filename=None):
+    self.__filename = filename
+    self.__timings = {}
+    if filename is not None and os.path.exists(filename):
+      self.__timings = yaml.load(open(filename).read()) or {}
+  
+  def estimate(self, task):
+    timings = self.__timings.get(task.family(), {})
+    if str(task) in timings:
+      return timings[str(task)]['time']
+    units = sum(t['cost'] for t in timings.values())
+    if units > 0:
+      return task.cost() * sum(t['time'] for t in timings.values()) / units
+    return task.cost()
+  
+  def timed(self, task):
+    '''Whether the estimate for task is in seconds, i.e. its family was timed
+       in an earlier run.'''
+    return sum(t['cost'] for t in self.__timings.get(task.family(), {}).values()) > 0
+  
+  def record(self, task):
+    timing = {'cost': task.cost(), 'time': task.elapsed}
+    if task.censored():
+      timing['censored'] = True
+    self.__timings.setdefault(task.family(), {})[str(task)] = timing
+  
+  def save(self):
+    if self.__filename is not None:
+      timingsfile = open(self.__filename, 'w')
+      timingsfile.write(yaml.dump(self.__timings, default_flow_style = False))
+      timingsfile.close()
+
+class MemoryModel(object):
+  '''Estimates the peak memory use of tasks in kbytes. The estimate for a task
+     is the largest of the last PEAK_HISTORY peaks observed for tasks of the
+     same kind, family and order of magnitude of cost, so that it can go
+     down again. If none has been observed, Task.memory() is used, and if
+     that is unknown the default.'''
+  def __init__(self, default):
+    self.__default = default
+    self.__peaks = {}
+  
+  def __key(self, task):
+    return (task.__class__.__name__, task.family(), int(math.log(max(task.cost(), 1.0), 2)))
+  
+  def estimate(self, task):
+    if self.__key(task) in self.__peaks:
+      return max(self.__peaks[self.__key(task)])
+    if task.memory() is not None:
+      return task.memory()
+    return self.__default
+  
+  def record(self, task):
+    if task.peakmemory > 0:
+      self.__peaks.setdefault(self.__key(task), collections.deque(maxlen=PEAK_HISTORY)).append(task.peakmemory)
+
+class FIFOPolicy(object):
+  '''Hands out tasks in the order in which they were submitted. Subtasks and
+     tasks that are in between two phases go before tasks that have not been
+     started yet.'''
+  def __init__(self, costs=None):
+    self.costs = costs if costs is not None else CostModel()
+    self.__families = {}
+  
+  def key(self, task, seq, prepend):
+    if prepend:
+      return (0, -seq)
+    return (1, seq)
+  
+  def _costKey(self, task, sign):
+    '''Orders tasks by sign times their expected cost. Estimates in seconds
+       are comparable across families; the parameter-based costs of families
+       that were never timed are not, so those tasks come after the timed
+       ones, with their families in the order in which they were submitted
+       and each family ordered by cost.'''
+    if self.costs.timed(task):
+      return (0, sign * self.costs.estimate(task))
+    family = self.__families.setdefault(task.family(), len(self.__families))
+    return (1, family, sign * self.costs.estimate(task))
+
+class LargestFirstPolicy(FIFOPolicy):
+  '''Hands out the task with the largest expected cost first, so that the
+     long running tasks do not end up in the tail of a run.'''
+  def key(self, task, seq, prepend):
+    return (0 if prepend else 1, self._costKey(task, -1), seq)
+
+class SmallestFirstPolicy(FIFOPolicy):
+  '''Hands out the task with the smallest expected cost first, for quick
+     feedback.'''
+  def key(self, task, seq, prepend):
+    return (0 if prepend else 1, self._costKey(task, 1), seq)
+
+class RoundRobinPolicy(FIFOPolicy):
+  '''Alternates between the task families in submission order.'''
+  def __init__(self, costs=None):
+    super(RoundRobinPolicy, self).__init__(costs)
+    self.__rounds = {}
+  
+  def key(self, task, seq, prepend):
+    rnd = self.__rounds.get(task.family(), 0)
+    self.__rounds[task.family()] = rnd + 1
+    return (0 if prepend else 1, rnd, seq)
+
+POLICIES = {
+    'fifo': FIFOPolicy,
+    'largest': LargestFirstPolicy,
+    'smallest': SmallestFirstPolicy,
+    'roundrobin': RoundRobinPolicy
+  }
+
 class TaskPool(multiprocessing.pool.Pool): # pylint: disable-msg=W0223
+  '''Runs tasks and their subtasks in a pool of workers. The order in which
+     tasks are started is determined by the scheduling policy. If a memory
+     budget (in kbytes) is given, a task is only started if its estimated peak
+     memory use fits in what is left of the budget, unless no other task is
+     running. If a store is given, the results of finished tasks that have a
+     key are put in it, and tasks whose result is in the store are not run
+     again. Of the tasks with the same flight key, only the first is run; the
+     tasks that are added while it runs wait for it, and the ones that are
+     added later get its result immediately.'''
   def __init__(self, *args, **kwargs):
+    self.__policy = kwargs.pop('policy', None)
+    if self.__policy is None:
+      self.__policy = FIFOPolicy()
+    self.__budget = kwargs.pop('memory', None)
+    self.__store = kwargs.pop('store', None)
     super(TaskPool, self).__init__(*args, **kwargs)
+    if self.__budget is not None:
+      self.__memory = MemoryModel(self.__budget // len(self._pool))
+    self.__reserved = 0
     self.__queue = []
+    self.__seq = 0
+    self.__bypassed = {}
     self.__waiting = {}
     self.__results = []
     self.__busy = 0
     self.__event = threading.Event()
+    self.__lock = threading.RLock()
+    self.__flights = {}
+    self.__flown = {}
     
   def __finished(self, result):
     if result is None:
       return
+    if result.failed is not None:
+      self.__failed(result)
+      return
+    if result.report and result.done and isinstance(result.result, dict):
+      # Also in the store, so that it is not lost when the task is restored.
+      result.result.setdefault('elapsed', result.elapsed)
     if result.subtasks:
       index = 0
       while index in self.__waiting:
         index += 1
       self.__waiting[index] = result
-      for sub in result.subtasks:
+      subtasks = result.subtasks
+      for sub in subtasks:
         sub.parent = index 
-      self.__addTasks(result.subtasks, prepend=True)
       result._wait()
+      self.__addTasks(subtasks, prepend=True)
     elif not result.done:
-      self.__addTasks((result,), prepend=True)
+      self.__addTasks((result,), prepend=True, started=True)
+    elif result.skipped is None and result.flightkey() in self.__flights:
+      # Tasks that were waiting for this one can finish now as well.
+      waiting = self.__flights.pop(result.flightkey())
+      self.__flown[result.flightkey()] = (str(result), result.result)
+      self.__finished(result)
+      for task in waiting:
+        task.share(copy.deepcopy(result.result), str(result))
+        self.__finished(task)
+    elif self.__store is not None and result.skipped is None and result.key() is not None and result.key() not in self.__store:
+      self.__store.put(result.key(), result.result)
+      self.__finished(result)
     elif result.parent is not None:
+      if result.key() is not None and result.elapsed > 0:
+        # Subtasks that were run are timed as well, e.g. for planning which
+        # information about games to collect (see planner.py).
+        self.__policy.costs.record(result)
       parent = self.__waiting[result.parent]
       parent._collect(result)
+      if result.report:
+        self.__results.append(result)
+        self.__event.set()
       if not parent.waiting: 
         self.__finished(parent)
     else:
+      self.__policy.costs.record(result)
       self.__results.append(result)
       self.__event.set()
   
-  def __callback(self, result):
-    self.__finished(result)
-    if self.__queue:
-      self.apply_async(process_task, (self.__queue.pop(0),), callback=self.__callback)
+  def __failed(self, task):
+    '''Finishes task, which failed, without storing its result. The flight
+       key of task is released, and the tasks that waited for it are added
+       again: the first of them does the work itself and the others wait for
+       that one. Waiting tasks may belong to other cases, and their input
+       need not be the same file (see pghash.py), so they are not failed
+       along with task.'''
+    logging.getLogger('taskpool').error('{0} failed: {1}'.format(task, task.failed))
+    key = task.flightkey()
+    if key is not None and key in self.__flights:
+      waiting = self.__flights.pop(key)
+      if waiting:
+        logging.getLogger('taskpool').info('Retrying {0} for {1}'.format(key, waiting[0]))
+        self.__addTasks(waiting, prepend=True)
+    if task.parent is not None:
+      parent = self.__waiting[task.parent]
+      parent._collect(task)
+      parent._subtaskFailed(task)
+      if task.report:
+        self.__results.append(task)
+        self.__event.set()
+      if not parent.waiting:
+        self.__finished(parent)
     else:
+      self.__results.append(task)
+      self.__event.set()
+  
+  def __callback(self, result, reservation):
+    with self.__lock:
       self.__busy -= 1
+      self.__reserved -= reservation
+      if result is not None and self.__budget is not None:
+        self.__memory.record(result)
+      self.__finished(result)
+      self.__dispatch()
+      if not self.__busy and not self.__queue:
+        self.__event.set()
   
-  def __addTasks(self, tasks, prepend=False):
-    if prepend:
-      self.__queue = list(tasks) + self.__queue
-    else:
-      self.__queue += list(tasks)
+  def __reservation(self, task):
+    if self.__budget is None:
+      return 0
+    return min(self.__memory.estimate(task), self.__budget)
+  
+  def __next(self):
+    '''Removes the first task from the queue whose memory reservation fits in
+       the budget. Returns the task and its reservation, or None if no such
+       task exists. Tasks that do not fit age every time a task after them is
+       started instead; a task that was passed over MAX_BYPASS times keeps
+       the tasks after it from starting, so that it starts as soon as enough
+       memory is free, instead of starving behind a stream of small tasks.'''
+    skipped = []
+    found = None
+    while self.__queue and found is None:
+      entry = heapq.heappop(self.__queue)
+      reservation = self.__reservation(entry[2])
+      if self.__reserved + reservation <= self.__budget or not self.__busy:
+        found = (entry[2], reservation)
+        self.__bypassed.pop(entry[1], None)
+      else:
+        skipped.append(entry)
+        if self.__bypassed.get(entry[1], 0) >= MAX_BYPASS:
+          break
+    for entry in skipped:
+      if found is not None:
+        self.__bypassed[entry[1]] = self.__bypassed.get(entry[1], 0) + 1
+      heapq.heappush(self.__queue, entry)
+    return found
+  
+  def __dispatch(self):
     while self.__queue and self.__busy < len(self._pool):
+      if self.__budget is None:
+        task, reservation = heapq.heappop(self.__queue)[2], 0
+      else:
+        found = self.__next()
+        if found is None:
+          break
+        task, reservation = found
       self.__busy += 1
-      self.apply_async(process_task, (self.__queue.pop(0),), callback=self.__callback)
+      self.__reserved += reservation
+      self.apply_async(process_task, (task,), 
+                       callback=lambda result, r=reservation: self.__callback(result, r))
+  
+  def __addTasks(self, tasks, prepend=False, started=False):
+    if self.__store is not None:
+      restored = [t for t in tasks if t.key() is not None and t.key() in self.__store]
+      tasks = [t for t in tasks if t not in restored]
+      for task in restored:
+        task.restore(self.__store.get(task.key()))
+        self.__finished(task)
+    # Skipped tasks are done already.
+    skipped = [t for t in tasks if t.skipped is not None]
+    tasks = [t for t in tasks if t.skipped is None]
+    for task in skipped:
+      logging.getLogger('taskpool').debug('Skipping {0}: {1}'.format(task, task.skipped))
+      self.__finished(task)
+    if not started:
+      tasks = [t for t in tasks if not self.__join(t)]
+    # Prepended tasks are pushed in reverse, so that the FIFO policy keeps
+    # them in the order in which they were given.
+    for task in (reversed(list(tasks)) if prepend else tasks):
+      self.__seq += 1
+      heapq.heappush(self.__queue, (self.__policy.key(task, self.__seq, prepend), self.__seq, task))
+    self.__dispatch()
+  
+  def __join(self, task):
+    '''If the work of task is already done or being done by another task,
+       makes task wait for that and returns True.'''
+    key = task.flightkey()
+    if key is None:
+      return False
+    if key in self.__flown:
+      logging.getLogger('taskpool').debug('Reusing the result of {0} for {1}'.format(key, task))
+      (source, result) = self.__flown[key]
+      task.share(copy.deepcopy(result), source)
+      self.__finished(task)
+      return True
+    if key in self.__flights:
+      logging.getLogger('taskpool').debug('Waiting for {0} to finish for {1}'.format(key, task))
+      self.__flights[key].append(task)
+      return True
+    self.__flights[key] = []
+    return False
   
   def add(self, *tasks):
-    self.__addTasks(tasks)
+    with self.__lock:
+      self.__addTasks(tasks)
+  
+  def __pending(self):
+    '''Whether tasks are queued or running. Otherwise, the event is cleared
+       so that the next callback wakes us up.'''
+    with self.__lock:
+      if self.__busy or self.__queue:
+        self.__event.clear()
+        return True
+      return False
+  
+  def __popResults(self):
+    with self.__lock:
+      (results, self.__results) = (self.__results, [])
+    return results
   
   def run(self, *tasks):
-    self.__addTasks(tasks)
-    while self.__busy or self.__queue:
-      self.__event.clear()
+    # Callbacks come in on another thread; the queue and the number of busy
+    # workers are only consistent while holding the lock, e.g. a task that
+    # is being dispatched is in neither.
+    self.add(*tasks)
+    while self.__pending():
+      for result in self.__popResults():
+        yield result
       self.__event.wait()
-      while self.__results:
-        yield self.__results.pop(0)
\ No newline at end of file
+    # Tasks that were restored from the store do not wake us up.
+    for result in self.__popResults():
+      yield result
+
+class ThreadTaskPool(TaskPool, multiprocessing.pool.ThreadPool): # pylint: disable-msg=W0223
+  '''A TaskPool that runs the phases of tasks in threads of the current
+     process. Since all real work is done by external tools, the threads
+     mostly wait for subprocesses, and tasks do not have to be pickled in
+     between phases.'''
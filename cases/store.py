@@ -0,0 +1,155 @@
+import cPickle as pickle
+import threading
+import sqlite3
+import os
+import yaml
+
+class YAMLResults(object):
+  '''The results of cases, appended to a YAML file as a list of documents.
+     Results are looked up by the key of their case (see Task.key), which is
+     recorded in every result under 'key'; several cases, e.g. replicas of a
+     random game, can have the same name. Results written without a key are
+     found by name.'''
+  def __init__(self, filename):
+    self.__done = {}
+    if os.path.exists(filename):
+      try:
+        results = yaml.load(open(filename).read())
+        for case in results or []:
+          self.__done[case.get('key', case['case'])] = case
+      except (AttributeError, TypeError):
+        pass
+    self.__file = open(filename, 'a+')
+  
+  def __contains__(self, name):
+    return name in self.__done
+  
+  def get(self, name):
+    return self.__done[name]
+  
+  def add(self, name, result):
+    result = dict(result, key=name)
+    self.__done[name] = result
+    self.__file.write(yaml.dump([result], default_flow_style = False))
+    self.__file.flush()
+  
+  def close(self):
+    self.__file.close()
+
+class JournalStore(object):
+  '''Stores the results of finished tasks by their key in an append-only YAML
+     file, so that they can be restored when an interrupted run is resumed.
+     If a key occurs more than once, the last result wins. Unless restore is
+     set, an existing file is overwritten.'''
+  def __init__(self, filename, restore=True):
+    self.__results = {}
+    if restore and os.path.exists(filename):
+      for entry in yaml.load(open(filename).read()) or []:
+        self.__results[entry['key']] = entry['result']
+    self.__file = open(filename, 'a+' if restore else 'w')
+  
+  def __contains__(self, key):
+    return key in self.__results
+  
+  def get(self, key):
+    return self.__results.get(key)
+  
+  def put(self, key, result):
+    self.__results[key] = result
+    self.__file.write(yaml.dump([{'key': key, 'result': result}], default_flow_style = False))
+    self.__file.flush()
+  
+  def close(self):
+    self.__file.close()
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS "results" (
+    "id" INTEGER PRIMARY KEY,
+    "name" TEXT NOT NULL UNIQUE,
+    "result" BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "journal" (
+    "key" TEXT PRIMARY KEY,
+    "result" BLOB NOT NULL
+);
+'''
+
+class Database(object):
+  '''SQLite database holding the results of cases, keyed by case (see
+     Task.key), and
+     the journal of finished subtasks, keyed by task. Results are pickled, so
+     looking up whether a case or task is done does not require parsing any
+     results. Every result is committed separately.'''
+  def __init__(self, filename):
+    # Callbacks of the task pool run in a different thread than the one that
+    # opened the database.
+    self.__conn = sqlite3.connect(filename, check_same_thread=False)
+    self.__conn.execute('PRAGMA journal_mode=WAL')
+    self.__conn.executescript(_SCHEMA)
+    self.__conn.commit()
+    self.__lock = threading.Lock()
+  
+  def _execute(self, query, *args):
+    with self.__lock:
+      return self.__conn.execute(query, args).fetchall()
+  
+  def _commit(self, query, *args):
+    with self.__lock:
+      self.__conn.execute(query, args)
+      self.__conn.commit()
+  
+  def results(self):
+    return DatabaseResults(self)
+  
+  def journal(self, restore=True):
+    return DatabaseJournal(self, restore)
+  
+  def export(self, yamlfile):
+    '''Writes the results of all cases to yamlfile, in the same layout as
+       YAMLResults.'''
+    for (name, result) in self._execute('SELECT name, result FROM results ORDER BY id'):
+      yamlfile.write(yaml.dump([dict(pickle.loads(str(result)), key=name)], default_flow_style = False))
+  
+  def close(self):
+    with self.__lock:
+      self.__conn.close()
+
+class DatabaseResults(object):
+  '''The results of cases, stored in a Database.'''
+  def __init__(self, db):
+    self.__db = db
+  
+  def __contains__(self, name):
+    return bool(self.__db._execute('SELECT 1 FROM results WHERE name=?', name))
+  
+  def get(self, name):
+    return pickle.loads(str(self.__db._execute('SELECT result FROM results WHERE name=?', name)[0][0]))
+  
+  def add(self, name, result):
+    self.__db._commit('INSERT OR REPLACE INTO results (name, result) VALUES (?, ?)',
+                      name, sqlite3.Binary(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)))
+  
+  def close(self):
+    pass
+
+class DatabaseJournal(object):
+  '''The journal of finished subtasks, stored in a Database. Unless restore is
+     set, the journal of an earlier run is discarded.'''
+  def __init__(self, db, restore=True):
+    self.__db = db
+    if not restore:
+      self.__db._commit('DELETE FROM journal')
+  
+  def __contains__(self, key):
+    return bool(self.__db._execute('SELECT 1 FROM journal WHERE key=?', key))
+  
+  def get(self, key):
+    rows = self.__db._execute('SELECT result FROM journal WHERE key=?', key)
+    return pickle.loads(str(rows[0][0])) if rows else None
+  
+  def put(self, key, result):
+    self.__db._commit('INSERT OR REPLACE INTO journal (key, result) VALUES (?, ?)',
+                      key, sqlite3.Binary(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)))
+  
+  def close(self):
+    pass
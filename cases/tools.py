@@ -1,14 +1,30 @@
 import subprocess
+import threading
+import signal
+import copy
+import os
 import logging
-import tempfile
 import yaml
-import os
 import re
+from artifacts import Artifact
+from limits import LimitedProcess, WALL_FACTOR
+import cache
+import compression
 
 __LOG = logging.getLogger('tools')
 logging.raiseExceptions = False
 
-_TIMEOUTSCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "timeout")
+# The timing measurements that mCRL2 tools write to standard error when they
+# are passed --timings without a filename.
+_TIMINGS_RE = re.compile(r'^- tool: .*\Z', re.MULTILINE | re.DOTALL)
+
+def _remove(path):
+  '''Removes the partial output of a tool that failed, if there is any, without
+     hiding the reason why it failed.'''
+  try:
+    os.unlink(path)
+  except OSError:
+    pass
 
 class ToolException(Exception):
   def __init__(self, tool, exitcode, result):
@@ -39,15 +55,172 @@ class OutOfMemory(Exception):
   def __str__(self):
     return 'The commandline "{0}" exceeded the memory limit'.format(self.__cmdline)
 
+class Field(object):
+  '''A field in the output of a tool: the named groups of pattern in the first
+     line that matches it, or in the last one if last is true. Groups that
+     were not matched, or that are in a field that was not seen, are None.
+     Unless the field is optional, parsing the output only finishes when it
+     has been seen.'''
+  def __init__(self, pattern, last=False, optional=False):
+    self.pattern = re.compile(pattern)
+    self.last = last
+    self.optional = optional
+
+  def matcher(self):
+    '''The state of parsing one output for this field.'''
+    return _Matcher(self)
+
+class _Matcher(object):
+  def __init__(self, field):
+    self.field = field
+    self.values = dict.fromkeys(field.pattern.groupindex)
+    self.seen = False
+
+  @property
+  def complete(self):
+    '''Whether later lines cannot change the values. The last match of a
+       field is only known at the end of the output.'''
+    return self.seen and not self.field.last
+
+  def feed(self, line):
+    if not self.complete:
+      m = self.field.pattern.search(line)
+      if m is not None:
+        self.values = m.groupdict()
+        self.seen = True
+
+class Winner(Field):
+  '''The player that wins from vertex, in the winning sets that pgsolver
+     prints as "Player 0 wins from nodes:" followed by a set of vertices
+     "{0, 1, ...}", which may span several lines. Unlike a regular expression
+     over the whole output, this only looks at one line at a time and stops
+     at the first occurrence of vertex.'''
+  HEADER = re.compile(r'Player (0|1) wins from nodes:')
+
+  def __init__(self, vertex=0, name='winner'):
+    self.pattern = self.HEADER
+    self.vertex = re.compile(r'(?<!\d){0}(?!\d)'.format(int(vertex)))
+    self.name = name
+    self.last = False
+    self.optional = False
+
+  def matcher(self):
+    return _WinnerMatcher(self)
+
+class _WinnerMatcher(object):
+  def __init__(self, field):
+    self.field = field
+    self.values = {field.name: None}
+    self.seen = False
+    self.complete = False
+    # The player whose winning set is being read, and whether its opening
+    # brace has been read.
+    self.__player = None
+    self.__inset = False
+
+  def feed(self, line):
+    if self.complete:
+      return
+    m = Winner.HEADER.search(line)
+    if m is not None:
+      self.__player = m.group(1)
+      self.__inset = False
+      line = line[m.end():]
+    if self.__player is None:
+      return
+    if not self.__inset:
+      start = line.find('{')
+      if start == -1:
+        return
+      self.__inset = True
+      line = line[start + 1:]
+    # Parser does not split lines within a number.
+    end = line.find('}')
+    if self.field.vertex.search(line if end == -1 else line[:end]):
+      self.values[self.field.name] = self.__player
+      self.seen = self.complete = True
+    elif end != -1:
+      self.__player = None
+
+class Parser(object):
+  '''Parses the output of a tool for fields while the tool runs, one line at
+     a time, so that the output never has to be kept in memory as a whole.
+     Only the last TAIL bytes of the output are kept, for error messages and
+     the timings of mCRL2 tools; once all fields have been seen, lines are no
+     longer parsed. Lines longer than MAXLINE bytes are parsed in pieces that
+     are split between digits and other characters. A Parser can be passed as
+     a sink to LimitedProcess.communicate.'''
+  TAIL = 1 << 16
+  MAXLINE = 1 << 20
+
+  def __init__(self, fields):
+    self.__matchers = [field.matcher() for field in fields]
+    self.__pending = ''
+    self.__tail = ''
+    self.done = False
+    self.__update()
+
+  def __update(self):
+    self.done = all(m.complete for m in self.__matchers if not m.field.optional)
+
+  def __feed(self, line):
+    for m in self.__matchers:
+      m.feed(line)
+    self.__update()
+
+  def write(self, data):
+    self.__tail = (self.__tail + data)[-self.TAIL:]
+    if self.done:
+      return
+    lines = (self.__pending + data).split('\n')
+    self.__pending = lines.pop()
+    if len(self.__pending) > self.MAXLINE:
+      cut = len(self.__pending.rstrip('0123456789')) or len(self.__pending)
+      lines.append(self.__pending[:cut])
+      self.__pending = self.__pending[cut:]
+    for line in lines:
+      self.__feed(line)
+      if self.done:
+        break
+
+  def getvalue(self):
+    '''Finishes parsing, and returns the tail of the output.'''
+    if self.__pending and not self.done:
+      self.__feed(self.__pending)
+    self.__pending = ''
+    return self.__tail
+
+  def values(self):
+    '''The values of all fields, in a single dictionary.'''
+    values = {}
+    for m in self.__matchers:
+      values.update(m.values)
+    return values
+
+  def missing(self):
+    '''The fields that were not seen.'''
+    return [m.field for m in self.__matchers if not m.seen and not m.field.optional]
+
+
 class Tool(object):
-  def __init__(self, name, log, hastimings = True, filter_=None, timed=False, timeout=None, memlimit=None):
+  '''An external tool. filter_ and outfilter are lists of Fields that the
+     tool reports on standard error and standard output; their values end up
+     in result['filter']. A stream that is filtered is parsed while the tool
+     runs, and only its tail is kept in the result (see Parser). For
+     compatibility, filter_ may also be a regular expression that is searched
+     in the whole of standard error after the tool has finished.'''
+  def __init__(self, name, log, hastimings = True, filter_=None, timed=False, timeout=None, memlimit=None, outfilter=None):
     self.__name = name
     self.__log = log
     self.__hastimings = hastimings
     self.__timeout = timeout
     self.__memlimit = memlimit 
     self.__filter = filter_
+    self.__outfilter = outfilter
     self.__timed = timed
+    self.__reset()
+  
+  def __reset(self):
     self.result = {}
     self.result['cmdline'] = None
     self.result['out'] = None
@@ -55,9 +228,12 @@ class Tool(object):
     self.result['filter'] = None
     self.result['times'] = None    
     self.result['memory'] = 'unknown'
+    self.result['usage'] = None
+    self.result['cached'] = False
     
   def __run(self, stdin, stdout, stderr, timeout, memlimit, *args, **kwargs):
     cmdline = kwargs.pop('prependcmdline', [])
+    sinks = kwargs.pop('sinks', None)
     if kwargs:
       raise TypeError('Unknown parameter(s) for run instance: ' + 
                       ', '.join(['{0}={1}'.format(k, v) 
@@ -65,58 +241,48 @@ class Tool(object):
     cmdline += [self.__name] + [str(x) for x in args]
     self.__log.info('Running {0}'.format(' '.join(cmdline)))
     self.result['cmdline'] = ' '.join(cmdline)
-    timeoutcmd = []
-
-    if timeout is not None or memlimit is not None:
-      if not os.path.exists(_TIMEOUTSCRIPT):
-        self.__log.error('The script {0} does not exists, cannot run without it'.format(_TIMEOUTSCRIPT))
-        raise Exception('File {0} not found'.format(_TIMEOUTSCRIPT))
-      
-      timeoutcmd += [_TIMEOUTSCRIPT, '--confess', '--no-info-on-success']
-      if timeout is not None:
-        timeoutcmd += ['-t', str(timeout)]
-      if memlimit is not None:
-        timeoutcmd += ['-m', str(memlimit)]
-        
-      cmdline = timeoutcmd + cmdline
     
-    p = subprocess.Popen(cmdline, stdin=subprocess.PIPE, stdout=stdout, stderr=stderr)
-    out, err = p.communicate(stdin)
+    if isinstance(stdin, Artifact):
+      # Let the tool read the artifact directly from disk.
+      stdinfile = stdin.open()
+      try:
+        p = LimitedProcess(cmdline, stdin=stdinfile, stdout=stdout, stderr=stderr, timeout=timeout, memlimit=memlimit)
+        out, err = p.communicate(sinks=sinks)
+      finally:
+        stdinfile.close()
+    else:
+      p = LimitedProcess(cmdline, stdin=subprocess.PIPE, stdout=stdout, stderr=stderr, timeout=timeout, memlimit=memlimit)
+      out, err = p.communicate(stdin, sinks=sinks)
     self.result['out'], self.result['err'] = out, err 
+    if sinks:
+      self.result['filter'] = {}
+      for parser in sinks.values():
+        self.result['filter'].update(parser.values())
+    self.result['usage'] = p.usage
     
+    if p.timedout:
+      self.result['times'] = 'timeout'
+      raise Timeout(cmdline, self.result)
+    if p.outofmemory:
+      self.result['memory'] = 'outofmemory'
+      raise OutOfMemory(cmdline, self.result)
     if p.returncode != 0:
-      # Filter the output to see whether we exceeded time or memory:
-      TIMEOUT_RE = 'TIMEOUT CPU (?P<cpu>\d+[.]\d*) MEM (?P<mem>\d+) MAXMEM (?P<maxmem>\d+) STALE (?P<stale>\d+)'
-      m = re.search(TIMEOUT_RE, self.result['err'], re.DOTALL)
-      if m is not None:
-        self.result['times'] = 'timeout'
-        raise Timeout(cmdline, self.result)
-      
-      MEMLIMIT_RE = 'MEM CPU (?P<cpu>\d+[.]\d*) MEM (?P<mem>\d+) MAXMEM (?P<maxmem>\d+) STALE (?P<stale>\d+)'
-      m = re.search(MEMLIMIT_RE, self.result['err'], re.DOTALL)
-      if m is not None:
-        self.result['memory'] = 'outofmemory'
-        raise OutOfMemory(cmdline, self.result)
-      
       raise ToolException(cmdline, p.returncode, self.result)
             
-  def __run_timed(self, stdin, stdout, stderr, timeout, memlimit, *args):
+  def __run_timed(self, stdin, stdout, stderr, timeout, memlimit, *args, **kwargs):
     if self.__hastimings:
-      timings = tempfile.NamedTemporaryFile(suffix='.yaml', delete=False)
-      timings.close()
-      self.__run(stdin, stdout, stderr, timeout, memlimit, '--timings='+timings.name, *args)
-      t = yaml.load(open(timings.name).read())
-      os.unlink(timings.name)
-      self.result['times'] = t[0]['timing']
+      self.__run(stdin, stdout, stderr, timeout, memlimit, '--timings', *args, **kwargs)
+      m = _TIMINGS_RE.search(self.result['err'] or '')
+      if m is not None:
+        self.result['err'] = self.result['err'][:m.start()]
+        self.result['times'] = yaml.safe_load(m.group(0))[0]['timing']
+        return
     else:
-      timings = tempfile.NamedTemporaryFile(suffix='.yaml', delete=False)
-      timings.close()
-      cmdline=['/usr/bin/time', '--format', '{user: %U, sys: %S}', '-o', timings.name]
-      self.__run(stdin, stdout, stderr, timeout, memlimit, *args, prependcmdline=cmdline)
-      t = yaml.load(open(timings.name).read())
-      os.unlink(timings.name)
-      self.result['times'] = {}
-      self.result['times']['total'] = t['sys'] + t['user']
+      self.__run(stdin, stdout, stderr, timeout, memlimit, *args, **kwargs)
+    # No timings reported by the tool itself, use the CPU time of its process.
+    usage = self.result['usage']
+    self.result['times'] = {}
+    self.result['times']['total'] = usage['user'] + usage['sys']
   
   def __apply_filter(self, filter_):
     m = re.search(filter_, self.result['err'], re.DOTALL)
@@ -127,15 +293,65 @@ class Tool(object):
       self.__log.error(filter_)
       self.__log.error(self.result['err'])
       self.result['filter'] = {}
+
+  def __parsers(self, filter_, outfilter):
+    '''The Parsers for the filtered streams that are captured.'''
+    parsers = {}
+    if filter_ and not isinstance(filter_, basestring):
+      parsers['err'] = Parser(filter_)
+    if outfilter:
+      parsers['out'] = Parser(outfilter)
+    return parsers
+
+  def __check_filter(self, parsers):
+    for (name, parser) in sorted(parsers.items()):
+      missing = parser.missing()
+      if missing:
+        self.__log.error('No match!')
+        self.__log.error(', '.join(field.pattern.pattern for field in missing))
+        self.__log.error(self.result[name])
   
   def __str__(self):
     return self.__name
   
+  def stage(self, *args, **kwargs):
+    '''Returns a stage for pipeline() that runs the tool with arguments args.
+       The timeout and memlimit keyword arguments are supported.'''
+    timeout = kwargs.pop('timeout', self.__timeout)
+    memlimit = kwargs.pop('memlimit', self.__memlimit)
+    if kwargs:
+      raise TypeError('Unknown parameter(s) for pipeline stage: ' + 
+                      ', '.join(['{0}={1}'.format(k, v) 
+                                 for k, v in kwargs.items()]))
+    return Stage([self.__name] + [str(x) for x in args], self.__log, timeout, memlimit)
+  
   def __call__(self, *args, **kwargs):
+    '''Runs the tool with arguments args. Standard input is taken from the
+       stdin keyword argument (a string or an Artifact), and standard output
+       and standard error are captured in result['out'] and result['err'],
+       unless stdout or stderr is given. If output is the name of a file,
+       standard output is written to that file directly, without passing
+       through the driver; the file is removed if the tool fails. Arguments
+       that name files to which the tool writes must be listed in outputs.
+       Invocations that write to files are cached if a cache is configured
+       (see cache.configure); invocations that should not share an entry
+       although their input is the same, e.g. replicas of a random game, must
+       pass different values for cachekey.'''
+    # Every invocation works on a copy of the tool, so that concurrent
+    # invocations (e.g. from a ThreadTaskPool) do not share their results.
+    tool = copy.copy(self)
+    tool.__reset()
+    return tool.__invoke(*args, **kwargs)
+  
+  def __invoke(self, *args, **kwargs):
     stdin = kwargs.pop('stdin', None)
     stdout = kwargs.pop('stdout', subprocess.PIPE)
     stderr = kwargs.pop('stderr', subprocess.PIPE)
+    output = kwargs.pop('output', None)
+    outputs = [str(x) for x in kwargs.pop('outputs', [])]
+    cachekey = kwargs.pop('cachekey', None)
     filter_ = kwargs.pop('filter', self.__filter)
+    outfilter = kwargs.pop('outfilter', self.__outfilter)
     timeout = kwargs.pop('timeout', self.__timeout)
     memlimit = kwargs.pop('memlimit', self.__memlimit)
     timed = kwargs.pop('timed', self.__timed)
@@ -143,15 +359,201 @@ class Tool(object):
       raise TypeError('Unknown parameter(s) for Tool instance: ' + 
                       ', '.join(['{0}={1}'.format(k, v) 
                                  for k, v in kwargs.items()]))
-    if timed:
-      self.__run_timed(stdin, stdout, stderr, timeout, memlimit, *args)
+    if output is not None:
+      outputs.append(output)
+    key = None
+    if outputs and cache.active() is not None:
+      key = cache.active().key([[self.__name] + list(args)], stdin, outputs, timed, self.__hastimings, cachekey)
+    cached = cache.active().lookup(key, outputs) if key is not None else None
+    if cached is not None:
+      self.__log.info('Reusing cached result of {0}'.format(cached['cmdline']))
+      self.result = cached
+      self.result['cached'] = True
+      parsers = {}
+      if self.result.get('filter') is None:
+        # Entries stored before the tool was filtered while it ran.
+        parsers = self.__parsers(filter_, outfilter)
+        for (name, parser) in parsers.items():
+          parser.write(self.result[name] or '')
+          parser.getvalue()
+          self.result['filter'] = dict(self.result['filter'] or {}, **parser.values())
     else:
-      self.__run(stdin, stdout, stderr, timeout, memlimit, *args)
+      parsers = self.__parsers(filter_, outfilter)
+      # Streams that are not captured cannot be parsed.
+      if stdout is not subprocess.PIPE or output is not None:
+        parsers.pop('out', None)
+      if stderr is not subprocess.PIPE:
+        parsers.pop('err', None)
+      # The tool reads and writes compressed files through FIFOs.
+      streams = compression.Streams()
+      try:
+        args = [streams.writer(str(x)) if str(x) in outputs else streams.reader(str(x)) for x in args]
+        if output is not None:
+          stdout = open(streams.writer(output), 'wb')
+        try:
+          if timed:
+            self.__run_timed(stdin, stdout, stderr, timeout, memlimit, *args, sinks=parsers)
+          else:
+            self.__run(stdin, stdout, stderr, timeout, memlimit, *args, sinks=parsers)
+        finally:
+          if output is not None:
+            stdout.close()
+          streams.close()
+      except:
+        if output is not None:
+          _remove(output)
+        raise
+      if key is not None:
+        cache.active().store(key, self.result, outputs)
     self.__log.debug(self.result['err'])
-    if filter_:
+    if isinstance(filter_, basestring):
       self.__apply_filter(filter_)
+    self.__check_filter(parsers)
     return self.result
 
+class Stage(object):
+  '''A tool invocation in a pipeline, see Tool.stage. After the pipeline has
+     run, result has the same layout as the result of a Tool, with the CPU
+     time of the stage in times.'''
+  def __init__(self, cmdline, log, timeout, memlimit):
+    self.cmdline = cmdline
+    self.log = log
+    self.timeout = timeout
+    self.memlimit = memlimit
+    self.process = None
+    self.result = {'cmdline': ' '.join(cmdline), 'out': None, 'err': None, 'filter': None,
+                   'times': None, 'memory': 'unknown', 'usage': None}
+  
+  def summary(self):
+    '''The result of the stage without its output, to be recorded in the
+       results of the case that ran the pipeline.'''
+    return dict((k, v) for (k, v) in self.result.items() if k not in ['out', 'err', 'filter'])
+  
+  def communicate(self, input):
+    p = self.process
+    self.result['out'], self.result['err'] = p.communicate(input)
+    self.result['usage'] = p.usage
+    self.result['times'] = {'total': p.usage['user'] + p.usage['sys']}
+    if p.timedout:
+      self.result['times'] = 'timeout'
+    if p.outofmemory:
+      self.result['memory'] = 'outofmemory'
+
+def pipeline(*stages, **kwargs):
+  '''Runs stages (created using Tool.stage) concurrently, with the standard
+     output of every stage connected to the standard input of the next one by
+     a pipe. The stdin and output keyword arguments are as for a Tool. Every
+     stage is limited separately, but the wall clock time of all stages is
+     limited by the sum of their timeouts, since later stages wait for
+     earlier ones. If a stage exceeds its limits, the corresponding exception
+     is raised with the result of that stage, and otherwise a ToolException
+     is raised for the first stage that failed for a reason other than the
+     failure of the stage after it (i.e. other than SIGPIPE); its result also
+     has the results of all stages under stages. Returns a dictionary with
+     the command line of the pipeline, the standard output of its last stage
+     and the results of all stages, without their output (see
+     Stage.summary). Pipelines that write to output are cached like tools.'''
+  stdin = kwargs.pop('stdin', None)
+  output = kwargs.pop('output', None)
+  if kwargs:
+    raise TypeError('Unknown parameter(s) for pipeline: ' + 
+                    ', '.join(['{0}={1}'.format(k, v) 
+                               for k, v in kwargs.items()]))
+  if output is not None and cache.active() is not None:
+    key = cache.active().key([stage.cmdline for stage in stages], stdin, [output])
+    cached = cache.active().lookup(key, [output]) if key is not None else None
+    if cached is not None:
+      stages[0].log.info('Reusing cached result of {0}'.format(cached['cmdline']))
+      cached['cached'] = True
+      return cached
+  else:
+    key = None
+  walltime = None
+  if all(stage.timeout is not None for stage in stages):
+    walltime = WALL_FACTOR * sum(stage.timeout for stage in stages)
+  stages[0].log.info('Running {0}'.format(' | '.join(stage.result['cmdline'] for stage in stages)))
+  
+  streams = compression.Streams()
+  stdinfile = subprocess.PIPE
+  stdout = subprocess.PIPE
+  threads = []
+  completed = False
+  try:
+    if isinstance(stdin, Artifact):
+      stdinfile = stdin.open()
+    if output is not None:
+      stdout = open(streams.writer(output), 'wb')
+    source = stdinfile
+    for (i, stage) in enumerate(stages):
+      last = i == len(stages) - 1
+      cmdline = stage.cmdline[:1] + [streams.reader(arg) for arg in stage.cmdline[1:]]
+      stage.process = LimitedProcess(cmdline, stdin=source, 
+                                     stdout=stdout if last else subprocess.PIPE,
+                                     stderr=subprocess.PIPE, timeout=stage.timeout,
+                                     memlimit=stage.memlimit, walltime=walltime)
+      if i > 0:
+        # Only the next stage reads from this pipe.
+        source.close()
+        stages[i - 1].process.stdout = None
+      source = stage.process.stdout
+    
+    for (i, stage) in enumerate(stages):
+      input = stdin if i == 0 and not isinstance(stdin, Artifact) else None
+      threads.append(threading.Thread(target=stage.communicate, args=(input,)))
+      threads[-1].daemon = True
+      threads[-1].start()
+    for thread in threads:
+      thread.join()
+    completed = True
+  finally:
+    # If a stage could not be started or waited for, do not leave the others
+    # behind.
+    for stage in stages:
+      if stage.process is not None and stage.process.returncode is None:
+        stage.process.kill()
+    for thread in threads:
+      thread.join()
+    for stage in stages:
+      if stage.process is not None and stage.process.returncode is None:
+        stage.process.wait()
+    if isinstance(stdin, Artifact) and stdinfile is not subprocess.PIPE:
+      stdinfile.close()
+    if stdout is not subprocess.PIPE:
+      stdout.close()
+    try:
+      streams.close()
+    except IOError:
+      if completed:
+        raise
+    if not completed and output is not None:
+      _remove(output)
+  
+  result = {'cmdline': ' | '.join(stage.result['cmdline'] for stage in stages), 'out': stages[-1].result['out'], 
+            'stages': [stage.summary() for stage in stages], 'cached': False}
+  failed = [stage for stage in stages if stage.process.returncode != 0]
+  exception = None
+  for stage in failed:
+    if stage.process.timedout:
+      exception = Timeout(stage.cmdline, dict(stage.result, stages=result['stages']))
+    elif stage.process.outofmemory:
+      exception = OutOfMemory(stage.cmdline, dict(stage.result, stages=result['stages']))
+    else:
+      continue
+    break
+  if exception is None and failed:
+    causes = [stage for stage in failed if stage.process.returncode != -signal.SIGPIPE] or failed
+    exception = ToolException(causes[0].cmdline, causes[0].process.returncode,
+                              dict(causes[0].result, stages=result['stages']))
+  if exception is not None:
+    if output is not None:
+      _remove(output)
+    raise exception
+  for stage in stages:
+    stage.log.debug(stage.result['err'])
+  if key is not None:
+    cache.active().store(key, result, [output])
+  return result
+
 pginfo = Tool('pginfo', __LOG)
 mcrl22lps = Tool('mcrl22lps', __LOG)
 lps2pbes = Tool('lps2pbes', __LOG)
@@ -166,16 +568,23 @@ pbespgsolve = Tool('pbespgsolve', __LOG)
 besconvert = Tool('besconvert', __LOG)
 bestranslate = Tool('bestranslate', __LOG)
 ltsinfo = Tool('ltsinfo', __LOG)
-pgsolver = Tool('pgsolver', __LOG, hastimings = False)
+# The time that pgsolver -v 2 reports for solving the game, and the player
+# that wins from vertex 0.
+PGSOLVER_FIELDS = [Field(r'Overall\s*\|.*?\s(?P<time>[0-9.]+) sec'), Winner(0)]
+pgsolver = Tool('pgsolver', __LOG, hastimings = False, outfilter=PGSOLVER_FIELDS)
 mlsolver = Tool('mlsolver', __LOG, hastimings = False)
-PGCONVERT_RE = 'Parity game contains (?P<vorig>\d+) nodes and (?P<eorig>\d+) edges\..*?Parity game contains (?P<vred>\d+) nodes and (?P<ered>\d+) edges after[^[]*$'
-pgconvert = Tool('pgconvert', __LOG, filter_=PGCONVERT_RE)
+# The size of the game before and after reduction.
+PGCONVERT_FIELDS = [Field(r'Parity game contains (?P<vorig>\d+) nodes and (?P<eorig>\d+) edges\.'),
+                    Field(r'Parity game contains (?P<vred>\d+) nodes and (?P<ered>\d+) edges after', last=True)]
+pgconvert = Tool('pgconvert', __LOG, filter_=PGCONVERT_FIELDS)
 transformer = Tool('transformer', __LOG, hastimings = False)
-LTSMIN_RE = 'original LTS has (?P<V>\d+) .*? (?P<E>\d+) .*?' \
-  '(?:marking divergences took .*? (?P<ptimeu>\d+.\d+) user (?P<ptimes>\d+.\d+) sys.*?)?' \
-  'reduction took .*? (?P<rtimeu>\d+.\d+) user (?P<rtimes>\d+.\d+) sys.*?' \
-  'reduced LTS has (?P<Vr>\d+) .*? (?P<Er>\d+)'
-ltsmin = Tool('ltsmin', __LOG, filter_=LTSMIN_RE, hastimings = False)
+# The size of the LTS before and after reduction, and the time of marking
+# divergences (only for divergence preserving equivalences) and of reduction.
+LTSMIN_FIELDS = [Field(r'original LTS has (?P<V>\d+) .*? (?P<E>\d+)'),
+                 Field(r'marking divergences took .*? (?P<ptimeu>\d+.\d+) user (?P<ptimes>\d+.\d+) sys', optional=True),
+                 Field(r'reduction took .*? (?P<rtimeu>\d+.\d+) user (?P<rtimes>\d+.\d+) sys'),
+                 Field(r'reduced LTS has (?P<Vr>\d+) .*? (?P<Er>\d+)')]
+ltsmin = Tool('ltsmin', __LOG, filter_=LTSMIN_FIELDS, hastimings = False)
 lpsbisim2pbes = Tool('lpsbisim2pbes', __LOG)
 towersofhanoi = Tool('towersofhanoi', __LOG, hastimings = False)
 towersofhanoi_alt = Tool('towersofhanoi_alt', __LOG, hastimings = False)
@@ -4,44 +4,100 @@ import logging
 import yaml
 import sys
 import os
+import itertools
+import re
 from cases import modelchecking, equivchecking, pgsolver, mlsolver
-from cases.pool import TaskPool 
+from cases.pool import TaskPool, ThreadTaskPool, CostModel, POLICIES
+from cases.store import YAMLResults, JournalStore, Database
+from cases import cache, compression, planner, limits, Sweep, CaseFilter
+import cases
 
-def run(poolsize, resultsfile, debugOnly=False):
+def run(poolsize, resultsfile, debugOnly=False, schedule='fifo', historyfile=None, memorybudget=None, threads=False, resume=False, cachedir=None, cachesize=None, compress=None, chain=False, sweep=False, budget=None, select=None):
   log = logging.getLogger('experiments')
 
-  casesdone = []
-  if resultsfile is not None:
+  results = None
+  store = None
+  db = None
+  if resultsfile is not None and isDatabase(resultsfile):
+    # The results of cases and the journal of finished subtasks are kept in
+    # the same database.
+    log.info('Storing results in database {0}.'.format(resultsfile))
+    db = Database(resultsfile)
+    results = db.results()
+    store = db.journal(resume)
+  elif resultsfile is not None:
+    # The results of all finished subtasks are journalled, so that an
+    # interrupted run can be resumed without losing them.
+    journalfile = resultsfile + '.journal'
+    if resume and os.path.exists(journalfile):
+      log.info('Found journal ({0}), restoring finished subtasks from it.'.format(journalfile))
+    store = JournalStore(journalfile, resume)
     if os.path.exists(resultsfile):
       log.info('Found results file ({0}), parsing.'.format(resultsfile))
-      try:
-        results = yaml.load(open(resultsfile).read())
-        if results:
-          log.info('Skipping the following cases because results for them were found:')
-          for case in results:
-            casesdone.append(case['case'])
-        else:
-          casesdone = []
-      except (AttributeError, TypeError):
-        pass
-    resultsfile = open(resultsfile, 'a+')
-  else:
-    resultsfile = sys.stdout
+    results = YAMLResults(resultsfile)
 
-  pool = TaskPool(poolsize)
+  if cachedir is not None:
+    # Configured before the pool is created, so the workers inherit it.
+    log.info('Caching the output of tools in {0}.'.format(cachedir))
+    cache.configure(cachedir, cachesize)
+  if compress is not None:
+    log.info('Storing games, PBESs and LPSs compressed using {0}.'.format(compression.configure(compress)))
+
+  if chain:
+    log.info('Computing quotients from the quotients modulo finer equivalences.')
+    cases.CHAIN_REDUCTIONS = True
+
+  # The planner learns from the timings of pginfo in earlier runs; configured
+  # before the pool is created, so the workers inherit it.
+  planner.configure(historyfile)
+  costs = CostModel(historyfile)
+  if threads:
+    pool = ThreadTaskPool(poolsize, policy=POLICIES[schedule](costs), memory=memorybudget, store=store)
+  else:
+    pool = TaskPool(poolsize, policy=POLICIES[schedule](costs), memory=memorybudget, store=store)
   try:
     tasks = []
-    for task in pgsolver.getcases(debugOnly) + modelchecking.getcases(debugOnly) + mlsolver.getcases(debugOnly) + equivchecking.getcases(debugOnly):
-      if str(task) in casesdone:
+    skipped = False
+    if sweep:
+      # Equivalence checking cases are not parameterised by a size, so they
+      # are run as usual.
+      log.info('Sweeping over the parameters of every family{0}.'.format(
+               ', extending series for {0} seconds'.format(budget) if budget is not None else ''))
+      for series in pgsolver.getseries(debugOnly) + modelchecking.getseries(debugOnly) + mlsolver.getseries(debugOnly):
+        if select is None or any(select(case) for case in series.cases()):
+          tasks.append(Sweep(series, budget, previous(series, results), select))
+      candidates = equivchecking.getcases(debugOnly)
+    else:
+      candidates = itertools.chain(pgsolver.getcases(debugOnly), modelchecking.getcases(debugOnly),
+                                   mlsolver.getcases(debugOnly), equivchecking.getcases(debugOnly))
+    for task in candidates:
+      if select is not None and not select(task):
+        continue
+      if results is not None and task.key() in results:
+        if not skipped:
+          log.info('Skipping the following cases because results for them were found:')
+          skipped = True
         log.info('- ' + str(task))
       else:
         tasks.append(task)
     log.info('Submitting cases and waiting for results.')
-    for case in pool.run(*tasks):
-      if isinstance(case, (modelchecking.Case, equivchecking.Case, pgsolver.Case, mlsolver.Case)):
-        log.info('Got result for {0}'.format(case))
-        resultsfile.write(yaml.dump([case.result], default_flow_style = False))
-        resultsfile.flush()
+    # The cases of a sweep are yielded as soon as they finish, before the
+    # sweep itself, so that their results are not lost if the run is
+    # interrupted.
+    for task in pool.run(*tasks):
+      if task.failed is not None:
+        # Not recorded, so that the next run tries again.
+        log.error('No result for {0}: {1}'.format(task, task.failed))
+        continue
+      if isinstance(task, Sweep):
+        log.info('Finished {0} after trying {1}: {2}'.format(task.series, ', '.join(str(v) for v in task.result['values']) or 'nothing', task.result['stopped']))
+      elif isinstance(task, (modelchecking.Case, equivchecking.Case, pgsolver.Case, mlsolver.Case)):
+        log.info('Got result for {0}'.format(task))
+        if results is not None:
+          results.add(task.key(), task.result)
+        else:
+          sys.stdout.write(yaml.dump([task.result], default_flow_style = False))
+          sys.stdout.flush()
 
     log.info('Done.')
 
@@ -50,6 +106,41 @@ def run(poolsize, resultsfile, debugOnly=False):
   except KeyboardInterrupt:
     pool.terminate()     
     pool.join()
+  finally:
+    costs.save()
+    if store is not None:
+      store.close()
+    if results is not None:
+      results.close()
+    if db is not None:
+      db.close()
+
+def previous(series, results):
+  '''The results of the cases of series that were found in results, by key,
+     including those for values beyond the listed ones that an earlier sweep
+     tried.'''
+  done = {}
+  if results is None:
+    return done
+  values = list(series.values)
+  for (index, value) in enumerate(values):
+    keys = [case.key() for case in series.make(value)]
+    found = [key for key in keys if key in results]
+    for key in found:
+      done[key] = results.get(key)
+    if index == len(values) - 1 and series.step is not None and value is not None and len(found) == len(keys):
+      values.append(series.step(value))
+  return done
+
+def isDatabase(filename):
+  return os.path.splitext(filename)[1] in ['.sqlite', '.db']
+
+def export(dbfile, yamlfile):
+  '''Writes the results in the database dbfile to yamlfile in the YAML layout
+     that is used for results files.'''
+  db = Database(dbfile)
+  db.export(open(yamlfile, 'w'))
+  db.close()
 
 def runCmdLine():
   parser = optparse.OptionParser(usage='usage: %prog [options] [outfile]')
@@ -59,6 +150,40 @@ def runCmdLine():
                     help='Be more verbose. Use more than once to increase verbosity even more.')
   parser.add_option('--debug-only', action='store_true', dest='debugonly',
                     help='Run the tests only on the debug specification.')
+  parser.add_option('--schedule', action='store', type='choice', dest='schedule',
+                    choices=sorted(POLICIES.keys()), default='fifo',
+                    help='Order in which tasks are started: {0} (default: fifo).'.format(', '.join(sorted(POLICIES.keys()))))
+  parser.add_option('--history', action='store', type='string', dest='historyfile',
+                    help='Estimate the cost of cases using the timings in FILE, and record the timings of this run in it.', metavar='FILE')
+  parser.add_option('--memory-budget', action='store', type='int', dest='memorybudget',
+                    help='Only start a task if its expected memory use fits in the M megabytes left by the running tasks.', metavar='M')
+  parser.add_option('--threads', action='store_true', dest='threads',
+                    help='Run tasks in threads of a single process instead of in separate worker processes.')
+  parser.add_option('--resume', action='store_true', dest='resume',
+                    help='Do not run subtasks again whose results were journalled by an earlier, interrupted run.')
+  parser.add_option('--cache', action='store', type='string', dest='cachedir',
+                    help='Reuse the output of tools that were run on the same input by earlier runs, keeping it in DIR.', metavar='DIR')
+  parser.add_option('--cache-size', action='store', type='int', dest='cachesize',
+                    help='Limit the cache to M megabytes, removing the least recently used entries.', metavar='M')
+  parser.add_option('--compress', action='store', type='choice', dest='compress',
+                    choices=['auto'] + sorted(compression.METHODS.keys()),
+                    help='Store games, PBESs and LPSs compressed using METHOD: {0}, or auto for zstd if it is installed and gzip otherwise.'.format(', '.join(sorted(compression.METHODS.keys()))), metavar='METHOD')
+  parser.add_option('--chain-reductions', action='store_true', dest='chain',
+                    help='Reduce the quotient modulo a finer equivalence instead of the original game where possible, e.g. compute the stuttering quotient from the bisimulation quotient. Reduction times are recorded per step and cumulatively.')
+  parser.add_option('--sweep', action='store_true', dest='sweep',
+                    help='Run the cases of every family in order of increasing size, and stop a family after the first case in which a tool runs out of time or memory.')
+  parser.add_option('--sweep-budget', action='store', type='int', dest='budget',
+                    help='Like --sweep, but when all listed cases of a family have been run, keep adding larger ones (e.g. doubling the size) until the family took S seconds in total.', metavar='S')
+  parser.add_option('--cgroup', action='store', type='string', dest='cgroup',
+                    help='Limit the memory of tools in cgroups created in DIR, a cgroup (v2) with the memory controller enabled for its children.', metavar='DIR')
+  parser.add_option('--include', action='append', dest='include', default=[],
+                    help='Only run the cases whose name matches the regular expression REGEX; may be given more than once.', metavar='REGEX')
+  parser.add_option('--exclude', action='append', dest='exclude', default=[],
+                    help='Do not run the cases whose name matches the regular expression REGEX; may be given more than once.', metavar='REGEX')
+  parser.add_option('--family', action='append', dest='families', default=[],
+                    help='Only run the cases of family NAME, e.g. laddergame or ABP; may be given more than once.', metavar='NAME')
+  parser.add_option('--export-yaml', action='store', type='string', dest='exportfile',
+                    help='Do not run any experiments, but export the results in the database outfile to FILE in YAML format.', metavar='FILE')
   options, args = parser.parse_args()
   if not args:
     args = (None,)
@@ -72,7 +197,28 @@ def runCmdLine():
     logging.getLogger('taskpool').setLevel(logging.DEBUG)
     logging.getLogger('tools').setLevel(logging.INFO)
 
-  run(options.poolsize, args[0], options.debugonly)
+  if options.exportfile is not None:
+    if args[0] is None or not isDatabase(args[0]):
+      parser.error('--export-yaml requires a database (.sqlite or .db) as outfile')
+    export(args[0], options.exportfile)
+    return
+
+  if options.cgroup is not None:
+    # Configured before the pool is created, so the workers inherit it.
+    try:
+      limits.configure(options.cgroup)
+    except ValueError as e:
+      parser.error(str(e))
+  select = None
+  if options.include or options.exclude or options.families:
+    try:
+      select = CaseFilter(options.include, options.exclude, options.families)
+    except re.error as e:
+      parser.error('invalid regular expression: {0}'.format(e))
+  memorybudget = options.memorybudget * 1024 if options.memorybudget is not None else None
+  cachesize = options.cachesize * 1024 * 1024 if options.cachesize is not None else None
+  run(options.poolsize, args[0], options.debugonly, options.schedule, options.historyfile, memorybudget, options.threads, options.resume,
+      options.cachedir, cachesize, options.compress, options.chain, options.sweep or options.budget is not None, options.budget, select)
 
 if __name__ == '__main__':
   runCmdLine()
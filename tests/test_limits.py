@@ -0,0 +1,31 @@
+import unittest
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cases'))
+import limits
+import tools
+
+class MeterTest(unittest.TestCase):
+  def test_pipeline(self):
+    '''The stages of a pipeline are waited for on threads of their own, but
+       count for the meter of the thread that started them.'''
+    log = logging.getLogger('test')
+    with limits.Meter() as meter:
+      result = tools.pipeline(tools.Tool('cat', log).stage(), tools.Tool('cat', log).stage(), stdin='x' * 1000)
+    peaks = [stage['usage']['maxrss'] for stage in result['stages']]
+    self.assertEqual(result['out'], 'x' * 1000)
+    self.assertTrue(all(peak > 0 for peak in peaks))
+    self.assertEqual(meter.peak, sum(peaks))
+
+  def test_sequential(self):
+    '''Processes that run one after the other do not count together.'''
+    log = logging.getLogger('test')
+    with limits.Meter() as meter:
+      first = tools.Tool('cat', log)(stdin='x')
+      second = tools.Tool('cat', log)(stdin='x')
+    self.assertEqual(meter.peak, max(first['usage']['maxrss'], second['usage']['maxrss']))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+import logging
+import optparse
+import yaml
+
+def games(data):
+  '''The results of all parity games in a results file.'''
+  for case in data:
+    if case.has_key('properties'):
+      for property in case['properties']:
+        yield property
+    elif case.has_key('instances'):
+      for instance in case['instances']:
+        yield instance
+    else:
+      yield case
+
+def wall(usage):
+  '''Total wall clock time of the tool invocations in a usage dictionary.'''
+  if not isinstance(usage, dict):
+    return 0.0
+  if usage.has_key('wall'):
+    return usage['wall']
+  return sum(wall(u) for u in usage.values())
+
+def totals(infilename):
+  '''Returns the number of games, the number of bytes they take on disk and the
+     wall clock time spent in generating, reducing and solving them.'''
+  data = yaml.load(open(infilename).read())
+  count, disk, time = 0, 0, 0.0
+  for game in games(data):
+    count += 1
+    disk += sum(game.get('disk', {}).values())
+    time += wall(game.get('generation', {}).get('usage')) + wall(game.get('usage'))
+  return count, disk, time
+
+def run(infilenames, log):
+  results = []
+  for infilename in infilenames:
+    count, disk, time = totals(infilename)
+    log.info('Read {0} games from {1}'.format(count, infilename))
+    print '{0}: {1} games, {2:.1f} MB on disk, {3:.1f} s wall clock time'.format(infilename, count, disk / 1048576.0, time)
+    results.append((disk, time))
+  # Compare the other runs with the first, e.g. with and without compression.
+  for (infilename, (disk, time)) in zip(infilenames[1:], results[1:]):
+    if results[0][0] and results[0][1]:
+      print '{0} relative to {1}: {2:.2f} x disk space, {3:.2f} x wall clock time'.format(
+        infilename, infilenames[0], float(disk) / results[0][0], time / results[0][1])
+
+def runCmdLine():
+  parser = optparse.OptionParser(usage='usage: %prog [options] resultfile [resultfile...]')
+  parser.add_option('-v', action='count', dest='verbosity',
+                    help='Be more verbose. Use more than once to increase verbosity even more.')
+  options, args = parser.parse_args()
+  if len(args) < 1:
+    parser.error(parser.usage)
+
+  logging.basicConfig()
+  if options.verbosity > 0:
+    logging.getLogger('diskusage').setLevel(logging.INFO)
+
+  run(args, logging.getLogger('diskusage'))
+
+if __name__ == '__main__':
+  runCmdLine()
@@ -0,0 +1,36 @@
+'''Counts the linearisations that the modelchecking and equivalence checking
+cases need, with and without sharing them between cases that use the same
+specification (see LinearisationTask). Only the first phase of every case is
+run, which creates the LinearisationTasks without running any tools.'''
+import logging
+import optparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from cases import modelchecking, equivchecking, LinearisationTask
+
+def count(cases, log):
+  '''Returns the number of LinearisationTasks that cases create, and the
+     number of distinct flight keys among them.'''
+  tasks, keys = 0, set()
+  for case in cases:
+    case.phase0(log)
+    for task in case.subtasks:
+      if isinstance(task, LinearisationTask):
+        tasks += 1
+        keys.add(task.flightkey())
+  return tasks, len(keys)
+
+def runCmdLine():
+  parser = optparse.OptionParser(usage='usage: %prog [options]')
+  parser.add_option('--debug-only', action='store_true', dest='debugonly',
+                    help='Only count the cases that run.py --debug-only runs.')
+  options, _ = parser.parse_args()
+  log = logging.getLogger('linearisations')
+  for (name, module) in [('modelchecking', modelchecking), ('equivchecking', equivchecking)]:
+    (tasks, keys) = count(module.getcases(options.debugonly), log)
+    print '{0:<14} {1:>6} linearisations, {2:>6} after sharing'.format(name, tasks, keys)
+
+if __name__ == '__main__':
+  runCmdLine()
@@ -60,25 +60,52 @@ CREATE TABLE "gamesizes" (
     "sccs" INTEGER DEFAULT NULL,
     "scc_quotient_height" INTEGER DEFAULT NULL,
     "terminal_sccs" INTEGER DEFAULT NULL,
-    "trivial_sccs" INTEGER DEFAULT NULL   
+    "trivial_sccs" INTEGER DEFAULT NULL,
+    "approximate" TEXT DEFAULT NULL
 );
 CREATE TABLE "generation" (
     "id" INTEGER PRIMARY KEY,
     "time" REAL,
-    "tool" TEXT
+    "tool" TEXT,
+    "maxrss" INTEGER DEFAULT NULL,
+    "user" REAL DEFAULT NULL,
+    "sys" REAL DEFAULT NULL,
+    "wall" REAL DEFAULT NULL,
+    "nvcsw" INTEGER DEFAULT NULL,
+    "nivcsw" INTEGER DEFAULT NULL,
+    "inblock" INTEGER DEFAULT NULL,
+    "oublock" INTEGER DEFAULT NULL
 );
 CREATE TABLE "solving" (
     "id" INTEGER PRIMARY KEY,
     "time" REAL,
     "tool" TEXT,
-    "solution" TEXT
+    "solution" TEXT,
+    "maxrss" INTEGER DEFAULT NULL,
+    "user" REAL DEFAULT NULL,
+    "sys" REAL DEFAULT NULL,
+    "wall" REAL DEFAULT NULL,
+    "nvcsw" INTEGER DEFAULT NULL,
+    "nivcsw" INTEGER DEFAULT NULL,
+    "inblock" INTEGER DEFAULT NULL,
+    "oublock" INTEGER DEFAULT NULL
 );
 CREATE TABLE "reduction" (
     "id" INTEGER PRIMARY KEY,
     "idfrom" INTEGER NOT NULL,
     "idto" INTEGER NOT NULL,
     "tool" TEXT,
-    "time" REAL
+    "time" REAL,
+    "maxrss" INTEGER DEFAULT NULL,
+    "user" REAL DEFAULT NULL,
+    "sys" REAL DEFAULT NULL,
+    "wall" REAL DEFAULT NULL,
+    "nvcsw" INTEGER DEFAULT NULL,
+    "nivcsw" INTEGER DEFAULT NULL,
+    "inblock" INTEGER DEFAULT NULL,
+    "oublock" INTEGER DEFAULT NULL,
+    "step_time" REAL DEFAULT NULL,
+    "source" TEXT DEFAULT NULL
 );
 CREATE VIEW "query_gamesizes" AS
 SELECT cases.name,
@@ -96,6 +123,24 @@ WHERE gamesizes.id = games.id
   AND reduction.idto = games.id
 '''
 
+# Resource usage of a tool invocation, as recorded in the usage dictionaries.
+USAGE_FIELDS = ['maxrss', 'user', 'sys', 'wall', 'nvcsw', 'nivcsw', 'inblock', 'oublock']
+
+def usagevalues(usage):
+  if not isinstance(usage, dict):
+    usage = {}
+  return tuple(usage.get(field, None) for field in USAGE_FIELDS)
+
+def approximate(data):
+  '''The names of the metrics in data that were estimated instead of
+     computed exactly, separated by commas, or None.'''
+  def estimated(value):
+    if not isinstance(value, dict):
+      return False
+    return value.get('approximate', False) or any(estimated(v) for v in value.values())
+  names = sorted(k for (k, v) in data.items() if estimated(v))
+  return ', '.join(names) if names else None
+
 def loaddetaildata(conn, gameid, detailfile, datadir):
   detailfile = os.path.join(datadir, detailfile[detailfile.find('cases/'):])
   try:
@@ -142,7 +187,8 @@ def loaddetaildata(conn, gameid, detailfile, datadir):
       sccs=?,
       scc_quotient_height=?,
       terminal_sccs=?,
-      trivial_sccs=?
+      trivial_sccs=?,
+      approximate=?
     WHERE id=?'''
 
   c.execute(query,
@@ -182,6 +228,7 @@ def loaddetaildata(conn, gameid, detailfile, datadir):
             data.get('SCC', {}).get('Quotient height', None),
             data.get('SCC', {}).get('Terminal SCCs', None),
             data.get('SCC', {}).get('Trivial SCCs', None),
+            approximate(data),
             gameid)) 
   
 
@@ -240,28 +287,37 @@ def loaddata(conn, data, datadir, store_reduced, caseid=None):
       for reduction in equivalences:
         yamlfile = data.get('files',{}).get(reduction, None)
         LOG.debug(yamlfile)
-        gmfile = os.path.splitext(yamlfile)[0].replace('/data/','/temp/') + '.gm'
+        # Games that could not be made have no information (see 'skipped').
+        gmfile = os.path.splitext(yamlfile)[0].replace('/data/','/temp/') + '.gm' if yamlfile else None
         c.execute('INSERT INTO games VALUES (null, ?, ?, ?)', (instanceid, reduction, gmfile))
         games[reduction] = c.execute('SELECT last_insert_rowid()').fetchone()[0]
       
       sizes = data.get('sizes', {})
       times = data.get('times', {})
       solutions = data.get('solutions', {})
+      usage = data.get('usage', {})
       files = data['files']
-      c.execute('INSERT INTO generation VALUES (?, ?, ?)', (games['orig'], data['generation'].get('times', {}).get('total', None), data['generation'].get('tool', None)))
+      # Skipped reductions and reductions that failed have no timings.
+      times = dict((k, v if isinstance(v, dict) else {}) for (k, v) in times.items())
+      c.execute('INSERT INTO generation VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (games['orig'], data['generation'].get('times', {}).get('total', None), data['generation'].get('tool', None)) + usagevalues(data['generation'].get('usage')))
       for reduction in equivalences:
         if reduction == 'orig':
           red = 'original'
         else:
           red = reduction
           
-        c.execute('INSERT INTO gamesizes (id, vertices, edges) VALUES (?, ?, ?)', (games[reduction], sizes[reduction].get('vertices', None), sizes[reduction].get('edges', None)))
+        c.execute('INSERT INTO gamesizes (id, vertices, edges) VALUES (?, ?, ?)', (games[reduction], sizes.get(reduction, {}).get('vertices', None), sizes.get(reduction, {}).get('edges', None)))
         if reduction != 'orig':
-          c.execute('INSERT INTO reduction VALUES (null, ?, ?, ?, ?)', (games['orig'], games[reduction], 'pgconvert', times[reduction].get('reduction', {}).get('reduction', None)))
+          # The time is that of reducing the original game, also if the
+          # quotient was computed from another quotient (see run.py
+          # --chain-reductions); step_time is that of the last step.
+          step = times.get(reduction, {}).get('reduction', {}).get('reduction', None)
+          total = times.get(reduction, {}).get('cumulative', {}).get('reduction', step)
+          c.execute('INSERT INTO reduction VALUES (null, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (games['orig'], games[reduction], 'pgconvert', total) + usagevalues(usage.get(reduction, {}).get('reduction')) + (step, data.get('chain', {}).get(reduction, 'orig')))
         else: # for efficient querying
-          c.execute('INSERT INTO reduction VALUES (null, ?, ?, ?, ?)', (games['orig'], games['orig'], 'dummy', 0.0))
+          c.execute('INSERT INTO reduction VALUES (null, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (games['orig'], games['orig'], 'dummy', 0.0) + usagevalues(None) + (0.0, None))
           
-        solvingtime = times[reduction].get('pbespgsolve', {})
+        solvingtime = times.get(reduction, {}).get('pbespgsolve', {})
         if solvingtime == 'timeout':
           solvingtime = None
         else:
@@ -269,10 +325,11 @@ def loaddata(conn, data, datadir, store_reduced, caseid=None):
         solution = solutions.get(red, {}).get('pbespgsolve', None)
         if solution == 'unknown':
           solution = None       
-        c.execute('INSERT INTO solving VALUES (?, ?, ?, ?)', (games[reduction], solvingtime, 'pbespgsolve', solution))
+        c.execute('INSERT INTO solving VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (games[reduction], solvingtime, 'pbespgsolve', solution) + usagevalues(usage.get(red, {}).get('pbespgsolve')))
         conn.commit()
         
-        loaddetaildata(conn, games[reduction], files[reduction], datadir)
+        if files.get(reduction):
+          loaddetaildata(conn, games[reduction], files[reduction], datadir)
         conn.commit()
         
 def run(resultfile, sqlitefile, initialise, store_reduced):